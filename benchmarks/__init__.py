@@ -0,0 +1,4 @@
+"""
+Замеры производительности. Запуск из корня проекта:
+python -m benchmarks.<название_модуля>
+"""
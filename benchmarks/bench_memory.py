@@ -0,0 +1,80 @@
+"""
+Замер памяти, занимаемой результатом выборки из 100 000 записей.
+
+Сравниваются объекты моделей со слотами и без них (такие же классы,
+построенные без slots=True), а также список объектов get_all и пакет
+записей get_batch до и после создания всех объектов (вместе с хранимыми
+столбцами). Даты расходов хранятся, как в приложении, числом микросекунд.
+
+Запуск: python -m benchmarks.bench_memory
+"""
+
+import dataclasses
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.record_batch import RecordBatch
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.schema import MIGRATOR
+
+ROWS = 100_000
+
+
+def unslotted(model: type) -> type:
+    """ Такой же класс данных, но без слотов """
+    fields = [(f.name, f.type, f) for f in dataclasses.fields(model)]
+    return dataclasses.make_dataclass(f'{model.__name__}Dict', fields)
+
+
+def measure(name: str, func: Callable[[], Any]) -> Any:
+    """ Выполнить func и напечатать память, занятую результатом """
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<36} {size / 2**20:8.2f} MiB per {ROWS} rows')
+    return result
+
+
+def materialized(batch: RecordBatch[Any]) -> RecordBatch[Any]:
+    """ Создать все объекты пакета batch """
+    for _ in batch:
+        pass
+    return batch
+
+
+def main() -> None:
+    """ Запустить замер """
+    now = datetime(2020, 1, 1)
+    samples: list[tuple[type, Callable[[type, int], Any]]] = [
+        (Expense, lambda cls, i: cls(i, i % 20, now, now, 'comment', i)),
+        (Category, lambda cls, i: cls(f'category {i}', i // 10 or None, i)),
+        (Budget, lambda cls, i: cls(7, i % 20, 1000, i)),
+    ]
+    for model, make in samples:
+        for cls in (model, unslotted(model)):
+            measure(f'{cls.__name__} objects',
+                    lambda cls=cls, make=make: [make(cls, i) for i in range(ROWS)])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = str(Path(tmp_dir) / 'bench.db')
+        with ThreadLocalConnectionManager(db_file) as manager:
+            repo = SQLiteRepository[Expense](db_file, Expense, manager, MIGRATOR)
+            repo.add_many(Expense(i % 1000, i % 20, now + timedelta(minutes=i),
+                                  now + timedelta(minutes=i), f'comment {i}')
+                          for i in range(ROWS))
+            measure('get_all', repo.get_all)
+            measure('get_batch (not materialized)', repo.get_batch)
+            measure('get_batch materialized',
+                    lambda: materialized(repo.get_batch()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Замер скорости создания объектов Expense из строк SQLite.
+
+Сравнивается прежний способ (словарь аргументов и datetime.strptime
+для каждой строки) с построенной один раз функцией row_factory
+на 100 000 расходов.
+
+Запуск: python -m benchmarks.bench_row_factory
+"""
+
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+ROWS = 100_000
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def legacy_generate_object(repo: SQLiteRepository[Expense],
+                           values: list[Any]) -> Expense:
+    """ Прежняя реализация SQLiteRepository.generate_object """
+    class_arguments = {}
+    for field_name, field_value in zip(repo.fields.keys(), values[1:]):
+        if repo.fields[field_name] == datetime:
+            field_value = datetime.strptime(field_value, DATE_FORMAT)
+        class_arguments[field_name] = field_value
+    obj = Expense(**class_arguments)
+    obj.pk = values[0]
+    return obj
+
+
+def measure(name: str, func: Callable[[], object]) -> float:
+    """ Выполнить func и напечатать время выполнения """
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<30} {elapsed:8.3f} s {elapsed / ROWS * 1e6:8.2f} us/row')
+    return elapsed
+
+
+def main() -> None:
+    """ Запустить замер """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = str(Path(tmp_dir) / 'bench.db')
+        with SQLiteRepository[Expense](db_file, Expense) as repo:
+            start = datetime(2020, 1, 1, 0, 0, 0, 1)
+            repo.add_many(Expense(i % 1000, i % 20, start + timedelta(minutes=i),
+                                  start + timedelta(minutes=i), f'comment {i}')
+                          for i in range(ROWS))
+            with repo.connection_manager.connection() as connection:
+                rows = connection.execute(repo.prepared_queries['get_all']).fetchall()
+                columns = [column[0] for column in
+                           connection.execute(repo.prepared_queries['get_all'])
+                           .description]
+
+            print(f'{ROWS} rows')
+            legacy = measure('legacy generate_object',
+                             lambda: [legacy_generate_object(repo, r) for r in rows])
+            factory = repo.row_factory(columns)
+            fast = measure('row_factory', lambda: list(map(factory, rows)))
+            measure('get_all (including fetch)', repo.get_all)
+            print(f'speedup: {legacy / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
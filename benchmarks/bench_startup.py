@@ -0,0 +1,141 @@
+"""
+Замер времени запуска приложения.
+
+- импорт bookkeeper.main (без графического интерфейса) в новом процессе;
+- проверка схемы: три репозитория и таблица итогов по отдельности
+  и в одной транзакции (open_repositories), для новой и существующей базы;
+- время до первого окна: окно, показанное до загрузки данных, и окно,
+  показанное после чтения всех категорий и расходов (прежний порядок), на базе
+  из 100 000 расходов. Требуется PySide6; без дисплея используется
+  QT_QPA_PLATFORM=offscreen.
+
+Запуск: python -m benchmarks.bench_startup
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from bookkeeper.main import Bookkeeper, open_repositories
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.rollup import DailyRollup
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+ROWS = 100_000
+REPEAT = 5
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int = REPEAT) -> float:
+    """ Выполнить func repeat раз и напечатать лучшее время """
+    best = min(_elapsed(func) for _ in range(repeat))
+    print(f'{name:<45} {best * 1000:8.1f} ms')
+    return best
+
+
+def _elapsed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def import_main() -> None:
+    """ Импорт bookkeeper.main в новом процессе """
+    subprocess.run([sys.executable, '-c', 'import bookkeeper.main'], check=True)
+
+
+def separate_schema(db_file: str) -> None:
+    """ Прежняя проверка схемы: каждый репозиторий в своей транзакции """
+    with ThreadLocalConnectionManager(db_file) as manager:
+        SQLiteRepository[Category](db_file, Category, manager)
+        exp_repo = SQLiteRepository[Expense](db_file, Expense, manager)
+        SQLiteRepository[Budget](db_file, Budget, manager)
+        DailyRollup(exp_repo, 'amount', 'expense_date', by='category')
+
+
+def single_schema(db_file: str) -> None:
+    """ Проверка схемы в одной транзакции """
+    with ThreadLocalConnectionManager(db_file) as manager:
+        open_repositories(manager)
+
+
+def bench_schema(tmp_dir: str) -> None:
+    """ Замер проверки схемы для новой и существующей базы """
+    for name, func in (('separate transactions', separate_schema),
+                       ('single transaction', single_schema)):
+        counter = iter(range(REPEAT))
+        measure(f'schema, new db, {name}',
+                lambda func=func: func(str(Path(tmp_dir) / f'{name}{next(counter)}.db')))
+        db_file = str(Path(tmp_dir) / f'{name}.db')
+        func(db_file)
+        measure(f'schema, existing db, {name}', lambda func=func: func(db_file))
+
+
+def fill(db_file: str) -> None:
+    """ База из ROWS расходов """
+    with ThreadLocalConnectionManager(db_file, 'fast') as manager:
+        cat_repo, exp_repo, bud_repo, _ = open_repositories(manager)
+        bookkeeper = Bookkeeper(_NullView(), cat_repo, exp_repo, bud_repo)
+        bookkeeper.init_db()
+        now = datetime.now()
+        exp_repo.add_many(Expense(i % 1000, i % 7 + 1, now - timedelta(minutes=i))
+                          for i in range(ROWS))
+
+
+class _NullView:
+    """ Представление, игнорирующее все вызовы """
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args: None
+
+
+def bench_first_window(db_file: str) -> None:
+    """ Время до первого окна с отложенной и с предварительной загрузкой """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        # pylint: disable=import-outside-toplevel
+        from bookkeeper.view.main_window import MainWindow
+        from bookkeeper.view.view import View
+    except ImportError:
+        print('PySide6 is not installed, skipping time-to-first-window')
+        return
+    view = View()
+
+    def first_window(load_first: bool) -> None:
+        # новое окно на каждый замер: без источников отложенной загрузки
+        view.window = MainWindow()
+        with ThreadLocalConnectionManager(db_file) as manager:
+            cat_repo, exp_repo, bud_repo, rollup = open_repositories(manager)
+            Bookkeeper(view, cat_repo, exp_repo, bud_repo, rollup)
+            if load_first:
+                # прежний порядок: все категории, расходы и бюджеты
+                # читаются и передаются в окно до его показа
+                view.set_category_list(cat_repo.get_all())
+                view.set_expense_list(exp_repo.get_all())
+                view.set_budget_list(bud_repo.get_all())
+            view.window.show()
+            view.app.processEvents()
+            view.window.hide()
+
+    measure('first window, data loaded after paint', lambda: first_window(False))
+    measure('first window, all data loaded before', lambda: first_window(True))
+
+
+def main() -> None:
+    """ Запустить замер """
+    measure('import bookkeeper.main', import_main)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_schema(tmp_dir)
+        db_file = str(Path(tmp_dir) / 'bench.db')
+        fill(db_file)
+        bench_first_window(db_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Модуль содержит снимок расходов для аналитики на основе массивов NumPy
+
+Снимок хранит сумму, категорию и дату каждого расхода в отдельных
+непрерывных массивах и считает суммы по периодам и категориям, суммы
+в скользящем окне и процентили векторными операциями, не создавая
+объектов Expense. Данные читаются прямо из курсора SQLiteRepository.
+
+Снимок обновляется инкрементально: метод refresh дочитывает только записи
+с id больше уже загруженных. Если записи в уже загруженном диапазоне id
+изменились (количество, сумма, категории или наибольшая дата добавления
+не совпадают), снимок перечитывается целиком. Изменение одной только даты
+существующего расхода так не обнаруживается - для этого служит reload.
+
+Требуется пакет numpy (pip install pybookkeeper[analytics]).
+"""
+
+import logging
+from datetime import date
+from typing import Any
+
+import numpy as np
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.aggregation import Number, check_period
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+# numpy отсчитывает недели от 1970-01-01 - четверга
+_MONDAY_SHIFT = np.timedelta64(3, 'D')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ExpenseSnapshot:
+    """
+    Столбцовый снимок расходов репозитория repo.
+    pk, amount, category - массивы int64, expense_date - datetime64[us]
+    (NaT для расходов без даты). Записи упорядочены по id.
+    """
+
+    def __init__(self, repo: SQLiteRepository[Expense]) -> None:
+        self.repo = repo
+        self.pk = np.empty(0, dtype=np.int64)
+        self.amount = np.empty(0, dtype=np.int64)
+        self.category = np.empty(0, dtype=np.int64)
+        self.expense_date = np.empty(0, dtype='datetime64[us]')
+        self._added_mark: str | None = None
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self.pk)
+
+    @property
+    def max_pk(self) -> int:
+        """ Наибольший загруженный id """
+        return int(self.pk[-1]) if len(self.pk) else 0
+
+    def _select(self, condition: str, params: list[Any]) -> list[tuple[Any, ...]]:
+        # даты читаются строками ISO 8601 или числом микросекунд,
+        # в зависимости от способа хранения
+        expense_date = 'expense_date' if 'expense_date' in self.repo.epoch_fields \
+            else "replace(expense_date, ' ', 'T')"
+        query = (f"SELECT ROWID, amount, category, {expense_date}, "
+                 f"added_date FROM {self.repo.table_name} "
+                 f"WHERE {condition} ORDER BY ROWID")
+        with self.repo.connection_manager.connection() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def _set_columns(self, rows: list[tuple[Any, ...]], append: bool) -> None:
+        pks, amounts, categories, dates, added = zip(*rows) if rows else ([],) * 5
+        columns: tuple[np.ndarray, ...] = (
+            np.array(pks, dtype=np.int64),
+            np.array(amounts, dtype=np.int64),
+            np.array(categories, dtype=np.int64),
+            np.array(dates, dtype='datetime64[us]'))
+        if append:
+            columns = tuple(np.concatenate([old, new]) for old, new in zip(
+                (self.pk, self.amount, self.category, self.expense_date), columns))
+        self.pk, self.amount, self.category, self.expense_date = columns
+        marks = [mark for mark in added if mark is not None]
+        if self._added_mark is not None:
+            marks.append(self._added_mark)
+        self._added_mark = max(marks, default=None)
+
+    def reload(self) -> None:
+        """ Перечитать все расходы """
+        self._added_mark = None
+        self._set_columns(self._select('1', []), append=False)
+        logging.debug("Loaded %d expenses into analytics snapshot", len(self))
+
+    def refresh(self) -> int:
+        """
+        Дочитать расходы, добавленные после последнего обновления.
+        Вернуть число загруженных записей.
+        """
+        with self.repo.connection_manager.connection() as connection:
+            count, total, categories, added_mark = connection.execute(
+                f"SELECT COUNT(*), TOTAL(amount), TOTAL(category), MAX(added_date) "
+                f"FROM {self.repo.table_name} WHERE ROWID <= ?",
+                [self.max_pk]).fetchone()
+        if (count != len(self) or total != self.amount.sum()
+                or categories != self.category.sum()
+                or added_mark != self._added_mark):
+            logging.debug("Loaded expenses changed, reloading analytics snapshot")
+            self.reload()
+            return len(self)
+        rows = self._select('ROWID > ?', [self.max_pk])
+        self._set_columns(rows, append=True)
+        return len(rows)
+
+    def _period_keys(self, period: str) -> np.ndarray:
+        """ Дата начала периода для каждого расхода (datetime64[D]) """
+        check_period(period)
+        days = self.expense_date.astype('datetime64[D]')
+        if period == 'week':
+            weeks = (days + _MONDAY_SHIFT).astype('datetime64[W]')
+            return weeks.astype('datetime64[D]') - _MONDAY_SHIFT
+        if period == 'month':
+            return days.astype('datetime64[M]').astype('datetime64[D]')
+        return days
+
+    def _totals(self, keys: np.ndarray, mask: np.ndarray
+                ) -> tuple[np.ndarray, np.ndarray]:
+        """ Уникальные ключи (по первой оси) и суммы расходов по ним """
+        unique, inverse = np.unique(keys[mask], return_inverse=True,
+                                    axis=0 if keys.ndim > 1 else None)
+        totals = np.bincount(inverse.reshape(-1), weights=self.amount[mask],
+                             minlength=len(unique))
+        return unique, totals.astype(self.amount.dtype)
+
+    def sum_by_category(self) -> dict[int, Number]:
+        """ Суммы расходов по категориям: {категория: сумма} """
+        categories, totals = self._totals(self.category, np.ones(len(self), bool))
+        return dict(zip(categories.tolist(), totals.tolist()))
+
+    def sum_by_period(self, period: str = 'day',
+                      by_category: bool = False) -> dict[Any, Number]:
+        """
+        Суммы расходов по периодам ('day', 'week', 'month'). Ключ - дата
+        начала периода, при by_category=True - пара (категория, дата).
+        Формат совпадает с AbstractRepository.sum_by_period.
+        """
+        starts = self._period_keys(period)
+        mask = ~np.isnat(starts)
+        if not by_category:
+            keys, totals = self._totals(starts, mask)
+            return dict(zip(keys.tolist(), totals.tolist()))
+        pairs = np.stack([self.category, starts.astype(np.int64)], axis=1)
+        keys, totals = self._totals(pairs, mask)
+        return {(int(cat), date.fromordinal(_EPOCH_ORDINAL + int(day))): total
+                for (cat, day), total in zip(keys.tolist(), totals.tolist())}
+
+    def rolling_sum(self, days: int,
+                    category: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Суммы расходов в скользящем окне из days дней, заканчивающемся
+        каждым днем от первого до последнего расхода.
+        Вернуть массив дней (datetime64[D]) и массив сумм.
+        """
+        if days < 1:
+            raise ValueError(f"Window must be positive, got {days}")
+        day_keys = self.expense_date.astype('datetime64[D]')
+        mask = ~np.isnat(day_keys)
+        if category is not None:
+            mask &= self.category == category
+        if not mask.any():
+            return np.empty(0, dtype='datetime64[D]'), np.empty(0, self.amount.dtype)
+        first = day_keys[mask].min()
+        offsets = (day_keys[mask] - first).astype(np.int64)
+        daily = np.bincount(offsets, weights=self.amount[mask])
+        cumulative = np.concatenate([[0], np.cumsum(daily)])
+        window = _window_sums(cumulative, days)
+        dates = first + np.arange(len(daily))
+        return dates, window.astype(self.amount.dtype)
+
+    def percentiles(self, q: Any, category: int | None = None) -> np.ndarray:
+        """
+        Процентили q (от 0 до 100) сумм расходов, при заданной категории -
+        только расходов этой категории
+        """
+        amounts = self.amount if category is None \
+            else self.amount[self.category == category]
+        if not len(amounts):
+            raise ValueError("No expenses to compute percentiles")
+        return np.percentile(amounts, q)
+
+
+def _window_sums(cumulative: np.ndarray, days: int) -> np.ndarray:
+    """
+    Суммы в окне из days элементов по накопленным суммам cumulative
+    (cumulative[0] = 0). В начале ряда окно неполное.
+    """
+    ends = np.arange(1, len(cumulative))
+    starts = np.maximum(ends - days, 0)
+    return cumulative[ends] - cumulative[starts]
@@ -0,0 +1,209 @@
+"""
+Модуль содержит механизм оценки бюджетов
+
+Бюджет задает предельную сумму расходов за срок duration дней: сегодняшний
+день и duration - 1 предыдущих. Бюджет с категорией учитывает расходы
+этой категории и всех ее подкатегорий, бюджет без категории - все расходы.
+
+BudgetEngine хранит дневные итоги расходов по категориям за самый длинный
+срок среди бюджетов и вычисленные состояния бюджетов. Итоги читаются одним
+агрегирующим запросом (по таблице дневных итогов, если она задана).
+После изменения расходов перечитываются только затронутые итоги,
+а пересчитываются только бюджеты, которых касаются изменившиеся итоги.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Iterable
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.repository.query import Ge, In
+from bookkeeper.repository.rollup import DailyRollup
+
+# ключ дневного итога: (категория, день)
+Cell = tuple[int, date]
+
+
+@dataclass(frozen=True)
+class BudgetStatus:
+    """
+    Состояние бюджета.
+    budget - бюджет
+    spent - сумма расходов за срок бюджета
+    start - первый день срока
+    """
+    budget: Budget
+    spent: Number
+    start: date
+
+    @property
+    def remaining(self) -> Number:
+        """ Остаток бюджета (отрицательный при превышении) """
+        return self.budget.amount - self.spent
+
+    @property
+    def exceeded(self) -> bool:
+        """ Превышен ли бюджет """
+        return self.spent > self.budget.amount
+
+
+class BudgetEngine:
+    """
+    Механизм оценки бюджетов из репозитория budget_repo по расходам
+    из expense_repo с учетом иерархии категорий из category_repo.
+    rollup - таблица дневных итогов расходов по категориям; если задана,
+    итоги читаются из нее.
+    today - функция, возвращающая текущую дату
+    """
+
+    def __init__(self, budget_repo: AbstractRepository[Budget],
+                 expense_repo: AbstractRepository[Expense],
+                 category_repo: AbstractRepository[Category],
+                 rollup: DailyRollup | None = None,
+                 today: Callable[[], date] = date.today) -> None:
+        self.budget_repo = budget_repo
+        self.expense_repo = expense_repo
+        self.category_repo = category_repo
+        self.rollup = rollup
+        self.today = today
+        self._day: date | None = None
+        self._budgets: list[Budget] = []
+        self._subtrees: dict[int, set[int]] = {}
+        self._cells: dict[Cell, Number] = {}
+        self._statuses: dict[int, BudgetStatus] = {}
+
+    @property
+    def statuses(self) -> list[BudgetStatus]:
+        """ Состояния всех бюджетов в порядке id """
+        self._check_day()
+        return [self._statuses[b.pk] for b in self._budgets]
+
+    def _window_start(self) -> date:
+        assert self._day is not None
+        longest = max((b.duration for b in self._budgets), default=1)
+        return self._day - timedelta(days=max(longest, 1) - 1)
+
+    def _check_day(self) -> None:
+        """ С наступлением нового дня сроки бюджетов сдвигаются """
+        if self._day != self.today():
+            self.evaluate()
+
+    def evaluate(self) -> list[BudgetStatus]:
+        """ Перечитать бюджеты, категории и итоги и оценить все бюджеты """
+        self._day = self.today()
+        self._budgets = sorted(self.budget_repo.get_all(), key=lambda b: b.pk)
+        self._load_subtrees()
+        self._cells = self._read_cells()
+        self._statuses = {b.pk: self._evaluate(b) for b in self._budgets}
+        return self.statuses
+
+    def budgets_changed(self) -> list[BudgetStatus]:
+        """
+        Перечитать бюджеты после их изменения. Итоги перечитываются,
+        только если срок самого длинного бюджета вырос.
+        """
+        self._check_day()
+        start = self._window_start()
+        self._budgets = sorted(self.budget_repo.get_all(), key=lambda b: b.pk)
+        self._load_subtrees()
+        if self._window_start() < start:
+            self._cells = self._read_cells()
+        self._statuses = {b.pk: self._evaluate(b) for b in self._budgets}
+        return self.statuses
+
+    def categories_changed(self) -> list[BudgetStatus]:
+        """ Перестроить поддеревья категорий после изменения иерархии """
+        self._check_day()
+        self._load_subtrees()
+        self._statuses = {b.pk: self._evaluate(b) for b in self._budgets}
+        return self.statuses
+
+    def expenses_changed(self, expenses: Iterable[Expense] | None = None
+                         ) -> list[BudgetStatus]:
+        """
+        Обновить оценку после изменения расходов. Если переданы затронутые
+        расходы expenses (добавленные, а для измененных и удаленных - также
+        их прежнее состояние), перечитываются только итоги их категорий,
+        иначе - все итоги. Пересчитываются бюджеты, которых касаются
+        изменившиеся итоги. Вернуть новые состояния изменившихся бюджетов.
+        """
+        if self._day != self.today():
+            self.evaluate()
+            return self.statuses
+        start = self._window_start()
+        categories: set[int] | None = None
+        if expenses is not None:
+            categories = {e.category for e in expenses
+                          if e.expense_date is not None
+                          and e.expense_date.date() >= start}
+            if not categories:
+                return []
+        cells = self._read_cells(categories)
+        old = self._cells if categories is None else {
+            cell: total for cell, total in self._cells.items() if cell[0] in categories}
+        changed = {cell for cell in old.keys() | cells.keys()
+                   if old.get(cell) != cells.get(cell)}
+        if categories is None:
+            self._cells = cells
+        else:
+            for cell in old:
+                del self._cells[cell]
+            self._cells.update(cells)
+
+        affected = [b for b in self._budgets if any(
+            self._covers(b, cell) for cell in changed)]
+        updated = []
+        for budget in affected:
+            status = self._evaluate(budget)
+            if status != self._statuses.get(budget.pk):
+                self._statuses[budget.pk] = status
+                updated.append(status)
+        return updated
+
+    def _load_subtrees(self) -> None:
+        """ Множества категорий поддеревьев категорий бюджетов """
+        children: dict[int | None, list[int]] = defaultdict(list)
+        for cat in self.category_repo.get_all():
+            children[cat.parent].append(cat.pk)
+        self._subtrees = {}
+        for budget in self._budgets:
+            if budget.category is None or budget.category in self._subtrees:
+                continue
+            subtree, stack = set(), [budget.category]
+            while stack:
+                pk = stack.pop()
+                if pk not in subtree:
+                    subtree.add(pk)
+                    stack.extend(children[pk])
+            self._subtrees[budget.category] = subtree
+
+    def _read_cells(self, categories: set[int] | None = None) -> dict[Cell, Number]:
+        """ Дневные итоги по категориям categories (всем, если None) за срок """
+        start = self._window_start()
+        if self.rollup is not None:
+            return self.rollup.sum_by_day(start, groups=categories)
+        where: dict[str, Any] = {'expense_date': Ge(datetime.combine(start, time()))}
+        if categories is not None:
+            where['category'] = In(categories)
+        return self.expense_repo.sum_by_period(
+            'amount', 'expense_date', 'day', where, by='category')
+
+    def _start(self, budget: Budget) -> date:
+        assert self._day is not None
+        return self._day - timedelta(days=max(budget.duration, 1) - 1)
+
+    def _covers(self, budget: Budget, cell: Cell) -> bool:
+        """ Учитывается ли дневной итог cell в бюджете budget """
+        category, day = cell
+        return day >= self._start(budget) and (
+            budget.category is None or category in self._subtrees[budget.category])
+
+    def _evaluate(self, budget: Budget) -> BudgetStatus:
+        spent = sum(total for cell, total in self._cells.items()
+                    if self._covers(budget, cell))
+        return BudgetStatus(budget, spent, self._start(budget))
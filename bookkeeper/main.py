@@ -2,16 +2,44 @@
 Main файл приложения
 """
 
+import logging
 import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, TypeVar
 
-from bookkeeper.models.budget import Budget
+from bookkeeper.budget_engine import BudgetEngine, BudgetStatus
+from bookkeeper.models.budget import Budget, BUDGET_DURATIONS
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.repository.caching_repository import CachingRepository
+from bookkeeper.repository.connection_manager import (
+    ConnectionManager, StorageProfile, ThreadLocalConnectionManager)
+from bookkeeper.repository.query import Ge, Gt
+from bookkeeper.repository.rollup import DailyRollup
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.schema import MIGRATOR
 from bookkeeper.utils import read_tree, INIT_CATEGORIES, DB_PATH
 from bookkeeper.view.abstract_view import AbstractView
-from bookkeeper.view.view import View
+from bookkeeper.worker import ErrorCallback, RepositoryWorker
+
+R = TypeVar('R')
+
+
+@dataclass
+class CategoryRemoval:
+    """
+    Результат удаления категории.
+    pk - id удаленной категории
+    children, expenses, budgets - подкатегории, расходы и бюджеты,
+    перешедшие к ее родителю
+    """
+    pk: int
+    children: list[Category]
+    expenses: list[Expense]
+    budgets: list[Budget]
 
 
 class Bookkeeper:
@@ -22,11 +50,15 @@ class Bookkeeper:
     def __init__(self, view: AbstractView,
                  category_repo: AbstractRepository[Category],
                  expense_repo: AbstractRepository[Expense],
-                 budget_repo: AbstractRepository[Budget]) -> None:
+                 budget_repo: AbstractRepository[Budget],
+                 expense_rollup: DailyRollup | None = None) -> None:
         self.view = view
         self.category_repo = category_repo
         self.expense_repo = expense_repo
         self.budget_repo = budget_repo
+        self.expense_rollup = expense_rollup
+        self.budget_engine = BudgetEngine(budget_repo, expense_repo, category_repo,
+                                          expense_rollup)
 
         self.view.register_expense_updater(self.update_expense)
         self.view.register_expense_deleter(self.delete_expense)
@@ -36,62 +68,399 @@ class Bookkeeper:
         self.view.register_category_deleter(self.delete_category)
         self.view.register_category_creator(self.create_category)
 
-        self.view.register_budget_updater(self.budget_repo.update)
-        self.view.register_budget_creator(self.budget_repo.add)
+        self.view.register_budget_updater(self.update_budget)
+        self.view.register_budget_creator(self.create_budget)
+        self.view.register_budget_deleter(self.delete_budget)
 
     def init_db(self) -> None:
         """
         default db objects insertion
         """
-        Category.create_from_tree(read_tree(INIT_CATEGORIES), self.category_repo)
-        self.expense_repo.add(Expense(120, 1, comment='comment1'))
-        self.expense_repo.add(Expense(900, 7, comment='comment2'))
-        self.budget_repo.add(Budget(1, None, 1000))
-        self.budget_repo.add(Budget(7, None, 7000))
-        self.budget_repo.add(Budget(30, None, 30000))
+        with self.category_repo.transaction():
+            Category.create_from_tree(read_tree(INIT_CATEGORIES), self.category_repo)
+            self.expense_repo.add_many([Expense(120, 1, comment='comment1'),
+                                        Expense(900, 7, comment='comment2')])
+            self.budget_repo.add_many([Budget(1, None, 1000),
+                                       Budget(7, None, 7000),
+                                       Budget(30, None, 30000)])
+
+    def _write(self, operation: Callable[[], R], done: Callable[[R], None],
+               on_error: ErrorCallback | None = None) -> None:
+        """
+        Выполнить запись operation и передать ее результат в done,
+        а исключение - в on_error (по умолчанию ошибка показывается
+        в представлении)
+        """
+        on_error = on_error or self._write_failed()
+        try:
+            result = operation()
+        except Exception as exc:  # pylint: disable=broad-except
+            on_error(exc)
+            return
+        done(result)
+
+    def _read(self, key: str, operation: Callable[[], R],
+              done: Callable[[R], None]) -> None:
+        """
+        Выполнить чтение operation и передать результат в done. Ключ key
+        используется асинхронным presenter'ом для объединения повторных чтений
+        """
+        del key
+        done(operation())
+
+    def run(self, init_db: bool = False) -> None:
+        """
+        Показать окно и загрузить данные после его первой отрисовки.
+        Если init_db=True, перед загрузкой база заполняется начальными данными.
+        """
+        self.view.run(lambda: self.load_data(init_db))
+
+    def load_data(self, init_db: bool = False) -> None:
+        """ Начальная загрузка данных в представление """
+        if init_db:
+            self._write(self.init_db, lambda _: None)
+        self.view.set_category_source(self.load_subcategories)
+        self._read('categories', self.category_repo.get_all, self.view.set_category_list)
+        self.view.set_expense_source(self.load_expenses)
+        self._read('budgets', self.budget_repo.get_all, self.view.set_budget_list)
+        self.update_expense_totals()
+        self.update_budget_statuses()
+
+        def loaded(_: None) -> None:
+            self.view.data_loaded()
+
+        self._read('data_loaded', lambda: None, loaded)
+
+    def fetch_subcategories(self, parent: int | None) -> list[Category]:
+        """
+        Загрузить подкатегории категории parent для дерева категорий
+        (при parent=None - категории верхнего уровня)
+        """
+        return self.category_repo.get_all({'parent': parent}, order_by='pk')
+
+    def fetch_expenses(self, after_pk: int, limit: int) -> list[Expense]:
+        """
+        Загрузить очередную порцию расходов для представления:
+        не более limit расходов с id больше after_pk
+        """
+        return self.expense_repo.get_all(
+            {'pk': Gt(after_pk)}, order_by='pk', limit=limit)
+
+    def load_subcategories(self, parent: int | None,
+                           done: Callable[[list[Category]], None]) -> None:
+        """ Загрузить подкатегории категории parent и передать их в done """
+        self._read(f'subcategories:{parent}',
+                   lambda: self.fetch_subcategories(parent), done)
+
+    def load_expenses(self, after_pk: int, limit: int,
+                      done: Callable[[list[Expense]], None]) -> None:
+        """ Загрузить порцию расходов (как fetch_expenses) и передать ее в done """
+        self._read(f'expenses:{after_pk}:{limit}',
+                   lambda: self.fetch_expenses(after_pk, limit), done)
+
+    def expense_totals(self) -> list[Number]:
+        """
+        Суммы расходов за день, неделю и месяц, посчитанные на стороне
+        хранилища. Срок бюджета в N дней включает сегодняшний день
+        и N - 1 предыдущих. Если задана таблица дневных итогов, суммы
+        считаются по ней.
+        """
+        starts = [date.today() - timedelta(days=duration - 1)
+                  for duration in BUDGET_DURATIONS]
+        if self.expense_rollup is not None:
+            return [self.expense_rollup.sum(start) for start in starts]
+        return [self.expense_repo.sum(
+            'amount', {'expense_date': Ge(datetime.combine(start, time()))})
+            for start in starts]
+
+    def update_expense_totals(self) -> None:
+        """ Передать в представление суммы расходов за день, неделю и месяц """
+        self._read('expense_totals', self.expense_totals, self.view.set_expense_totals)
+
+    def update_budget_statuses(self, changed: list[BudgetStatus] | None = None) -> None:
+        """
+        Передать в представление состояния бюджетов. Если передан список
+        изменившихся состояний changed, состояния передаются, только если
+        он не пуст.
+        """
+        if changed is None or changed:
+            self._read('budget_statuses', lambda: self.budget_engine.statuses,
+                       self.view.set_budget_statuses)
+
+    def _expense_written(self, changed: list[BudgetStatus]) -> None:
+        self.update_expense_totals()
+        self.update_budget_statuses(changed)
+
+    def _write_failed(self, rollback: Callable[[], None] | None = None
+                      ) -> ErrorCallback:
+        """
+        Обработчик ошибки записи: вернуть в представление сохраненное
+        состояние функцией rollback и показать ошибку
+        """
+        def on_error(exc: BaseException) -> None:
+            if rollback is not None:
+                rollback()
+            self.view.show_error(f'Изменения не сохранены: {exc}')
+        return on_error
+
+    def _restore(self, name: str, repo: AbstractRepository[Any], pk: int,
+                 changed: Callable[[Any], None],
+                 removed: Callable[[int], None]) -> Callable[[], None]:
+        """
+        Функция, передающая в представление сохраненное состояние объекта pk
+        из репозитория repo (changed) или сообщающая, что его нет (removed)
+        """
+        def done(stored: Any) -> None:
+            if stored is None:
+                removed(pk)
+            else:
+                changed(stored)
 
-    def run(self) -> None:
-        self.view.set_category_list(self.category_repo.get_all())
-        self.view.set_expense_list(self.expense_repo.get_all())
-        self.view.set_budget_list(self.budget_repo.get_all())
-        self.view.run()
+        return lambda: self._read(f'{name}:{pk}', lambda: repo.get(pk), done)
 
     def update_expense(self, expense: Expense) -> None:
-        self.expense_repo.update(expense)
-        self.view.set_expense_list(self.expense_repo.get_all())
+        """
+        Сохранить измененный расход. Пересчитываются только бюджеты,
+        которых касаются прежние и новые категория и дата расхода.
+        """
+        def operation() -> list[BudgetStatus]:
+            with self.expense_repo.transaction():
+                old = self.expense_repo.get(expense.pk)
+                self.expense_repo.update(expense)
+            # расход, измененный на месте, не хранит прежнего состояния
+            affected = None if old is None or old is expense else [old, expense]
+            return self.budget_engine.expenses_changed(affected)
+
+        def done(changed: list[BudgetStatus]) -> None:
+            self.view.expense_changed(expense)
+            self._expense_written(changed)
+
+        self._write(operation, done, self._write_failed(self._restore(
+            'expense', self.expense_repo, expense.pk,
+            self.view.expense_changed, self.view.expense_removed)))
 
     def delete_expense(self, pk: int) -> None:
-        self.expense_repo.delete(pk)
-        self.view.set_expense_list(self.expense_repo.get_all())
+        """ Удалить расход pk и пересчитать бюджеты """
+        def operation() -> list[BudgetStatus]:
+            with self.expense_repo.transaction():
+                old = self.expense_repo.get(pk)
+                self.expense_repo.delete(pk)
+            return self.budget_engine.expenses_changed(None if old is None else [old])
+
+        def done(changed: list[BudgetStatus]) -> None:
+            self.view.expense_removed(pk)
+            self._expense_written(changed)
+
+        self._write(operation, done)
 
     def create_expense(self, expense: Expense) -> int:
-        pk = self.expense_repo.add(expense)
-        self.view.set_expense_list(self.expense_repo.get_all())
-        return pk
+        """ Добавить расход и пересчитать бюджеты """
+        def operation() -> list[BudgetStatus]:
+            with self.expense_repo.transaction():
+                self.expense_repo.add(expense)
+            return self.budget_engine.expenses_changed([expense])
+
+        def done(changed: list[BudgetStatus]) -> None:
+            self.view.expense_added(expense)
+            self._expense_written(changed)
+
+        self._write(operation, done)
+        return expense.pk
 
     def update_category(self, category: Category) -> None:
-        self.category_repo.update(category)
-        self.view.set_category_list(self.category_repo.get_all())
+        """ Сохранить изменения категории """
+        def operation() -> None:
+            with self.category_repo.transaction():
+                self.category_repo.update(category)
+            self.budget_engine.categories_changed()
+
+        def done(_: None) -> None:
+            self.view.category_changed(category)
+            self.update_budget_statuses()
+
+        self._write(operation, done, self._write_failed(self._restore(
+            'category', self.category_repo, category.pk,
+            self.view.category_changed, self.view.category_removed)))
 
     def delete_category(self, pk: int) -> None:
-        self.category_repo.delete(pk)
-        self.view.set_category_list(self.category_repo.get_all())
+        """
+        Удалить категорию. Подкатегории, расходы и бюджеты удаляемой категории
+        переходят к ее родителю. У категории верхнего уровня родителя нет:
+        ее подкатегории становятся категориями верхнего уровня, а расходы
+        и бюджеты не изменяются. Все изменения выполняются одной транзакцией.
+        """
+        self._write(lambda: self._remove_category(pk), self._category_removed)
+
+    def _remove_category(self, pk: int) -> CategoryRemoval | None:
+        """ Удалить категорию pk из хранилища, передав ее содержимое родителю """
+        with self.category_repo.transaction():
+            category = self.category_repo.get(pk)
+            if category is None:
+                return None
+            parent = category.parent
+            expenses: list[Expense] = []
+            budgets: list[Budget] = []
+            if parent is not None:
+                expenses = self.expense_repo.get_all({'category': pk})
+                for expense in expenses:
+                    expense.category = parent
+                budgets = self.budget_repo.get_all({'category': pk})
+                for budget in budgets:
+                    budget.category = parent
+            children = self.category_repo.get_all({'parent': pk})
+            for child in children:
+                child.parent = parent
+            self.category_repo.update_many(children)
+            self.expense_repo.update_many(expenses)
+            self.budget_repo.update_many(budgets)
+            self.category_repo.delete(pk)
+        self.budget_engine.evaluate()
+        return CategoryRemoval(pk, children, expenses, budgets)
+
+    def _category_removed(self, removal: CategoryRemoval | None) -> None:
+        """ Передать в представление результат удаления категории """
+        if removal is None:
+            return
+        for child in removal.children:
+            self.view.category_changed(child)
+        for expense in removal.expenses:
+            self.view.expense_changed(expense)
+        for budget in removal.budgets:
+            self.view.budget_changed(budget)
+        self.view.category_removed(removal.pk)
+        if removal.expenses:
+            self.update_expense_totals()
+        self.update_budget_statuses()
 
     def create_category(self, category: Category) -> int:
-        pk = self.category_repo.add(category)
-        self.view.set_category_list(self.category_repo.get_all())
-        return pk
+        """ Добавить категорию """
+        def operation() -> None:
+            with self.category_repo.transaction():
+                self.category_repo.add(category)
+            self.budget_engine.categories_changed()
+
+        self._write(operation, lambda _: self.view.category_added(category))
+        return category.pk
+
+    def _budget_written(self, view_update: Callable[[], None]) -> Callable[[Any], None]:
+        def done(_: Any) -> None:
+            view_update()
+            self.update_budget_statuses()
+        return done
+
+    def update_budget(self, budget: Budget) -> None:
+        """ Сохранить изменения бюджета """
+        def operation() -> None:
+            with self.budget_repo.transaction():
+                self.budget_repo.update(budget)
+            self.budget_engine.budgets_changed()
+
+        self._write(operation, self._budget_written(
+            lambda: self.view.budget_changed(budget)),
+            self._write_failed(self._restore(
+                'budget', self.budget_repo, budget.pk,
+                self.view.budget_changed, self.view.budget_removed)))
+
+    def create_budget(self, budget: Budget) -> int:
+        """ Добавить бюджет """
+        def operation() -> None:
+            with self.budget_repo.transaction():
+                self.budget_repo.add(budget)
+            self.budget_engine.budgets_changed()
+
+        self._write(operation, self._budget_written(
+            lambda: self.view.budget_added(budget)))
+        return budget.pk
+
+    def delete_budget(self, pk: int) -> None:
+        """ Удалить бюджет pk """
+        def operation() -> None:
+            with self.budget_repo.transaction():
+                self.budget_repo.delete(pk)
+            self.budget_engine.budgets_changed()
+
+        self._write(operation, self._budget_written(
+            lambda: self.view.budget_removed(pk)))
+
+
+class AsyncBookkeeper(Bookkeeper):
+    """
+    Presenter, выполняющий все обращения к репозиториям в рабочем потоке
+    worker. Результаты передаются в представление в потоке интерфейса.
+    Записи выполняются по порядку, повторные чтения (суммы расходов,
+    состояния бюджетов) объединяются, число невыполненных операций
+    показывается в представлении.
+
+    Методы create_* возвращают id, назначенный к моменту возврата
+    (обычно 0): объект получает id, когда запись выполнена.
+    Порции расходов и подкатегорий для ленивой загрузки тоже читаются
+    в рабочем потоке и передаются моделям представления обратным вызовом.
+    При ошибке записи представлению возвращается сохраненное состояние
+    объекта и показывается ошибка.
+    """
+
+    def __init__(self, view: AbstractView, worker: RepositoryWorker,
+                 *args: Any, **kwargs: Any) -> None:
+        super().__init__(view, *args, **kwargs)
+        self.worker = worker
+
+    def _write(self, operation: Callable[[], R], done: Callable[[R], None],
+               on_error: ErrorCallback | None = None) -> None:
+        self.worker.write(operation, done, on_error or self._write_failed())
+
+    def _read(self, key: str, operation: Callable[[], R],
+              done: Callable[[R], None]) -> None:
+        self.worker.read(key, operation, done)
+
+
+def open_repositories(connection_manager: ConnectionManager) -> tuple[
+        CachingRepository[Category], CachingRepository[Expense],
+        CachingRepository[Budget], DailyRollup]:
+    """
+    Создать репозитории категорий, расходов и бюджетов и таблицу дневных
+    итогов расходов. Схема приводится к последней версии миграциями
+    (один раз для менеджера соединений) в одной транзакции одного соединения.
+    """
+    with connection_manager.transaction():
+        cat_repo = SQLiteRepository[Category](
+            connection_manager.db_file, Category, connection_manager, MIGRATOR)
+        exp_repo = SQLiteRepository[Expense](
+            connection_manager.db_file, Expense, connection_manager, MIGRATOR)
+        bud_repo = SQLiteRepository[Budget](
+            connection_manager.db_file, Budget, connection_manager, MIGRATOR)
+        exp_rollup = DailyRollup(exp_repo, 'amount', 'expense_date', by='category',
+                                 migrator=MIGRATOR)
+    return (CachingRepository[Category](cat_repo), CachingRepository[Expense](exp_repo),
+            CachingRepository[Budget](bud_repo), exp_rollup)
+
 
+def main() -> None:
+    """ Запустить приложение с графическим интерфейсом """
+    logging.basicConfig(level=logging.INFO)
+    # PySide6 загружается только при запуске приложения
+    from bookkeeper.view.view import View  # pylint: disable=import-outside-toplevel
 
-db_init_needed = not os.path.isfile(DB_PATH)
+    db_init_needed = not os.path.isfile(DB_PATH)
+    storage_profile = StorageProfile.preset(
+        os.environ.get('BOOKKEEPER_STORAGE_PROFILE', 'balanced'))
+    logging.info("Opening database %s with storage profile %s",
+                 DB_PATH, storage_profile)
 
-app_view: AbstractView = View()
-cat_repo = SQLiteRepository[Category](DB_PATH, Category)
-exp_repo = SQLiteRepository[Expense](DB_PATH, Expense)
-bud_repo = SQLiteRepository[Budget](DB_PATH, Budget)
+    app_view = View()
+    with ThreadLocalConnectionManager(DB_PATH, storage_profile) as connection_manager:
+        cat_repo, exp_repo, bud_repo, exp_rollup = open_repositories(connection_manager)
+        # View.run завершает процесс (sys.exit): статистика выводится
+        # при выходе, после выполнения поставленных операций
+        try:
+            with RepositoryWorker(app_view.post,
+                                  app_view.set_pending_operations) as worker:
+                bk = AsyncBookkeeper(app_view, worker, cat_repo, exp_repo, bud_repo,
+                                     exp_rollup)
+                bk.run(init_db=db_init_needed)
+        finally:
+            logging.info("Cache statistics: categories %s, expenses %s, budgets %s",
+                         cat_repo.stats, exp_repo.stats, bud_repo.stats)
 
-bk = Bookkeeper(app_view, cat_repo, exp_repo, bud_repo)
-if db_init_needed:
-    bk.init_db()
 
-bk.run()
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,24 @@
 Описан класс, представляющий бюджет
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+DAY = 1
+WEEK = 7
+MONTH = 30
+BUDGET_DURATIONS = (DAY, WEEK, MONTH)
 
-@dataclass
+
+@dataclass(slots=True)
 class Budget:
     """
     Бюджет
     хранит срок (duration),
     категорию расходов (category)
     и сумму (amount)
+    Поле category индексируется в хранилище.
     """
     duration: int
-    category: int | None
+    category: int | None = field(metadata={'index': True})
     amount: int
     pk: int = 0
@@ -2,21 +2,24 @@
 Модель категории расходов
 """
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Iterator
 
-from ..repository.abstract_repository import AbstractRepository
+from ..repository.abstract_repository import AbstractRepository, SupportsHierarchy
 
 
-@dataclass
+@dataclass(slots=True)
 class Category:
     """
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
+    Поля name и parent индексируются в хранилище, для иерархии по полю parent
+    хранилище может поддерживать таблицу замыкания.
     """
-    name: str
-    parent: int | None = None
+    name: str = field(metadata={'index': True})
+    parent: int | None = field(default=None,
+                               metadata={'index': True, 'hierarchy': True})
     pk: int = 0
 
     def get_parent(self,
@@ -50,7 +53,14 @@ class Category:
         Yields
         -------
         Объекты Category от родителя и выше до категории верхнего уровня
+
+        Репозиторий, поддерживающий SupportsHierarchy, выбирает всю цепочку
+        одним запросом.
         """
+        if isinstance(repo, SupportsHierarchy):
+            if self.parent is not None:
+                yield from repo.get_ancestors(self.parent, include_self=True)
+            return
         parent = self.get_parent(repo)
         if parent is None:
             return
@@ -71,7 +81,13 @@ class Category:
         Yields
         -------
         Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
+
+        Репозиторий, поддерживающий SupportsHierarchy, выбирает подкатегории
+        одним запросом, иначе загружаются все категории.
         """
+        if isinstance(repo, SupportsHierarchy):
+            yield from repo.get_descendants(self.pk)
+            return
 
         def get_children(graph: dict[int | None, list['Category']],
                          root: int) -> Iterator['Category']:
@@ -83,7 +99,7 @@ class Category:
         subcats = defaultdict(list)
         for cat in repo.get_all():
             subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        yield from get_children(subcats, self.pk)
 
     @classmethod
     def create_from_tree(
@@ -106,13 +122,21 @@ class Category:
         tree - список пар "потомок-родитель"
         repo - репозиторий для сохранения объектов
 
+        Категории сохраняются пакетами (repo.add_many): в пакет попадают
+        подряд идущие категории, родители которых уже сохранены.
+
         Returns
         -------
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
+        batch: list[Category] = []
         for child, parent in tree:
+            if parent in created and created[parent].pk == 0:
+                repo.add_many(batch)
+                batch = []
             cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
+            batch.append(cat)
             created[child] = cat
+        repo.add_many(batch)
         return list(created.values())
@@ -16,10 +16,14 @@ class Expense:
     added_date - дата добавления в бд
     comment - комментарий
     pk - id записи в базе данных
+
+    Поля category и expense_date индексируются в хранилище, по дате
+    расхода строится упорядоченный индекс для выборок за период.
     """
     amount: int
-    category: int
-    expense_date: datetime = field(default_factory=datetime.now)
+    category: int = field(metadata={'index': True})
+    expense_date: datetime = field(default_factory=datetime.now,
+                                   metadata={'index': 'sorted'})
     added_date: datetime = field(default_factory=datetime.now)
     comment: str = ''
     pk: int = 0
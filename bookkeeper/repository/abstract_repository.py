@@ -5,10 +5,27 @@
 идентификатор в атрибуте pk (primary key). Объекты, которые могут быть сохранены
 в репозитории, должны поддерживать добавление атрибута pk и не должны
 использовать его для иных целей.
+
+Модели-датаклассы могут пометить поля, по которым выполняется поиск,
+метаданными {'index': True}: field(metadata={'index': True}).
+Поля, по которым выполняется поиск по диапазону значений, помечаются
+{'index': 'sorted'}. Репозитории используют эту разметку для построения
+индексов.
+Поле-ссылку на родительскую запись можно пометить {'hierarchy': True}:
+репозитории, поддерживающие это, поддерживают для него таблицу замыкания
+иерархии (все пары предок-потомок).
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import contextmanager
+from dataclasses import fields, is_dataclass
+from typing import (Generic, TypeVar, Protocol, Any, Iterable, Iterator,
+                    runtime_checkable)
+
+from bookkeeper.repository import aggregation
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.repository.query import OrderBy
+from bookkeeper.repository.record_batch import RecordBatch
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -20,6 +37,61 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 
 T = TypeVar('T', bound=Model)
 
+DEFAULT_BATCH_SIZE = 500
+
+
+def get_indexed_fields(clazz: type) -> list[str]:
+    """
+    Получить названия полей модели, помеченных для индексирования
+    метаданными {'index': True}
+    """
+    if not is_dataclass(clazz):
+        return []
+    return [f.name for f in fields(clazz) if f.metadata.get('index', False)]
+
+
+def get_sorted_fields(clazz: type) -> list[str]:
+    """
+    Получить названия полей модели, помеченных для упорядоченного
+    индексирования метаданными {'index': 'sorted'}
+    """
+    if not is_dataclass(clazz):
+        return []
+    return [f.name for f in fields(clazz) if f.metadata.get('index') == 'sorted']
+
+
+def get_hierarchy_field(clazz: type) -> str | None:
+    """
+    Получить название поля-ссылки на родителя, помеченного метаданными
+    {'hierarchy': True}, или None
+    """
+    if not is_dataclass(clazz):
+        return None
+    return next((f.name for f in fields(clazz) if f.metadata.get('hierarchy', False)),
+                None)
+
+
+@runtime_checkable
+class SupportsHierarchy(Protocol[T]):
+    """
+    Репозиторий, умеющий выбирать иерархию записей, связанных полем-ссылкой
+    на родителя (по умолчанию parent), за одно обращение к хранилищу
+    """
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        """
+        Получить предков записи pk: родителя, его родителя и т.д. до записи
+        верхнего уровня. При include_self=True первой идет сама запись.
+        """
+
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех потомков записи pk в порядке обхода в глубину:
+        каждая запись идет перед своими потомками, записи с общим
+        родителем упорядочены по id
+        """
+
 
 class AbstractRepository(ABC, Generic[T]):
     """
@@ -30,6 +102,14 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+
+    Пакетные методы add_many, update_many и delete_many по умолчанию
+    выполняют соответствующую операцию для каждого объекта по очереди,
+    наследники могут переопределить их более эффективной реализацией.
+
+    Репозиторий может владеть внешними ресурсами (например, соединениями
+    с базой данных). Они освобождаются методом close, также репозиторий
+    можно использовать как контекстный менеджер.
     """
 
     @abstractmethod
@@ -44,13 +124,79 @@ class AbstractRepository(ABC, Generic[T]):
         """ Получить объект по id """
 
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: OrderBy = None,
+                limit: int | None = None,
+                offset: int | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
-        если условие не задано (по умолчанию), вернуть все записи
+        если условие не задано (по умолчанию), вернуть все записи.
+        Значением может быть условие из модуля query (Ge, Lt, Between, In, ...)
+        order_by - поле или список полей для сортировки, '-поле' - по убыванию
+        limit, offset - ограничение количества и смещение результата
         """
 
+    def get_batch(self, where: dict[str, Any] | None = None,
+                  order_by: OrderBy = None,
+                  limit: int | None = None,
+                  offset: int | None = None) -> RecordBatch[T]:
+        """
+        Получить записи как get_all, но в виде пакета RecordBatch, в котором
+        объекты создаются только при обращении к ним.
+        Реализация по умолчанию оборачивает результат get_all.
+        """
+        return RecordBatch.from_objects(self.get_all(where, order_by, limit, offset))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 order_by: OrderBy = None) -> Iterator[T]:
+        """
+        Перебрать записи по условию where, не загружая их все в память.
+        Объекты создаются по мере перебора, хранилище читается порциями
+        по batch_size записей. Условие и сортировка задаются как в get_all.
+        Реализация по умолчанию загружает результат get_all целиком.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        yield from self.get_all(where, order_by)
+
+    def sum(self, field: str, where: dict[str, Any] | None = None) -> Number:
+        """
+        Сумма значений поля field у записей, удовлетворяющих условию where.
+        Значения None не учитываются, сумма по пустой выборке равна 0.
+        """
+        return aggregation.sum_values(
+            getattr(obj, field) for obj in self.iter_all(where))
+
+    def sum_grouped(self, field: str, by: str,
+                    where: dict[str, Any] | None = None) -> dict[Any, Number]:
+        """
+        Суммы значений поля field, сгруппированные по значению поля by:
+        {значение_by: сумма}
+        """
+        return aggregation.sum_grouped(
+            (getattr(obj, by), getattr(obj, field)) for obj in self.iter_all(where))
+
+    def sum_by_period(self, field: str, date_field: str, period: str = 'day',
+                      where: dict[str, Any] | None = None,
+                      by: str | None = None) -> dict[Any, Number]:
+        """
+        Суммы значений поля field по периодам ('day', 'week', 'month') даты
+        date_field. Ключ результата - дата начала периода, а если задано
+        поле by, то пара (значение_by, дата начала периода).
+        Записи без даты не учитываются.
+        """
+        aggregation.check_period(period)
+
+        def key(obj: Any) -> Any:
+            start = aggregation.period_start(getattr(obj, date_field), period)
+            return start if by is None else (getattr(obj, by), start)
+
+        return aggregation.sum_grouped(
+            (key(obj), getattr(obj, field)) for obj in self.iter_all(where)
+            if getattr(obj, date_field) is not None)
+
     @abstractmethod
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
@@ -58,3 +204,39 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах. """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Сгруппировать записи внутри блока with в одну атомарную операцию.
+        Репозитории, работающие с общим хранилищем, объединяют в транзакцию
+        и записи других репозиториев этого хранилища.
+        Реализация по умолчанию не обеспечивает атомарности.
+        """
+        yield
+
+    def close(self) -> None:
+        """ Освободить ресурсы, занятые репозиторием """
+
+    def __enter__(self) -> 'AbstractRepository[T]':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -0,0 +1,45 @@
+"""
+Модуль содержит вспомогательные функции для агрегирующих запросов
+
+Суммы по периодам группируются по дате начала периода:
+'day' - день, 'week' - понедельник недели, 'month' - первое число месяца.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+Number = int | float
+
+PERIODS = ('day', 'week', 'month')
+
+
+def check_period(period: str) -> None:
+    """ Проверить, что период поддерживается """
+    if period not in PERIODS:
+        raise ValueError(
+            f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}"
+        )
+
+
+def period_start(value: datetime | date, period: str) -> date:
+    """ Получить дату начала периода, содержащего value """
+    day = value.date() if isinstance(value, datetime) else value
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def sum_values(values: Iterable[Number | None]) -> Number:
+    """ Сумма значений без учета None """
+    return sum(value for value in values if value is not None)
+
+
+def sum_grouped(pairs: Iterable[tuple[Any, Number | None]]) -> dict[Any, Number]:
+    """ Суммы значений пар (ключ, значение) по ключам без учета None """
+    totals: dict[Any, Number] = defaultdict(int)
+    for key, value in pairs:
+        totals[key] += value if value is not None else 0
+    return dict(totals)
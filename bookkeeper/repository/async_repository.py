@@ -0,0 +1,210 @@
+"""
+Модуль описывает асинхронные репозитории для работы из asyncio
+
+AsyncAbstractRepository - асинхронный аналог AbstractRepository: методы
+add, get, get_all, update, delete являются сопрограммами, а iter_all -
+асинхронным итератором (async for).
+
+AsyncSQLiteRepository выполняет запросы SQLiteRepository в отдельном
+потоке SQLiteExecutor с одним соединением, поэтому цикл событий не
+блокируется. Несколько репозиториев могут разделять один SQLiteExecutor:
+их запросы выполняются по очереди в одном соединении.
+
+AsyncMemoryRepository оборачивает MemoryRepository и выполняет операции
+сразу, в потоке цикла событий.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Generator, Generic, TypeVar
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, DEFAULT_BATCH_SIZE)
+from bookkeeper.repository.connection_manager import (
+    StorageProfile, ThreadLocalConnectionManager)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import OrderBy
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+R = TypeVar('R')
+
+
+class AsyncAbstractRepository(ABC, Generic[T]):
+    """
+    Абстрактный асинхронный репозиторий.
+    Методы соответствуют одноименным методам AbstractRepository.
+    Репозиторий можно использовать как асинхронный контекстный менеджер.
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """
+        Добавить объект в репозиторий, вернуть id объекта,
+        также записать id в атрибут pk.
+        """
+
+    @abstractmethod
+    async def get(self, pk: int) -> T | None:
+        """ Получить объект по id """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: OrderBy = None,
+                      limit: int | None = None,
+                      offset: int | None = None) -> list[T]:
+        """ Получить все записи по условию where (как AbstractRepository.get_all) """
+
+    @abstractmethod
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 order_by: OrderBy = None) -> AsyncIterator[T]:
+        """
+        Асинхронно перебрать записи по условию where, читая их порциями
+        по batch_size записей
+        """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ Обновить данные об объекте. Объект должен содержать поле pk. """
+
+    @abstractmethod
+    async def delete(self, pk: int) -> None:
+        """ Удалить запись """
+
+    async def close(self) -> None:
+        """ Освободить ресурсы, занятые репозиторием """
+
+    async def __aenter__(self) -> 'AsyncAbstractRepository[T]':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+
+class SQLiteExecutor:
+    """
+    Отдельный поток с одним соединением к базе данных db_file.
+    Все запросы репозиториев, разделяющих исполнитель, выполняются
+    по очереди в этом потоке.
+    """
+
+    def __init__(self, db_file: str, profile: StorageProfile | str = 'safe') -> None:
+        self.db_file = db_file
+        self.connection_manager = ThreadLocalConnectionManager(db_file, profile)
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='sqlite-executor')
+
+    def submit(self, func: Callable[..., R], *args: Any) -> R:
+        """ Выполнить func в потоке исполнителя и дождаться результата """
+        return self._executor.submit(func, *args).result()
+
+    async def run(self, func: Callable[..., R], *args: Any) -> R:
+        """ Выполнить func в потоке исполнителя, не блокируя цикл событий """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    def close(self) -> None:
+        """ Дождаться выполнения запросов, закрыть соединение и поток """
+        self._executor.shutdown(wait=True)
+        self.connection_manager.close()
+
+
+class AsyncSQLiteRepository(AsyncAbstractRepository[T]):
+    """
+    Асинхронный репозиторий объектов класса clazz в базе данных db_file.
+    executor - исполнитель, разделяемый с другими репозиториями. Если
+    не задан, репозиторий создает собственный и закрывает его в методе close.
+    """
+
+    def __init__(self, db_file: str, clazz: type,
+                 executor: SQLiteExecutor | None = None) -> None:
+        self._owns_executor = executor is None
+        self.executor = executor if executor is not None else SQLiteExecutor(db_file)
+        # таблица создается в потоке исполнителя, в его соединении
+        self.repo: SQLiteRepository[T] = self.executor.submit(
+            SQLiteRepository, db_file, clazz, self.executor.connection_manager)
+
+    async def add(self, obj: T) -> int:
+        return await self.executor.run(self.repo.add, obj)
+
+    async def get(self, pk: int) -> T | None:
+        return await self.executor.run(self.repo.get, pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: OrderBy = None,
+                      limit: int | None = None,
+                      offset: int | None = None) -> list[T]:
+        return await self.executor.run(self.repo.get_all, where, order_by, limit, offset)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       order_by: OrderBy = None) -> AsyncIterator[T]:
+        """
+        Перебрать записи, читая их из курсора порциями по batch_size.
+        Между порциями в соединении могут выполняться запросы других
+        сопрограмм.
+        """
+        rows: Generator[T, None, None] = self.repo.iter_all(where, batch_size, order_by)
+        try:
+            while batch := await self.executor.run(
+                    lambda: list(islice(rows, batch_size))):
+                for obj in batch:
+                    yield obj
+        finally:
+            # курсор закрывается в потоке, где он был открыт
+            await self.executor.run(rows.close)
+
+    async def update(self, obj: T) -> None:
+        await self.executor.run(self.repo.update, obj)
+
+    async def delete(self, pk: int) -> None:
+        await self.executor.run(self.repo.delete, pk)
+
+    async def close(self) -> None:
+        if self._owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.close)
+
+
+class AsyncMemoryRepository(AsyncAbstractRepository[T]):
+    """
+    Асинхронная обертка над репозиторием в оперативной памяти repo
+    (по умолчанию новым MemoryRepository). Операции выполняются сразу,
+    iter_all уступает управление циклу событий после каждой порции.
+    """
+
+    def __init__(self, repo: AbstractRepository[T] | None = None) -> None:
+        self.repo: AbstractRepository[T] = repo if repo is not None \
+            else MemoryRepository[T]()
+
+    async def add(self, obj: T) -> int:
+        return self.repo.add(obj)
+
+    async def get(self, pk: int) -> T | None:
+        return self.repo.get(pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: OrderBy = None,
+                      limit: int | None = None,
+                      offset: int | None = None) -> list[T]:
+        return self.repo.get_all(where, order_by, limit, offset)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       order_by: OrderBy = None) -> AsyncIterator[T]:
+        rows = self.repo.iter_all(where, batch_size, order_by)
+        while batch := list(islice(rows, batch_size)):
+            for obj in batch:
+                yield obj
+            await asyncio.sleep(0)
+
+    async def update(self, obj: T) -> None:
+        self.repo.update(obj)
+
+    async def delete(self, pk: int) -> None:
+        self.repo.delete(pk)
+
+    async def close(self) -> None:
+        self.repo.close()
@@ -0,0 +1,281 @@
+"""
+Модуль описывает кэширующий репозиторий
+
+CachingRepository оборачивает любой репозиторий и хранит:
+- карту объектов (identity map) - один объект на каждый id,
+- ограниченный LRU-кэш результатов get_all.
+
+Записи, проходящие через обертку, передаются вложенному репозиторию
+и точно сбрасывают только те результаты запросов, на которые они могут
+повлиять. Изменения, сделанные в хранилище в обход обертки, кэш не видит.
+Если транзакция, в которой обертки выполняли записи, откатывается,
+кэши этих оберток очищаются.
+
+Методы иерархии (SupportsHierarchy) и таблица замыкания closure_table
+доступны через обертку, если их поддерживает вложенный репозиторий.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Hashable, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, DEFAULT_BATCH_SIZE)
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.repository.query import OrderBy, matches
+
+
+@dataclass
+class CacheStats:
+    """
+    Статистика кэша.
+    hits, misses - попадания и промахи get и get_all
+    evictions - результаты запросов, вытесненные из LRU-кэша
+    invalidations - результаты запросов, сброшенные из-за записей
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """ Доля попаданий среди всех обращений """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _CachedQuery:
+    """ Результат get_all и параметры запроса, по которым он сбрасывается """
+    where: dict[str, Any] | None
+    offset: int | None
+    objects: list[Any]
+    pks: set[int]
+
+
+class CachingRepository(AbstractRepository[T]):
+    """
+    Кэширующая обертка над репозиторием repo.
+    max_queries - наибольшее число хранимых результатов get_all
+    max_objects - наибольшее число объектов в карте объектов
+    """
+
+    # обертки, выполнявшие записи в текущей транзакции потока
+    _transaction_state = threading.local()
+    _HIERARCHY_MEMBERS = frozenset({'get_ancestors', 'get_descendants',
+                                    'closure_table'})
+
+    def __init__(self, repo: AbstractRepository[T], max_queries: int = 128,
+                 max_objects: int = 10_000) -> None:
+        if max_queries < 1 or max_objects < 1:
+            raise ValueError("Cache sizes must be positive")
+        self.repo = repo
+        self.max_queries = max_queries
+        self.max_objects = max_objects
+        self.stats = CacheStats()
+        self._objects: OrderedDict[int, T] = OrderedDict()
+        self._queries: OrderedDict[Hashable, _CachedQuery] = OrderedDict()
+
+    def __getattr__(self, name: str) -> Any:
+        """ Методы иерархии и таблица замыкания вложенного репозитория """
+        if name not in self._HIERARCHY_MEMBERS:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}")
+        member = getattr(self.repo, name)
+        if not callable(member):
+            return member
+        return lambda *args, **kwargs: [self._identity(obj)
+                                        for obj in member(*args, **kwargs)]
+
+    def clear_cache(self) -> None:
+        """ Очистить карту объектов и кэш запросов """
+        self.stats.invalidations += len(self._queries)
+        self._objects.clear()
+        self._queries.clear()
+
+    def _identity(self, obj: T) -> T:
+        """
+        Вернуть объект из карты объектов с тем же id, что и obj,
+        либо запомнить obj
+        """
+        cached = self._objects.get(obj.pk)
+        if cached is not None:
+            self._objects.move_to_end(obj.pk)
+            return cached
+        self._remember(obj)
+        return obj
+
+    def _remember(self, obj: T) -> None:
+        self._objects[obj.pk] = obj
+        self._objects.move_to_end(obj.pk)
+        if len(self._objects) > self.max_objects:
+            self._objects.popitem(last=False)
+
+    @staticmethod
+    def _query_key(where: dict[str, Any] | None, order_by: OrderBy,
+                   limit: int | None, offset: int | None) -> Hashable | None:
+        """ Ключ запроса в кэше или None, если параметры не хешируемы """
+        order = order_by if order_by is None or isinstance(order_by, str) \
+            else tuple(order_by)
+        key = (tuple(sorted((where or {}).items())), order, limit, offset)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, pk: int) -> T | None:
+        obj = self._objects.get(pk)
+        if obj is not None:
+            self.stats.hits += 1
+            self._objects.move_to_end(pk)
+            return obj
+        self.stats.misses += 1
+        obj = self.repo.get(pk)
+        if obj is not None:
+            self._remember(obj)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: OrderBy = None,
+                limit: int | None = None,
+                offset: int | None = None) -> list[T]:
+        key = self._query_key(where, order_by, limit, offset)
+        cached = self._queries.get(key) if key is not None else None
+        if cached is not None:
+            self.stats.hits += 1
+            self._queries.move_to_end(key)
+            return list(cached.objects)
+
+        self.stats.misses += 1
+        objects = [self._identity(obj)
+                   for obj in self.repo.get_all(where, order_by, limit, offset)]
+        if key is not None:
+            self._queries[key] = _CachedQuery(
+                None if where is None else dict(where), offset,
+                objects, {obj.pk for obj in objects})
+            if len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+                self.stats.evictions += 1
+        return list(objects)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 order_by: OrderBy = None) -> Iterator[T]:
+        """ Перебор записей без кэширования результата """
+        return map(self._identity, self.repo.iter_all(where, batch_size, order_by))
+
+    def sum(self, field: str, where: dict[str, Any] | None = None) -> Number:
+        return self.repo.sum(field, where)
+
+    def sum_grouped(self, field: str, by: str,
+                    where: dict[str, Any] | None = None) -> dict[Any, Number]:
+        return self.repo.sum_grouped(field, by, where)
+
+    def sum_by_period(self, field: str, date_field: str, period: str = 'day',
+                      where: dict[str, Any] | None = None,
+                      by: str | None = None) -> dict[Any, Number]:
+        return self.repo.sum_by_period(field, date_field, period, where, by)
+
+    def _invalidate(self, changed: Iterable[T] = (),
+                    deleted: Iterable[int] = ()) -> None:
+        """
+        Сбросить результаты запросов, на которые могли повлиять записи:
+        объекты changed добавлены или изменены, записи deleted удалены.
+        Результат сбрасывается, если содержит одну из записей или если
+        новое состояние объекта удовлетворяет условию запроса. Результаты
+        со смещением offset сбрасываются при любой записи: запись перед
+        началом страницы сдвигает ее.
+        """
+        changed = list(changed)
+        touched = {obj.pk for obj in changed} | set(deleted)
+        stale = [key for key, query in self._queries.items()
+                 if query.offset or not touched.isdisjoint(query.pks)
+                 or any(matches(obj, query.where) for obj in changed)]
+        for key in stale:
+            del self._queries[key]
+        self.stats.invalidations += len(stale)
+
+    def _writing(self) -> None:
+        """
+        Отметить запись в текущей транзакции до ее выполнения: объекты,
+        измененные на месте перед неудавшейся записью, сбрасываются при откате
+        """
+        written = getattr(self._transaction_state, 'written', None)
+        if written is not None:
+            written.add(self)
+
+    def add(self, obj: T) -> int:
+        self._writing()
+        pk = self.repo.add(obj)
+        self._remember(obj)
+        self._invalidate([obj])
+        return pk
+
+    def update(self, obj: T) -> None:
+        self._writing()
+        self.repo.update(obj)
+        self._remember(obj)
+        self._invalidate([obj])
+
+    def delete(self, pk: int) -> None:
+        self._writing()
+        self.repo.delete(pk)
+        self._objects.pop(pk, None)
+        self._invalidate(deleted=[pk])
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        self._writing()
+        objs = list(objs)
+        pks = self.repo.add_many(objs)
+        for obj in objs:
+            self._remember(obj)
+        self._invalidate(objs)
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        self._writing()
+        objs = list(objs)
+        self.repo.update_many(objs)
+        for obj in objs:
+            self._remember(obj)
+        self._invalidate(objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        self._writing()
+        pks = list(pks)
+        self.repo.delete_many(pks)
+        for pk in pks:
+            self._objects.pop(pk, None)
+        self._invalidate(deleted=pks)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Транзакция вложенного репозитория. При откате очищаются кэши
+        всех оберток, выполнявших записи внутри транзакции.
+        """
+        state = self._transaction_state
+        outer = getattr(state, 'written', None) is None
+        if outer:
+            state.written = set()
+        try:
+            with self.repo.transaction():
+                yield
+        except BaseException:
+            for repo in state.written:
+                repo.clear_cache()
+            logging.debug("Cleared caches of %d repositories after rollback",
+                          len(state.written))
+            raise
+        finally:
+            if outer:
+                state.written = None
+
+    def close(self) -> None:
+        self.clear_cache()
+        self.repo.close()
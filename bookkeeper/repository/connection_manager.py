@@ -0,0 +1,350 @@
+"""
+Модуль описывает менеджеры соединений с СУБД SQLite
+
+Менеджер соединений владеет соединениями с файлом базы данных и выдает их
+репозиториям. Один менеджер может разделяться несколькими репозиториями,
+работающими с одним файлом. PRAGMA применяются один раз - при создании
+соединения, а не при каждом обращении к базе.
+
+Поддерживаются две стратегии жизненного цикла:
+ThreadLocalConnectionManager - одно долгоживущее соединение на поток
+PooledConnectionManager - ограниченный пул соединений
+
+Настройки хранения (режим журнала, синхронизация, кэш) задаются профилем
+StorageProfile. Готовые профили: "safe", "balanced", "fast".
+
+Если база занята другим соединением, запрос ожидает ее освобождения
+не дольше busy_timeout секунд. Начало транзакции дополнительно
+повторяется по правилам RetryPolicy.
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Any, Iterator
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    Профиль хранения - набор PRAGMA, применяемых к каждому новому соединению.
+    name - название профиля
+    journal_mode - режим журнала (DELETE, WAL, ...)
+    synchronous - режим синхронизации с диском (FULL, NORMAL, OFF)
+    cache_size - размер кэша страниц (отрицательное значение - в КиБ)
+    mmap_size - размер отображаемой в память части файла в байтах
+    temp_store - хранилище временных таблиц (DEFAULT, FILE, MEMORY)
+    """
+    name: str
+    journal_mode: str = 'DELETE'
+    synchronous: str = 'FULL'
+    cache_size: int = -2000
+    mmap_size: int = 0
+    temp_store: str = 'DEFAULT'
+
+    @classmethod
+    def preset(cls, name: str) -> 'StorageProfile':
+        """ Получить готовый профиль по названию """
+        try:
+            return STORAGE_PROFILES[name]
+        except KeyError as exc:
+            raise ValueError(
+                f"Unknown storage profile {name!r}, "
+                f"expected one of {', '.join(STORAGE_PROFILES)}"
+            ) from exc
+
+    def pragmas(self) -> list[str]:
+        """ Список PRAGMA, задающих профиль """
+        return [
+            f'PRAGMA journal_mode = {self.journal_mode}',
+            f'PRAGMA synchronous = {self.synchronous}',
+            f'PRAGMA cache_size = {self.cache_size:d}',
+            f'PRAGMA mmap_size = {self.mmap_size:d}',
+            f'PRAGMA temp_store = {self.temp_store}',
+        ]
+
+    def __str__(self) -> str:
+        return (f'{self.name} (journal_mode={self.journal_mode}, '
+                f'synchronous={self.synchronous}, cache_size={self.cache_size}, '
+                f'mmap_size={self.mmap_size}, temp_store={self.temp_store})')
+
+
+STORAGE_PROFILES = {
+    # Стандартные настройки SQLite: журнал отката и fsync на каждую запись
+    'safe': StorageProfile('safe'),
+    # WAL: читатели не блокируются записью, fsync только при контрольной точке
+    'balanced': StorageProfile('balanced', journal_mode='WAL', synchronous='NORMAL',
+                               cache_size=-16000, mmap_size=64 * 2 ** 20,
+                               temp_store='MEMORY'),
+    # Без fsync: последние транзакции могут быть потеряны при сбое питания
+    'fast': StorageProfile('fast', journal_mode='WAL', synchronous='OFF',
+                           cache_size=-64000, mmap_size=256 * 2 ** 20,
+                           temp_store='MEMORY'),
+}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Правила повторных попыток начать транзакцию, если база занята
+    (database is locked / database is busy).
+    attempts - наибольшее число попыток
+    delay - пауза перед второй попыткой в секундах
+    backoff - множитель паузы для каждой следующей попытки
+    max_delay - наибольшая пауза в секундах
+    """
+    attempts: int = 5
+    delay: float = 0.05
+    backoff: float = 2.0
+    max_delay: float = 1.0
+
+    def __post_init__(self) -> None:
+        if self.attempts < 1:
+            raise ValueError(f"attempts must be positive, got {self.attempts}")
+
+    def delays(self) -> Iterator[float]:
+        """ Паузы перед повторными попытками """
+        delay = self.delay
+        for _ in range(self.attempts - 1):
+            yield min(delay, self.max_delay)
+            delay *= self.backoff
+
+
+def is_busy_error(error: sqlite3.OperationalError) -> bool:
+    """ Вызвана ли ошибка тем, что база занята другим соединением """
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+class ConnectionManager(ABC):
+    """
+    Абстрактный менеджер соединений.
+    Абстрактные методы:
+    _acquire
+    _release
+    """
+
+    def __init__(self, db_file: str,
+                 profile: StorageProfile | str = 'safe',
+                 busy_timeout: float = 5.0,
+                 retry: RetryPolicy | None = None) -> None:
+        """
+        db_file - путь к файлу базы данных
+        profile - профиль хранения или его название
+        busy_timeout - время ожидания занятой базы в секундах
+        retry - правила повторного начала транзакции (по умолчанию RetryPolicy())
+        """
+        self.db_file = db_file
+        self.profile = profile if isinstance(profile, StorageProfile) \
+            else StorageProfile.preset(profile)
+        self.busy_timeout = busy_timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        # версия схемы, установленная Migrator при первом открытии базы
+        self.schema_version: int | None = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[Connection] = []
+        self._closed = False
+
+    def _create_connection(self) -> Connection:
+        """
+        Создать новое соединение и применить к нему PRAGMA профиля хранения
+        """
+        if self._closed:
+            raise RuntimeError(f"Connection manager for {self.db_file} is closed")
+        connection = sqlite3.connect(self.db_file, timeout=self.busy_timeout,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA foreign_keys = ON')
+        for pragma in self.profile.pragmas():
+            connection.execute(pragma)
+        with self._lock:
+            self._connections.append(connection)
+        logging.debug("Opened connection to %s with storage profile %s",
+                      self.db_file, self.profile.name)
+        return connection
+
+    @abstractmethod
+    def _acquire(self) -> Connection:
+        """ Получить соединение для текущего потока """
+
+    @abstractmethod
+    def _release(self, connection: Connection) -> None:
+        """ Вернуть соединение, полученное методом _acquire """
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """
+        Получить соединение на время блока with.
+        Вложенные вызовы в одном потоке получают одно и то же соединение.
+        Блоки могут завершаться не в порядке вложенности (например,
+        в незавершенных генераторах): соединение возвращается, когда
+        завершится последний блок, в котором оно получено.
+        """
+        if self._closed:
+            raise RuntimeError(f"Connection manager for {self.db_file} is closed")
+        connection = getattr(self._local, 'held', None)
+        if connection is None:
+            connection = self._acquire()
+            self._local.held = connection
+            self._local.holders = 0
+        self._local.holders += 1
+        try:
+            yield connection
+        finally:
+            self._local.holders -= 1
+            if self._local.holders == 0:
+                self._local.held = None
+                self._release(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """
+        Выполнить блок with в одной транзакции на соединении текущего потока.
+        Все записи, сделанные в блоке через репозитории, разделяющие этот
+        менеджер, фиксируются одним COMMIT при выходе из внешнего блока или
+        откатываются целиком при исключении. Вложенные вызовы оформляются
+        точками сохранения (SAVEPOINT): исключение во вложенном блоке
+        откатывает только его изменения.
+        """
+        with self.connection() as connection:
+            depth = getattr(self._local, 'transaction_depth', 0)
+            self._local.transaction_depth = depth + 1
+            try:
+                if depth == 0:
+                    yield from self._outer_transaction(connection)
+                else:
+                    yield from self._savepoint(connection, f'sp_{depth}')
+            finally:
+                self._local.transaction_depth = depth
+
+    def in_transaction(self) -> bool:
+        """ Выполняется ли в текущем потоке транзакция этого менеджера """
+        return getattr(self._local, 'transaction_depth', 0) > 0
+
+    def _begin(self, connection: Connection) -> None:
+        """
+        Начать транзакцию с блокировкой на запись, повторяя попытки
+        по правилам retry, пока база занята
+        """
+        delays = self.retry.delays()
+        while True:
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as exc:
+                delay = next(delays, None)
+                if not is_busy_error(exc) or delay is None:
+                    raise
+                logging.debug("Database %s is locked, retrying in %.3f s",
+                              self.db_file, delay)
+                time.sleep(delay)
+
+    def _outer_transaction(self, connection: Connection) -> Iterator[Connection]:
+        self._begin(connection)
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    @staticmethod
+    def _savepoint(connection: Connection, name: str) -> Iterator[Connection]:
+        connection.execute(f'SAVEPOINT {name}')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute(f'ROLLBACK TO {name}')
+            connection.execute(f'RELEASE {name}')
+            raise
+        connection.execute(f'RELEASE {name}')
+
+    def close(self) -> None:
+        """ Закрыть все соединения, открытые менеджером """
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        logging.debug("Closed %d connection(s) to %s", len(connections), self.db_file)
+
+    def __enter__(self) -> 'ConnectionManager':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class ThreadLocalConnectionManager(ConnectionManager):
+    """
+    Менеджер, открывающий одно долгоживущее соединение на каждый поток
+    """
+
+    def _acquire(self) -> Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._create_connection()
+            self._local.connection = connection
+        return connection
+
+    def _release(self, connection: Connection) -> None:
+        pass
+
+    def close(self) -> None:
+        super().close()
+        self._local.connection = None
+
+
+class PooledConnectionManager(ConnectionManager):
+    """
+    Менеджер с ограниченным пулом соединений.
+    Соединения создаются по мере необходимости, но не более pool_size.
+    Если все соединения заняты, поток ожидает освобождения одного из них
+    не дольше timeout секунд.
+    """
+
+    def __init__(self, db_file: str, profile: StorageProfile | str = 'safe',
+                 pool_size: int = 4, timeout: float | None = None,
+                 busy_timeout: float = 5.0, retry: RetryPolicy | None = None) -> None:
+        if pool_size < 1:
+            raise ValueError(f"Pool size must be positive, got {pool_size}")
+        super().__init__(db_file, profile, busy_timeout, retry)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool: queue.LifoQueue[Connection] = queue.LifoQueue()
+        self._created = 0
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._pool.get(timeout=self.timeout)
+        except queue.Empty as exc:
+            raise TimeoutError(
+                f"No free connection to {self.db_file} in the pool"
+            ) from exc
+
+    def _release(self, connection: Connection) -> None:
+        if self._closed:
+            connection.close()
+            return
+        self._pool.put(connection)
@@ -1,43 +1,250 @@
 """
 Модуль описывает репозиторий, работающий в оперативной памяти
+
+Репозиторий поддерживает индексы по полям: хеш-индексы для поиска
+по равенству (Eq, In) и упорядоченные индексы для поиска по диапазону
+(Lt, Le, Gt, Ge, Between). Выборка get_all использует индекс, дающий
+наименьшее число кандидатов, остальные условия проверяются для кандидатов.
 """
 
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
 from itertools import count
-from typing import Any
+from math import inf
+from typing import Any, Iterable
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, get_indexed_fields, get_sorted_fields)
+from bookkeeper.repository.query import (
+    Between, Condition, Eq, Ge, Gt, In, Le, Lt, OrderBy, as_condition, select)
+
+
+class _HashIndex:
+    """
+    Хеш-индекс по полю field: значение поля -> множество id записей.
+    Хранит значение поля каждой записи на момент индексирования, чтобы
+    удалить запись из индекса даже после изменения самого объекта.
+    """
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+        self.buckets: dict[Any, set[int]] = defaultdict(set)
+        self.values: dict[int, Any] = {}
+
+    def add(self, pk: int, obj: Any) -> None:
+        """ Добавить запись pk в индекс """
+        value = getattr(obj, self.field)
+        self.values[pk] = value
+        self.buckets[value].add(pk)
+
+    def remove(self, pk: int) -> None:
+        """ Удалить запись pk из индекса """
+        if pk not in self.values:
+            return
+        value = self.values.pop(pk)
+        bucket = self.buckets[value]
+        bucket.discard(pk)
+        if not bucket:
+            del self.buckets[value]
+
+    def lookup(self, value: Any) -> set[int]:
+        """ id записей, у которых поле равно value """
+        return self.buckets.get(value, set())
+
+    def search(self, condition: Condition) -> set[int] | None:
+        """
+        id записей, которые могут удовлетворять условию,
+        или None, если индекс не применим к условию
+        """
+        if isinstance(condition, Eq):
+            return set(self.lookup(condition.value))
+        if isinstance(condition, In):
+            return set().union(*(self.lookup(value) for value in condition.values))
+        return None
+
+
+class _SortedIndex(_HashIndex):
+    """
+    Упорядоченный индекс по полю field: отсортированный список пар
+    (значение, id) для поиска по диапазону за O(log n). Записи со значением
+    None хранятся отдельно, так как не сравнимы с остальными.
+    """
+
+    def __init__(self, field: str) -> None:
+        super().__init__(field)
+        self.keys: list[tuple[Any, int | float]] = []
+
+    def add(self, pk: int, obj: Any) -> None:
+        super().add(pk, obj)
+        value = self.values[pk]
+        if value is not None:
+            insort(self.keys, (value, pk))
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+    def remove(self, pk: int) -> None:
+        value = self.values.get(pk)
+        super().remove(pk)
+        if value is not None:
+            del self.keys[bisect_left(self.keys, (value, pk))]
+
+    def search(self, condition: Condition) -> set[int] | None:
+        if isinstance(condition, Between):
+            return self._range((condition.low,), (condition.high, inf))
+        if isinstance(condition, Gt):
+            return self._range((condition.value, inf), None)
+        if isinstance(condition, Ge):
+            return self._range((condition.value,), None)
+        if isinstance(condition, Lt):
+            return self._range(None, (condition.value,))
+        if isinstance(condition, Le):
+            return self._range(None, (condition.value, inf))
+        return super().search(condition)
+
+    def _range(self, low: tuple[Any, ...] | None,
+               high: tuple[Any, ...] | None) -> set[int]:
+        start = 0 if low is None else bisect_left(self.keys, low)
+        stop = len(self.keys) if high is None else bisect_right(self.keys, high)
+        return {int(pk) for _, pk in self.keys[start:stop]}
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    Если задан класс хранимых объектов clazz, строятся индексы по полям,
+    помеченным для индексирования. Индексы поддерживаются при каждой записи.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, clazz: type | None = None) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._indexes: dict[str, _HashIndex] = {}
+        if clazz is not None:
+            sorted_fields = get_sorted_fields(clazz)
+            for field in get_indexed_fields(clazz):
+                self._indexes[field] = _SortedIndex(field) \
+                    if field in sorted_fields else _HashIndex(field)
+
+    def _index(self, field: str) -> _HashIndex:
+        index = self._indexes.get(field)
+        if index is None:
+            index = _HashIndex(field)
+            for pk, obj in self._container.items():
+                index.add(pk, obj)
+            self._indexes[field] = index
+        return index
+
+    def _store(self, pk: int, obj: T) -> None:
+        self._container[pk] = obj
+        for index in self._indexes.values():
+            index.remove(pk)
+            index.add(pk, obj)
+
+    def _remove(self, pk: int) -> None:
+        self._container.pop(pk)
+        for index in self._indexes.values():
+            index.remove(pk)
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
         pk = next(self._counter)
-        self._container[pk] = obj
         obj.pk = pk
+        self._store(pk, obj)
         return pk
 
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: OrderBy = None,
+                limit: int | None = None,
+                offset: int | None = None) -> list[T]:
+        return select(self._candidates(where), where, order_by, limit, offset)
+
+    def _candidates(self, where: dict[str, Any] | None) -> Iterable[T]:
+        """
+        Объекты, которые могут удовлетворять условию where, в порядке
+        добавления. Если ни одно условие не поддерживается индексами,
+        возвращаются все объекты.
+        """
+        best: set[int] | None = None
+        for field, value in (where or {}).items():
+            condition = as_condition(value)
+            if field == 'pk':
+                found = self._search_pk(condition)
+            elif field in self._indexes:
+                found = self._indexes[field].search(condition)
+            else:
+                continue
+            if found is not None and (best is None or len(found) < len(best)):
+                best = found
+        if best is None:
+            return self._container.values()
+        return [self._container[pk] for pk in sorted(best)]
+
+    def _search_pk(self, condition: Condition) -> set[int] | None:
+        if isinstance(condition, Eq):
+            values: Iterable[Any] = [condition.value]
+        elif isinstance(condition, In):
+            values = condition.values
+        else:
+            return None
+        return {pk for pk in values if pk in self._container}
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        """ Предки записи pk, начиная с родителя """
+        obj = self._container.get(pk)
+        result: list[T] = []
+        seen = set()
+        while obj is not None and obj.pk not in seen:
+            seen.add(obj.pk)
+            if include_self or obj.pk != pk:
+                result.append(obj)
+            parent = getattr(obj, parent_field)
+            obj = None if parent is None else self._container.get(parent)
+        return result
+
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """ Потомки записи pk в порядке обхода в глубину """
+        index = self._index(parent_field)
+        result: list[T] = []
+        seen = {pk}
+        stack = sorted(index.lookup(pk), reverse=True)
+        while stack:
+            child = stack.pop()
+            if child in seen:
+                continue
+            seen.add(child)
+            result.append(self._container[child])
+            stack.extend(sorted(index.lookup(child), reverse=True))
+        return result
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        self._store(obj.pk, obj)
 
     def delete(self, pk: int) -> None:
-        self._container.pop(pk)
+        self._remove(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self._store(obj.pk, obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        missing = [pk for pk in pks if pk not in self._container]
+        if missing:
+            raise KeyError(missing[0])
+        for pk in pks:
+            self._remove(pk)
@@ -0,0 +1,126 @@
+"""
+Модуль описывает версионирование схемы базы данных SQLite
+
+Версия схемы хранится в заголовке файла базы (PRAGMA user_version).
+Migrator применяет недостающие шаги миграции по порядку в одной
+транзакции и записывает новую версию. Если схема уже актуальна,
+выполняется единственный запрос PRAGMA user_version, без DDL. Проверка
+выполняется один раз для менеджера соединений: версия запоминается
+в его атрибуте schema_version.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from sqlite3 import Connection
+from typing import Any, Callable, Iterable
+
+from bookkeeper.repository.connection_manager import ConnectionManager
+from bookkeeper.repository.sqlite_repository import to_epoch_us
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Шаг миграции схемы.
+    version - версия схемы после шага
+    description - описание для журнала
+    apply - функция, изменяющая схему и данные в переданном соединении
+    """
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+class Migrator:
+    """
+    Миграции схемы migrations. Версии шагов должны идти подряд,
+    начиная с 1.
+    """
+
+    def __init__(self, migrations: Iterable[Migration]) -> None:
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        versions = [m.version for m in self.migrations]
+        if versions != list(range(1, len(versions) + 1)):
+            raise ValueError(f"Migration versions must be consecutive from 1, "
+                             f"got {versions}")
+
+    @property
+    def latest(self) -> int:
+        """ Версия схемы после всех шагов """
+        return len(self.migrations)
+
+    @staticmethod
+    def _read_version(connection: Connection) -> int:
+        version: int = connection.execute('PRAGMA user_version').fetchone()[0]
+        return version
+
+    def _check_version(self, version: int, db_file: str) -> None:
+        if version > self.latest:
+            raise RuntimeError(f"Database {db_file} has schema version {version}, "
+                               f"newer than supported {self.latest}")
+
+    def migrate(self, connection_manager: ConnectionManager) -> int:
+        """
+        Привести схему базы менеджера connection_manager к последней версии.
+        Все шаги выполняются в одной транзакции: при ошибке схема и версия
+        остаются прежними. Вернуть версию схемы.
+        """
+        if connection_manager.schema_version is not None:
+            return connection_manager.schema_version
+        with connection_manager.connection() as connection:
+            version = self._read_version(connection)
+        self._check_version(version, connection_manager.db_file)
+        if version < self.latest:
+            with connection_manager.transaction() as connection:
+                # версию могло изменить другое соединение до начала транзакции
+                version = self._read_version(connection)
+                self._check_version(version, connection_manager.db_file)
+                for migration in self.migrations[version:]:
+                    logging.info("Migrating %s to schema version %d: %s",
+                                 connection_manager.db_file, migration.version,
+                                 migration.description)
+                    migration.apply(connection)
+                connection.execute(f'PRAGMA user_version = {self.latest:d}')
+        connection_manager.schema_version = self.latest
+        return self.latest
+
+
+def _sql_to_epoch_us(value: Any) -> Any:
+    """ Строку ISO 8601 - в микросекунды от 1970-01-01, прочее - без изменений """
+    if isinstance(value, str):
+        return to_epoch_us(datetime.fromisoformat(value))
+    return value
+
+
+def rebuild_table(connection: Connection, table: str,
+                  column_types: dict[str, str],
+                  convert: dict[str, str] | None = None) -> None:
+    """
+    Пересоздать таблицу table, изменив типы столбцов column_types
+    (название - тип). convert - выражения SQL, которыми преобразуются
+    значения столбцов при копировании; в них доступна функция
+    to_epoch_us(text). Индексы таблицы создаются заново, триггеры
+    удаляются вместе со старой таблицей.
+    """
+    convert = convert or {}
+    connection.create_function('to_epoch_us', 1, _sql_to_epoch_us,
+                               deterministic=True)
+    columns = [(row[1], row[2], row[5]) for row in connection.execute(
+        f"PRAGMA table_info({table})")]
+    indexes = [row[0] for row in connection.execute(
+        "SELECT sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", [table])]
+    definitions = ", ".join(
+        f"{name} {column_types.get(name, col_type)}"
+        + (" PRIMARY KEY" if primary_key else "")
+        for name, col_type, primary_key in columns)
+    names = ", ".join(name for name, _, _ in columns)
+    values = ", ".join(convert.get(name, name) for name, _, _ in columns)
+    connection.execute(f"CREATE TABLE {table}_new ({definitions})")
+    connection.execute(f"INSERT INTO {table}_new ({names}) "
+                       f"SELECT {values} FROM {table}")
+    connection.execute(f"DROP TABLE {table}")
+    connection.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in indexes:
+        connection.execute(sql)
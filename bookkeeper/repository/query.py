@@ -0,0 +1,288 @@
+"""
+Модуль описывает условия выборки записей из репозитория
+
+Условие where метода get_all - словарь {'название_поля': значение}.
+Значением может быть как обычное значение (проверка на равенство),
+так и объект условия: Ne, Lt, Le, Gt, Ge, Between, In, InSubtree. Например,
+{'expense_date': Between(start, end), 'category': In([1, 2])}.
+
+Порядок сортировки order_by - название поля или список названий;
+префикс '-' означает сортировку по убыванию. Значения None при сортировке
+по возрастанию идут первыми, по убыванию - последними (как в SQLite).
+
+Все реализации репозиториев должны давать одинаковый результат, поэтому
+каждое условие умеет как проверить значение в Python (match), так и
+сформировать фрагмент SQL (to_sql).
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Sequence, TypeVar
+
+if TYPE_CHECKING:
+    from bookkeeper.repository.abstract_repository import SupportsHierarchy
+
+OrderBy = str | Sequence[str] | None
+
+Obj = TypeVar('Obj')
+
+
+class Condition(ABC):
+    """
+    Условие на значение поля.
+    Абстрактные методы:
+    match
+    to_sql
+    """
+
+    @abstractmethod
+    def match(self, value: Any) -> bool:
+        """ Проверить, удовлетворяет ли значение условию """
+
+    @abstractmethod
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        """
+        Сформировать фрагмент блока WHERE для столбца column.
+        Вернуть строку с плейсхолдерами ? и список параметров.
+        """
+
+    def map_values(self, func: Callable[[Any], Any]) -> 'Condition':
+        """
+        Условие того же вида со значениями, преобразованными функцией func
+        (например, в формат хранения). None не преобразуется.
+        По умолчанию условие не содержит значений поля и не меняется.
+        """
+        del func
+        return self
+
+
+@dataclass(frozen=True)
+class Eq(Condition):
+    """ Равенство. None соответствует NULL. """
+    value: Any
+
+    def match(self, value: Any) -> bool:
+        return bool(value == self.value)
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        if self.value is None:
+            return f'{column} IS NULL', []
+        return f'{column} = ?', [self.value]
+
+    def map_values(self, func: Callable[[Any], Any]) -> Condition:
+        return replace(self, value=_map_value(func, self.value))
+
+
+@dataclass(frozen=True)
+class Ne(Condition):
+    """ Неравенство. None соответствует NULL. """
+    value: Any
+
+    def match(self, value: Any) -> bool:
+        return bool(value != self.value)
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        return f'{column} IS NOT ?', [self.value]
+
+    def map_values(self, func: Callable[[Any], Any]) -> Condition:
+        return replace(self, value=_map_value(func, self.value))
+
+
+@dataclass(frozen=True)
+class _Comparison(Condition):
+    """
+    Сравнение с границей. Значения None условию не удовлетворяют.
+    Абстрактные методы:
+    _compare
+    """
+    value: Any
+
+    operator = ''
+
+    def match(self, value: Any) -> bool:
+        return value is not None and self._compare(value)
+
+    @abstractmethod
+    def _compare(self, value: Any) -> bool:
+        """ Сравнить значение, отличное от None, с границей """
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        return f'{column} {self.operator} ?', [self.value]
+
+    def map_values(self, func: Callable[[Any], Any]) -> Condition:
+        return replace(self, value=_map_value(func, self.value))
+
+
+class Lt(_Comparison):
+    """ Меньше """
+    operator = '<'
+
+    def _compare(self, value: Any) -> bool:
+        return bool(value < self.value)
+
+
+class Le(_Comparison):
+    """ Меньше или равно """
+    operator = '<='
+
+    def _compare(self, value: Any) -> bool:
+        return bool(value <= self.value)
+
+
+class Gt(_Comparison):
+    """ Больше """
+    operator = '>'
+
+    def _compare(self, value: Any) -> bool:
+        return bool(value > self.value)
+
+
+class Ge(_Comparison):
+    """ Больше или равно """
+    operator = '>='
+
+    def _compare(self, value: Any) -> bool:
+        return bool(value >= self.value)
+
+
+@dataclass(frozen=True)
+class Between(Condition):
+    """ Значение в отрезке [low, high], обе границы включаются. """
+    low: Any
+    high: Any
+
+    def match(self, value: Any) -> bool:
+        return value is not None and bool(self.low <= value <= self.high)
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        return f'{column} BETWEEN ? AND ?', [self.low, self.high]
+
+    def map_values(self, func: Callable[[Any], Any]) -> Condition:
+        return Between(_map_value(func, self.low), _map_value(func, self.high))
+
+
+@dataclass(frozen=True)
+class In(Condition):
+    """ Значение из набора values. None в наборе соответствует NULL. """
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        object.__setattr__(self, 'values', tuple(values))
+
+    def match(self, value: Any) -> bool:
+        return value in self.values
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        params = [v for v in self.values if v is not None]
+        placeholders = ", ".join("?" * len(params))
+        sql = f'{column} IN ({placeholders})'
+        if len(params) != len(self.values):
+            sql = f'({sql} OR {column} IS NULL)'
+        return sql, params
+
+    def map_values(self, func: Callable[[Any], Any]) -> Condition:
+        return In(_map_value(func, value) for value in self.values)
+
+
+@dataclass(frozen=True)
+class InSubtree(Condition):
+    """
+    Значение - id записи из поддерева записи root в иерархии репозитория
+    hierarchy, включая саму запись root. Например, расходы по категории
+    со всеми подкатегориями: {'category': InSubtree(category_repo, pk)}.
+
+    Если репозиторий иерархии поддерживает таблицу замыкания (атрибут
+    closure_table), условие в SQL - подзапрос к ней, поэтому таблица
+    иерархии должна находиться в той же базе данных. Иначе поддерево
+    выбирается один раз и подставляется как набор значений.
+    """
+    hierarchy: 'SupportsHierarchy[Any]'
+    root: int
+
+    @cached_property
+    def members(self) -> frozenset[int]:
+        """ id записей поддерева """
+        return frozenset([self.root, *(obj.pk for obj in
+                                       self.hierarchy.get_descendants(self.root))])
+
+    def match(self, value: Any) -> bool:
+        return value in self.members
+
+    def to_sql(self, column: str) -> tuple[str, list[Any]]:
+        closure = getattr(self.hierarchy, 'closure_table', None)
+        if closure is None:
+            return In(sorted(self.members)).to_sql(column)
+        return (f'{column} IN (SELECT descendant FROM {closure} WHERE ancestor = ?)',
+                [self.root])
+
+
+def _map_value(func: Callable[[Any], Any], value: Any) -> Any:
+    return None if value is None else func(value)
+
+
+def as_condition(value: Any) -> Condition:
+    """ Преобразовать значение словаря where в условие """
+    return value if isinstance(value, Condition) else Eq(value)
+
+
+def parse_order_by(order_by: OrderBy) -> list[tuple[str, bool]]:
+    """
+    Разобрать порядок сортировки в список пар (поле, по убыванию)
+    """
+    if order_by is None:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(name[1:], True) if name.startswith('-') else (name, False)
+            for name in order_by]
+
+
+def check_limits(limit: int | None, offset: int | None) -> None:
+    """ Проверить корректность limit и offset """
+    if limit is not None and limit < 0:
+        raise ValueError(f"limit must be non-negative, got {limit}")
+    if offset is not None and offset < 0:
+        raise ValueError(f"offset must be non-negative, got {offset}")
+
+
+def matches(obj: Any, where: dict[str, Any] | None) -> bool:
+    """ Проверить, удовлетворяет ли объект условию where """
+    if where is None:
+        return True
+    return all(as_condition(value).match(getattr(obj, attr))
+               for attr, value in where.items())
+
+
+def select(objects: Iterable[Obj],
+           where: dict[str, Any] | None = None,
+           order_by: OrderBy = None,
+           limit: int | None = None,
+           offset: int | None = None) -> list[Obj]:
+    """
+    Выбрать из objects объекты, удовлетворяющие условию where,
+    упорядочить и применить limit и offset. Порядок объектов с равными
+    ключами сортировки сохраняется.
+    """
+    check_limits(limit, offset)
+    if where is None:
+        result = list(objects)
+    else:
+        conditions = [(attr, as_condition(value)) for attr, value in where.items()]
+        result = [obj for obj in objects
+                  if all(cond.match(getattr(obj, attr)) for attr, cond in conditions)]
+    for attr, descending in reversed(parse_order_by(order_by)):
+        result.sort(key=_sort_key(attr), reverse=descending)
+    start = offset or 0
+    stop = None if limit is None else start + limit
+    if start or stop is not None:
+        result = result[start:stop]
+    return result
+
+
+def _sort_key(attr: str) -> Callable[[Any], tuple[bool, Any]]:
+    """ Ключ сортировки по полю attr, None меньше любого значения """
+    def key(obj: Any) -> tuple[bool, Any]:
+        value = getattr(obj, attr)
+        return value is not None, value
+    return key
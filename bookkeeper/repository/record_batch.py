@@ -0,0 +1,111 @@
+"""
+Модуль описывает пакет записей - компактное представление результата
+выборки
+
+Пакет хранит результат запроса по столбцам: целочисленные столбцы (id,
+суммы, даты, хранимые числом микросекунд) - в массивах array('q') по 8 байт
+на значение, остальные - в списках. Объект модели создается только при
+обращении к соответствующему элементу. Созданные объекты запоминаются,
+поэтому повторное обращение возвращает тот же объект. Значения одного поля
+всех записей можно получить методом column, не создавая объектов.
+"""
+
+from array import array
+from typing import Any, Callable, Iterator, Sequence, TypeVar, overload
+
+T = TypeVar('T')
+
+
+def _compact_column(values: Sequence[Any]) -> Sequence[Any]:
+    """ Целые значения - в массив array('q'), остальные - в список """
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return list(values)
+
+
+class RecordBatch(Sequence[T]):
+    """
+    Последовательность объектов, создаваемых по требованию из строк rows
+    функцией factory. columns - названия столбцов строк; если не заданы,
+    строки - уже готовые объекты.
+    """
+
+    def __init__(self, rows: Sequence[Any],
+                 factory: Callable[[Any], T] | None = None,
+                 columns: Sequence[str] | None = None) -> None:
+        self.factory = factory
+        self.columns = None if columns is None else tuple(columns)
+        self._length = len(rows)
+        self._data: list[Sequence[Any]] = []
+        if factory is None:
+            self._objects: list[T | None] = list(rows)
+            self._materialized = self._length
+        else:
+            self._data = [_compact_column(values) for values in zip(*rows)]
+            self._objects = [None] * self._length
+            self._materialized = 0
+
+    @classmethod
+    def from_objects(cls, objects: Sequence[T]) -> 'RecordBatch[T]':
+        """ Пакет из уже созданных объектов """
+        return cls(objects)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'RecordBatch[T]':
+        ...
+
+    def __getitem__(self, index: int | slice) -> 'T | RecordBatch[T]':
+        if isinstance(index, slice):
+            return RecordBatch([self[i] for i in range(*index.indices(len(self)))])
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('RecordBatch index out of range')
+        obj = self._objects[index]
+        if obj is None:
+            # в пакете готовых объектов (factory is None) пропусков нет
+            assert self.factory is not None
+            obj = self.factory([column[index] for column in self._data])
+            self._objects[index] = obj
+            self._materialized += 1
+        return obj
+
+    def __iter__(self) -> Iterator[T]:
+        return (self[i] for i in range(self._length))
+
+    @property
+    def materialized(self) -> int:
+        """ Число уже созданных объектов """
+        return self._materialized
+
+    def column(self, name: str) -> list[Any]:
+        """
+        Значения поля name всех записей. Для пакета строк объекты
+        не создаются; значения возвращаются в том виде, в каком хранятся
+        в базе (например, даты - строками или числом микросекунд).
+        """
+        if self.columns is None:
+            return [getattr(obj, name) for obj in self]
+        try:
+            position = self.columns.index(name)
+        except ValueError as exc:
+            raise ValueError(f"Batch has no column {name!r}") from exc
+        if not self._data:
+            return []
+        return list(self._data[position])
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (RecordBatch, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'RecordBatch({len(self)} records, {self.materialized} materialized)'
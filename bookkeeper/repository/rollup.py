@@ -0,0 +1,244 @@
+"""
+Модуль описывает таблицу дневных итогов для SQLiteRepository
+
+Таблица итогов хранит сумму значений поля (например, суммы расхода)
+за каждый день и, при необходимости, для каждого значения поля
+группировки (например, категории). Таблица поддерживается триггерами
+SQLite при любой вставке, изменении и удалении записей, поэтому сумма
+за последние N дней - сумма не более чем N строк итогов (на группу),
+независимо от числа исходных записей.
+
+При расхождении итогов с исходными записями таблицу можно проверить
+методом check и перестроить методом rebuild.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from sqlite3 import Connection
+from typing import TYPE_CHECKING, Any, Iterable
+
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.repository.query import In
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, date_arguments
+
+if TYPE_CHECKING:
+    from bookkeeper.repository.migrations import Migrator
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    """
+    Описание таблицы итогов столбца value по дню столбца date таблицы source,
+    сгруппированных по столбцу by (если задан). epoch - дата хранится целым
+    числом микросекунд от 1970-01-01.
+    """
+    source: str
+    value: str
+    date: str
+    by: str | None = None
+    epoch: bool = False
+
+    @property
+    def table_name(self) -> str:
+        """ Название таблицы итогов """
+        return f'{self.source}_daily_{self.value}'
+
+    @property
+    def keys(self) -> list[str]:
+        """ Ключевые столбцы таблицы итогов """
+        return ['day'] if self.by is None else ['day', 'grp']
+
+    def _day(self, row: str | None = None) -> str:
+        """ Выражение SQL для дня даты записи row (NEW, OLD или строки таблицы) """
+        column = self.date if row is None else f'{row}.{self.date}'
+        return f"date({date_arguments(column, self.epoch)})"
+
+    def _counted(self, row: str | None = None) -> str:
+        """ Условие учета записи row (NEW, OLD или строки таблицы) в итогах """
+        prefix = '' if row is None else f'{row}.'
+        condition = f"{prefix}{self.date} IS NOT NULL"
+        if self.by is not None:
+            condition += f" AND {prefix}{self.by} IS NOT NULL"
+        return condition
+
+    def _add_sql(self, row: str) -> str:
+        """ Добавить значение записи row (NEW или OLD) к итогам """
+        keys = ", ".join(self.keys)
+        values = self._day(row) if self.by is None \
+            else f"{self._day(row)}, {row}.{self.by}"
+        return (f"INSERT INTO {self.table_name} ({keys}, total, records) "
+                f"SELECT {values}, COALESCE({row}.{self.value}, 0), 1 "
+                f"WHERE {self._counted(row)} "
+                f"ON CONFLICT ({keys}) DO UPDATE SET "
+                f"total = total + excluded.total, records = records + 1;")
+
+    def _subtract_sql(self, row: str) -> str:
+        """ Вычесть значение записи row из итогов, удалив пустые строки """
+        match = f"day = {self._day(row)}"
+        if self.by is not None:
+            match += f" AND grp = {row}.{self.by}"
+        return (f"UPDATE {self.table_name} "
+                f"SET total = total - COALESCE({row}.{self.value}, 0), "
+                f"records = records - 1 WHERE {match}; "
+                f"DELETE FROM {self.table_name} WHERE {match} AND records = 0;")
+
+    def expected_sql(self) -> str:
+        """ Запрос, вычисляющий итоги по исходным записям """
+        keys = self._day() if self.by is None else f"{self._day()}, {self.by}"
+        return (f"SELECT {keys}, COALESCE(SUM({self.value}), 0), COUNT(*) "
+                f"FROM {self.source} WHERE {self._counted()} "
+                f"GROUP BY {keys}")
+
+    def fill_sql(self) -> str:
+        """ Заполнить таблицу итогов по исходным записям """
+        return (f"INSERT INTO {self.table_name} ({', '.join(self.keys)}, "
+                f"total, records) {self.expected_sql()}")
+
+    def create(self, connection: Connection) -> bool:
+        """
+        Создать в соединении connection таблицу итогов и поддерживающие
+        ее триггеры. Новая таблица заполняется по уже существующим записям.
+        Вернуть True, если таблица была создана.
+        """
+        table, source = self.table_name, self.source
+        watched = ", ".join(dict.fromkeys(
+            [self.value, self.date] + ([] if self.by is None else [self.by])))
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {table} (day TEXT NOT NULL, "
+            f"{'' if self.by is None else 'grp NOT NULL, '}"
+            f"total NOT NULL, records INTEGER NOT NULL, "
+            f"PRIMARY KEY ({', '.join(self.keys)})) WITHOUT ROWID",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {source} "
+            f"BEGIN {self._add_sql('NEW')} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_update "
+            f"AFTER UPDATE OF {watched} ON {source} "
+            f"BEGIN {self._subtract_sql('OLD')} {self._add_sql('NEW')} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {source} "
+            f"BEGIN {self._subtract_sql('OLD')} END",
+        ]
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            [table]).fetchone() is not None
+        for statement in statements:
+            connection.execute(statement)
+        if not exists:
+            connection.execute(self.fill_sql())
+            logging.info("Created rollup table %s", table)
+        return not exists
+
+
+class DailyRollup:
+    """
+    Дневные итоги поля value_field по дате date_field записей репозитория
+    repo, сгруппированные по полю by (если задано).
+    Итоги хранятся в таблице {таблица}_daily_{value_field} той же базы.
+    Записи без даты или без значения поля группировки не учитываются.
+    migrator - миграции схемы; если задан, таблицу итогов создает
+    один из его шагов (см. RollupSpec.create), а не сам DailyRollup.
+    """
+
+    def __init__(self, repo: SQLiteRepository[Any], value_field: str,
+                 date_field: str, by: str | None = None,
+                 migrator: 'Migrator | None' = None) -> None:
+        self.repo = repo
+        column = repo._column  # pylint: disable=protected-access
+        self.spec = RollupSpec(repo.table_name, column(value_field), column(date_field),
+                               None if by is None else column(by),
+                               date_field in repo.epoch_fields)
+        self.by = self.spec.by
+        self.table_name = self.spec.table_name
+        if migrator is None:
+            self.init_table()
+        else:
+            migrator.migrate(repo.connection_manager)
+
+    def init_table(self) -> None:
+        """
+        Создать таблицу итогов и поддерживающие ее триггеры.
+        Новая таблица заполняется по уже существующим записям.
+        """
+        with self.repo.connection_manager.transaction() as connection:
+            self.spec.create(connection)
+
+    def check(self, repair: bool = False) -> bool:
+        """
+        Проверить, что итоги соответствуют исходным записям.
+        Если repair=True, несоответствующая таблица перестраивается.
+        Вернуть True, если итоги были корректны.
+        """
+        stored = (f"SELECT {', '.join(self.spec.keys)}, total, records "
+                  f"FROM {self.table_name}")
+        expected = self.spec.expected_sql()
+        query = (f"SELECT EXISTS (SELECT * FROM ({expected}) EXCEPT {stored}) "
+                 f"OR EXISTS ({stored} EXCEPT SELECT * FROM ({expected}))")
+        with self.repo.connection_manager.connection() as connection:
+            consistent = not connection.execute(query).fetchone()[0]
+        if not consistent:
+            logging.warning("Rollup table %s is inconsistent", self.table_name)
+            if repair:
+                self.rebuild()
+        return consistent
+
+    def rebuild(self) -> None:
+        """ Перестроить итоги по исходным записям """
+        with self.repo.connection_manager.transaction() as connection:
+            connection.execute(f"DELETE FROM {self.table_name}")
+            connection.execute(self.spec.fill_sql())
+        logging.info("Rebuilt rollup table %s", self.table_name)
+
+    def _query(self, select: str, start: date | None, end: date | None,
+               groups: Iterable[Any] | None = None,
+               group_by: str | None = None) -> list[tuple[Any, ...]]:
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("day >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            conditions.append("day <= ?")
+            params.append(end.isoformat())
+        if groups is not None:
+            if self.by is None:
+                raise ValueError(f"Rollup {self.table_name} is not grouped")
+            sql, group_params = In(groups).to_sql('grp')
+            conditions.append(sql)
+            params.extend(group_params)
+        query = f"SELECT {select} FROM {self.table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if group_by is not None:
+            query += f" GROUP BY {group_by}"
+        with self.repo.connection_manager.connection() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def sum(self, start: date | None = None, end: date | None = None,
+            group: Any = None) -> Number:
+        """
+        Сумма за дни с start по end включительно (границы необязательны),
+        при заданном group - только для этого значения поля группировки
+        """
+        groups = None if group is None else [group]
+        total: Number = self._query("COALESCE(SUM(total), 0)", start, end, groups)[0][0]
+        return total
+
+    def sum_grouped(self, start: date | None = None,
+                    end: date | None = None) -> dict[Any, Number]:
+        """ Суммы за дни с start по end по значениям поля группировки """
+        if self.by is None:
+            raise ValueError(f"Rollup {self.table_name} is not grouped")
+        return {grp: total for grp, total
+                in self._query("grp, SUM(total)", start, end, group_by="grp")}
+
+    def sum_by_day(self, start: date | None = None, end: date | None = None,
+                   groups: Iterable[Any] | None = None) -> dict[Any, Number]:
+        """
+        Итоги по дням с start по end: {день: сумма}, для таблицы
+        с группировкой - {(значение группы, день): сумма}. Формат совпадает
+        с AbstractRepository.sum_by_period. groups ограничивает значения
+        поля группировки.
+        """
+        if self.by is None:
+            return {date.fromisoformat(day): total
+                    for day, total in self._query("day, total", start, end)}
+        return {(group, date.fromisoformat(day)): total for group, day, total
+                in self._query("grp, day, total", start, end, groups)}
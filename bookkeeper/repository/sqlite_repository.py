@@ -1,16 +1,114 @@
 """
 Модуль описывает репозиторий, работающий поверх СУБД SQLite
+
+Поля с датой и временем хранятся либо строками ISO 8601 (столбец типа
+TIMESTAMP, так создает таблицы сам репозиторий), либо целым числом
+микросекунд от 1970-01-01 (столбец типа INTEGER, см. миграции схемы).
+Способ хранения определяется по объявленному типу столбца
+(PRAGMA table_info) при создании репозитория.
 """
 
 import logging
-import sqlite3
-from datetime import datetime
+from contextlib import contextmanager
+from dataclasses import fields as dataclass_fields, is_dataclass
+from datetime import date, datetime, timedelta
 from inspect import get_annotations
-from sqlite3 import Connection
+from operator import itemgetter
+from sqlite3 import Connection, Cursor
 from types import UnionType
-from typing import Any, get_args
+from typing import (TYPE_CHECKING, Any, Callable, Generator, Iterable, Iterator,
+                    Sequence, get_args)
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, DEFAULT_BATCH_SIZE, get_hierarchy_field,
+    get_indexed_fields)
+from bookkeeper.repository.aggregation import Number, check_period
+from bookkeeper.repository.connection_manager import (
+    ConnectionManager, ThreadLocalConnectionManager)
+from bookkeeper.repository.query import (
+    OrderBy, as_condition, check_limits, parse_order_by)
+from bookkeeper.repository.record_batch import RecordBatch
+
+if TYPE_CHECKING:
+    from bookkeeper.repository.migrations import Migrator
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """ Дата и время без часового пояса в микросекундах от 1970-01-01 """
+    return (value - EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value: int) -> datetime:
+    """ Дата и время по числу микросекунд от 1970-01-01 """
+    return EPOCH + timedelta(microseconds=value)
+
+
+def date_arguments(column: str, epoch: bool) -> str:
+    """
+    Аргументы функций даты SQLite (date, strftime) для столбца-даты column;
+    epoch - дата хранится целым числом микросекунд от 1970-01-01
+    """
+    return f"{column} / 1000000, 'unixepoch'" if epoch else column
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+def closure_table_sql(table: str, parent: str, closure: str) -> list[str]:
+    """
+    Запросы, создающие таблицу замыкания closure иерархии записей таблицы
+    table по полю-ссылке на родителя parent и триггеры, поддерживающие ее
+    при вставке, изменении родителя и удалении записей
+    """
+    # записи поддерева NEW/OLD (включая ее саму) и ее предки выше нее
+    subtree = f"SELECT descendant FROM {closure} WHERE ancestor = {{0}}.ROWID"
+    above = (f"SELECT ancestor FROM {closure} "
+             f"WHERE descendant = {{0}}.ROWID AND ancestor != {{0}}.ROWID")
+    detach = (f"DELETE FROM {closure} WHERE descendant IN ({subtree}) "
+              f"AND ancestor IN ({above});")
+    return [
+        f"CREATE TABLE IF NOT EXISTS {closure} ("
+        "ancestor INTEGER NOT NULL, descendant INTEGER NOT NULL, "
+        "depth INTEGER NOT NULL, PRIMARY KEY (ancestor, descendant)"
+        ") WITHOUT ROWID",
+        f"CREATE INDEX IF NOT EXISTS idx_{closure}_descendant "
+        f"ON {closure} (descendant)",
+        f"CREATE TRIGGER IF NOT EXISTS {closure}_insert AFTER INSERT ON {table} "
+        f"BEGIN INSERT INTO {closure} (ancestor, descendant, depth) "
+        f"SELECT NEW.ROWID, NEW.ROWID, 0 UNION ALL "
+        f"SELECT ancestor, NEW.ROWID, depth + 1 FROM {closure} "
+        f"WHERE descendant = NEW.{parent}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {closure}_update "
+        f"AFTER UPDATE OF {parent} ON {table} "
+        f"WHEN OLD.{parent} IS NOT NEW.{parent} BEGIN "
+        + detach.format('NEW') +
+        f" INSERT INTO {closure} (ancestor, descendant, depth) "
+        f"SELECT above.ancestor, below.descendant, above.depth + below.depth + 1 "
+        f"FROM {closure} AS above, {closure} AS below "
+        f"WHERE above.descendant = NEW.{parent} AND below.ancestor = NEW.ROWID; "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {closure}_delete AFTER DELETE ON {table} "
+        f"BEGIN " + detach.format('OLD') +
+        f" DELETE FROM {closure} "
+        f"WHERE ancestor = OLD.ROWID OR descendant = OLD.ROWID; END",
+    ]
+
+
+def expected_closure_sql(table: str, parent: str) -> str:
+    """
+    Запрос, вычисляющий таблицу замыкания по полю-ссылке на родителя parent.
+    Глубина ограничена числом записей, чтобы циклы в данных не приводили
+    к бесконечной рекурсии.
+    """
+    return (
+        f"WITH RECURSIVE expected(ancestor, descendant, depth) AS ("
+        f"SELECT ROWID, ROWID, 0 FROM {table} "
+        f"UNION ALL SELECT e.ancestor, t.ROWID, e.depth + 1 "
+        f"FROM {table} AS t "
+        f"JOIN expected AS e ON t.{parent} = e.descendant "
+        f"WHERE e.depth < (SELECT COUNT(*) FROM {table})) "
+        f"SELECT ancestor, descendant, depth FROM expected"
+    )
 
 
 class SQLiteRepository(AbstractRepository[T]):
@@ -18,15 +116,35 @@ class SQLiteRepository(AbstractRepository[T]):
     Репозиторий, предназначенный для работы с СУБД SQLite
     """
 
-    DEFAULT_DATE_FORMAT: str
-    DEFAULT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+    PERIOD_SQL = {
+        'day': "date({})",
+        'week': "date({}, 'weekday 0', '-6 days')",
+        'month': "date({}, 'start of month')",
+    }
 
-    def __init__(self, db_file: str, clazz: type) -> None:
+    def __init__(self, db_file: str, clazz: type,
+                 connection_manager: ConnectionManager | None = None,
+                 migrator: 'Migrator | None' = None) -> None:
+        """
+        db_file - путь к файлу базы данных
+        clazz - класс хранимых объектов
+        connection_manager - менеджер соединений, разделяемый с другими
+        репозиториями. Если не задан, репозиторий создает собственный
+        менеджер с одним соединением на поток и закрывает его в методе close.
+        migrator - миграции, которыми ведется схема базы. Если задан, схема
+        обновляется им (один раз для менеджера соединений), а сам
+        репозиторий таблицы и индексы не создает.
+        """
         self.db_file = db_file
+        self._owns_connection_manager = connection_manager is None
+        self.connection_manager = connection_manager \
+            if connection_manager is not None \
+            else ThreadLocalConnectionManager(db_file)
         self.table_name = clazz.__name__.lower()
         self.fields = get_annotations(clazz, eval_str=True)
         self.fields.pop('pk')
         self.entity_class = clazz
+        self._row_factories: dict[tuple[str, ...], Callable[[Sequence[Any]], T]] = {}
 
         definition_strings = [
             f'{f_name} {self.__class__._resolve_type(f_type)}'
@@ -36,30 +154,170 @@ class SQLiteRepository(AbstractRepository[T]):
         definitions = ", ".join(definition_strings + ["pk INTEGER PRIMARY KEY"])
         self.create_sql = f'CREATE TABLE IF NOT EXISTS {self.table_name} (' \
                           + f'{definitions}' + ')'
-        self.init_model_table()
+        self.index_sql = {
+            f'idx_{self.table_name}_{f_name}':
+                f'CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{f_name} '
+                f'ON {self.table_name} ({f_name})'
+            for f_name in get_indexed_fields(clazz)
+        }
+        self.created_indexes: list[str] = []
+        self.hierarchy_field = get_hierarchy_field(clazz)
+        self.closure_table = f'{self.table_name}_closure' \
+            if self.hierarchy_field is not None else None
+        if migrator is None:
+            self.init_model_table()
+        else:
+            migrator.migrate(self.connection_manager)
+
+        datetime_fields = [f_name for f_name, f_type in self.fields.items()
+                           if self._is_datetime(f_type)]
+        self.epoch_fields = self._detect_epoch_fields(datetime_fields)
+        self._converters: dict[str, Callable[[Any], Any]] = {}
+        for f_name in datetime_fields:
+            if f_name in self.epoch_fields:
+                self._converters[f_name] = from_epoch_us
+            else:
+                self._converters[f_name] = datetime.fromisoformat
+        self._adapters: list[tuple[int, Callable[[Any], Any]]] = [
+            (i, to_epoch_us) for i, f_name in enumerate(self.fields)
+            if f_name in self.epoch_fields
+        ]
 
         names = ", ".join(self.fields.keys())
         placeholder = ", ".join("?" * len(self.fields))
         upd_placeholder = ", ".join([f"{field}=?" for field in self.fields.keys()])
         self.prepared_queries = {
-            'foreign_keys': "PRAGMA foreign_keys = ON",
             'add': f"INSERT INTO {self.table_name} ({names}) VALUES ({placeholder})",
-            'get': f"SELECT ROWID, * FROM {self.table_name} WHERE ROWID = ?",
-            'get_all': f"SELECT ROWID, * FROM {self.table_name}",
+            'get': f"SELECT ROWID AS pk, {names} FROM {self.table_name} "
+                   "WHERE ROWID = ?",
+            'get_all': f"SELECT ROWID AS pk, {names} FROM {self.table_name}",
             'update': f"UPDATE {self.table_name} SET {upd_placeholder} WHERE ROWID = ?",
             'delete': f"DELETE FROM {self.table_name} WHERE ROWID = ?",
         }
 
     def init_model_table(self) -> None:
-        with self.connect() as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(self.create_sql)
-        con.close()
+        """
+        Создать таблицу модели и недостающие индексы по полям, помеченным
+        для индексирования. Названия созданных индексов сохраняются
+        в атрибуте created_indexes.
+        """
+        with self.connection_manager.transaction() as connection:
+            connection.execute(self.create_sql)
+            existing = {row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+                [self.table_name])}
+            self.created_indexes = [name for name in self.index_sql
+                                    if name not in existing]
+            for name in self.created_indexes:
+                connection.execute(self.index_sql[name])
+            created_closure = self._init_closure_table(connection)
+        if self.created_indexes:
+            logging.info("Created indexes on %s: %s",
+                         self.table_name, ", ".join(self.created_indexes))
+        if created_closure:
+            logging.info("Created closure table %s", self.closure_table)
+
+    def _detect_epoch_fields(self, datetime_fields: list[str]) -> frozenset[str]:
+        """
+        Поля с датой, которые хранятся в столбцах типа INTEGER
+        (числом микросекунд от 1970-01-01)
+        """
+        with self.connection_manager.connection() as connection:
+            types = {row[1]: row[2].upper() for row in connection.execute(
+                f"PRAGMA table_info({self.table_name})")}
+        return frozenset(f_name for f_name in datetime_fields
+                         if types.get(f_name) == 'INTEGER')
+
+    def date_sql(self, field_name: str, row: str | None = None) -> str:
+        """
+        Аргументы функций даты SQLite (date, strftime) для поля-даты
+        field_name; row - префикс строки (NEW, OLD или псевдоним таблицы)
+        """
+        column = self._column(field_name)
+        if row is not None:
+            column = f'{row}.{column}'
+        return date_arguments(column, field_name in self.epoch_fields)
 
-    def connect(self) -> Connection:
-        return sqlite3.connect(
-            self.db_file, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    def _values(self, obj: T) -> list[Any]:
+        """ Значения полей объекта в формате хранения """
+        values = [getattr(obj, x) for x in self.fields]
+        for i, adapt in self._adapters:
+            if values[i] is not None:
+                values[i] = adapt(values[i])
+        return values
+
+    def _init_closure_table(self, connection: Connection) -> bool:
+        """
+        Создать таблицу замыкания иерархии и триггеры, поддерживающие ее
+        при вставке, изменении родителя и удалении записей. Новая таблица
+        заполняется по уже существующим записям. Вернуть True, если таблица
+        была создана.
+        """
+        if self.closure_table is None:
+            return False
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            [self.closure_table]).fetchone() is not None
+        assert self.hierarchy_field is not None
+        for statement in closure_table_sql(self.table_name, self.hierarchy_field,
+                                           self.closure_table):
+            connection.execute(statement)
+        if exists:
+            return False
+        connection.execute(f"INSERT INTO {self.closure_table} "
+                           f"{self._expected_closure_sql()}")
+        return True
+
+    def _expected_closure_sql(self) -> str:
+        assert self.hierarchy_field is not None
+        return expected_closure_sql(self.table_name, self.hierarchy_field)
+
+    def check_closure(self, repair: bool = False) -> bool:
+        """
+        Проверить, что таблица замыкания соответствует ссылкам на родителя.
+        Если repair=True, несоответствующая таблица перестраивается.
+        Вернуть True, если таблица была корректна.
+        """
+        if self.closure_table is None:
+            raise ValueError(f"{self.entity_class.__name__} has no hierarchy field")
+        expected = f"SELECT * FROM ({self._expected_closure_sql()})"
+        stored = f"SELECT ancestor, descendant, depth FROM {self.closure_table}"
+        query = (f"SELECT EXISTS ({expected} EXCEPT {stored}) "
+                 f"OR EXISTS ({stored} EXCEPT {expected})")
+        with self.connection_manager.connection() as connection:
+            consistent = not connection.execute(query).fetchone()[0]
+        if not consistent:
+            logging.warning("Closure table %s is inconsistent", self.closure_table)
+            if repair:
+                self.rebuild_closure()
+        return consistent
+
+    def rebuild_closure(self) -> None:
+        """ Перестроить таблицу замыкания по ссылкам на родителя """
+        if self.closure_table is None:
+            raise ValueError(f"{self.entity_class.__name__} has no hierarchy field")
+        with self.connection_manager.transaction() as connection:
+            connection.execute(f"DELETE FROM {self.closure_table}")
+            connection.execute(
+                f"INSERT INTO {self.closure_table} {self._expected_closure_sql()}")
+        logging.info("Rebuilt closure table %s", self.closure_table)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Выполнить записи внутри блока with одной транзакцией. В транзакцию
+        попадают записи всех репозиториев, разделяющих менеджер соединений.
+        """
+        with self.connection_manager.transaction():
+            yield
+
+    def close(self) -> None:
+        """
+        Закрыть соединения, если менеджер соединений принадлежит репозиторию.
+        Разделяемый менеджер закрывает его владелец.
+        """
+        if self._owns_connection_manager:
+            self.connection_manager.close()
 
     @staticmethod
     def _resolve_type(obj_type: type) -> str:
@@ -75,25 +333,77 @@ class SQLiteRepository(AbstractRepository[T]):
             return 'TIMESTAMP'
         return 'TEXT'
 
-    def generate_object(self, fields: dict[str, type], values: list[Any]) -> T:
+    @staticmethod
+    def _is_datetime(obj_type: Any) -> bool:
+        if isinstance(obj_type, UnionType):
+            return datetime in get_args(obj_type)
+        return obj_type is datetime
+
+    def generate_object(self, fields: dict[str, type], values: Sequence[Any]) -> T:
         """
         Вспомогательный метод, используемый для генерации объектов класса T
         из значений, хранящихся в базе данных.
+        values - pk, затем значения полей fields в порядке их перечисления.
         """
-        class_arguments = {}
+        return self.row_factory(('pk', *fields))(values)
 
-        for field_name, field_value in zip(fields.keys(), values[1:]):
-            field_type = fields[field_name]
-
-            if field_type == datetime:
-                field_value = datetime.strptime(field_value, self.DEFAULT_DATE_FORMAT)
-
-            class_arguments[field_name] = field_value
-
-        obj = self.entity_class(**class_arguments)
-        obj.pk = values[0]
-
-        return obj
+    def row_factory(self, columns: Sequence[str]) -> Callable[[Sequence[Any]], T]:
+        """
+        Получить функцию, создающую объект класса T из строки результата
+        запроса со столбцами columns. Функции строятся один раз для каждого
+        набора столбцов и кэшируются.
+        """
+        key = tuple(columns)
+        factory = self._row_factories.get(key)
+        if factory is None:
+            factory = self._build_row_factory(key)
+            self._row_factories[key] = factory
+        return factory
+
+    def _cursor_row_factory(self, cursor: Cursor) -> Callable[[Sequence[Any]], T]:
+        return self.row_factory([column[0] for column in cursor.description])
+
+    def _build_row_factory(self, columns: tuple[str, ...]
+                           ) -> Callable[[Sequence[Any]], T]:
+        """
+        Построить функцию создания объекта по строке со столбцами columns.
+        Для датаклассов аргументы передаются конструктору позиционно,
+        значения извлекаются из строки одним вызовом itemgetter,
+        а преобразование применяется только к полям с датой.
+        """
+        positions: dict[str, int] = {}
+        for i, name in enumerate(columns):
+            positions.setdefault(name, i)
+        if 'pk' not in positions and 'rowid' in positions:
+            positions['pk'] = positions['rowid']
+        missing = [name for name in ('pk', *self.fields) if name not in positions]
+        if missing:
+            raise ValueError(f"Columns {missing} are missing in the query result")
+
+        clazz = self.entity_class
+        pk_position = positions['pk']
+        if is_dataclass(clazz):
+            names = [f.name for f in dataclass_fields(clazz) if f.init]
+        else:
+            names = list(self.fields)
+        converters = [(i, self._converters[name]) for i, name in enumerate(names)
+                      if name in self._converters]
+        getter = itemgetter(*(positions[name] for name in names), pk_position)
+        assign_pk = 'pk' not in names
+        positional = is_dataclass(clazz)
+
+        def factory(row: Sequence[Any]) -> T:
+            args = list(getter(row))
+            for i, convert in converters:
+                if args[i] is not None:
+                    args[i] = convert(args[i])
+            pk = args.pop()
+            obj = clazz(*args) if positional else clazz(**dict(zip(names, args)))
+            if assign_pk:
+                obj.pk = pk
+            return obj
+
+        return factory
 
     def add(self, obj: T) -> int:
         logging.debug("Starting add method with obj = %s", obj)
@@ -101,13 +411,10 @@ class SQLiteRepository(AbstractRepository[T]):
             raise ValueError(
                 f"Unable to insert object {obj}: it already has a primary key"
             )
-        values = [getattr(obj, x) for x in self.fields]
+        values = self._values(obj)
 
-        with sqlite3.connect(self.db_file) as connection:
-            cursor = connection.cursor()
-            cursor.execute(self.prepared_queries['foreign_keys'])
-            cursor.execute(self.prepared_queries['add'], values)
-        connection.close()
+        with self.connection_manager.transaction() as connection:
+            cursor = connection.execute(self.prepared_queries['add'], values)
 
         if cursor.lastrowid is not None:
             obj.pk = cursor.lastrowid
@@ -117,10 +424,9 @@ class SQLiteRepository(AbstractRepository[T]):
 
     def get(self, pk: int) -> T | None:
         logging.debug("Starting get method with pk = %d", pk)
-        with sqlite3.connect(self.db_file) as connection:
-            cursor = connection.cursor()
-            rows = cursor.execute(self.prepared_queries['get'], [pk]).fetchall()
-        connection.close()
+        with self.connection_manager.connection() as connection:
+            cursor = connection.execute(self.prepared_queries['get'], [pk])
+            rows = cursor.fetchall()
 
         rows_number = len(rows)
         if rows_number == 0:
@@ -128,27 +434,169 @@ class SQLiteRepository(AbstractRepository[T]):
         if rows_number > 1:
             raise ValueError(f"Several entries found for provided pk={pk}")
         row = rows[0]
-        execution_result = self.generate_object(self.fields, row)
-        logging.info("Exiting get method with: %s", execution_result)
+        execution_result = self._cursor_row_factory(cursor)(row)
+        logging.debug("Exiting get method with: %s", execution_result)
         return execution_result
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        logging.debug("Starting get_all method with where = %s", where)
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: OrderBy = None,
+                limit: int | None = None,
+                offset: int | None = None) -> list[T]:
+        logging.debug("Starting get_all method with where = %s, order_by = %s, "
+                      "limit = %s, offset = %s", where, order_by, limit, offset)
 
-        query = self.prepared_queries['get_all']
-        with sqlite3.connect(self.db_file) as connection:
-            cursor = connection.cursor()
+        query, params = self._build_select_query(where, order_by, limit, offset)
+        execution_result = self._fetch_all(query, params)
+        logging.debug("Exiting get_all method with %d objects", len(execution_result))
+        return execution_result
 
-            if where is not None:
-                query = self._add_conditions_to_query(query, where)
-                rows = cursor.execute(query, list(where.values())).fetchall()
-            else:
-                rows = cursor.execute(query).fetchall()
-        connection.close()
+    def get_batch(self, where: dict[str, Any] | None = None,
+                  order_by: OrderBy = None,
+                  limit: int | None = None,
+                  offset: int | None = None) -> RecordBatch[T]:
+        """
+        Получить записи пакетом: хранятся строки результата запроса,
+        объекты создаются функцией row_factory при обращении к ним
+        """
+        logging.debug("Starting get_batch method with where = %s, order_by = %s, "
+                      "limit = %s, offset = %s", where, order_by, limit, offset)
+        query, params = self._build_select_query(where, order_by, limit, offset)
+        with self.connection_manager.connection() as connection:
+            cursor = connection.execute(query, params)
+            rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        batch = RecordBatch(rows, self.row_factory(columns), columns)
+        logging.debug("Exiting get_batch method with %d rows", len(batch))
+        return batch
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 order_by: OrderBy = None) -> Generator[T, None, None]:
+        """
+        Перебрать записи, читая их из курсора порциями fetchmany(batch_size).
+        Пока перебор не завершен, соединение остается занятым текущим потоком.
+        """
+        logging.debug("Starting iter_all method with where = %s, batch_size = %d",
+                      where, batch_size)
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        query, params = self._build_select_query(where, order_by)
+        with self.connection_manager.connection() as connection:
+            cursor = connection.execute(query, params)
+            factory = self._cursor_row_factory(cursor)
+            try:
+                while rows := cursor.fetchmany(batch_size):
+                    yield from map(factory, rows)
+            finally:
+                cursor.close()
+        logging.debug("Exiting iter_all method")
+
+    def sum(self, field: str, where: dict[str, Any] | None = None) -> Number:
+        logging.debug("Starting sum method with field = %s, where = %s", field, where)
+        query, params = self._add_where(
+            f"SELECT COALESCE(SUM({self._column(field)}), 0) FROM {self.table_name}",
+            where)
+        with self.connection_manager.connection() as connection:
+            total: Number = connection.execute(query, params).fetchone()[0]
+        logging.debug("Exiting sum method with: %s", total)
+        return total
+
+    def sum_grouped(self, field: str, by: str,
+                    where: dict[str, Any] | None = None) -> dict[Any, Number]:
+        logging.debug("Starting sum_grouped method with field = %s, by = %s, "
+                      "where = %s", field, by, where)
+        group = self._column(by)
+        query, params = self._add_where(
+            f"SELECT {group}, COALESCE(SUM({self._column(field)}), 0) "
+            f"FROM {self.table_name}", where)
+        query += f" GROUP BY {group}"
+        convert = self._converters.get(by)
+        with self.connection_manager.connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        result = {convert(key) if convert and key is not None else key: total
+                  for key, total in rows}
+        logging.debug("Exiting sum_grouped method with %d groups", len(result))
+        return result
+
+    def sum_by_period(self, field: str, date_field: str, period: str = 'day',
+                      where: dict[str, Any] | None = None,
+                      by: str | None = None) -> dict[Any, Number]:
+        logging.debug("Starting sum_by_period method with field = %s, "
+                      "date_field = %s, period = %s, where = %s, by = %s",
+                      field, date_field, period, where, by)
+        check_period(period)
+        date_column = self._column(date_field)
+        keys = self.PERIOD_SQL[period].format(self.date_sql(date_field))
+        if by is not None:
+            keys = f"{self._column(by)}, {keys}"
+        query, params = self._add_where(
+            f"SELECT {keys}, COALESCE(SUM({self._column(field)}), 0) "
+            f"FROM {self.table_name}", where, [f"{date_column} IS NOT NULL"])
+        query += f" GROUP BY {keys}"
+        with self.connection_manager.connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        result: dict[date | tuple[Any, date], Number]
+        if by is None:
+            result = {date.fromisoformat(start): total for start, total in rows}
+        else:
+            result = {(key, date.fromisoformat(start)): total
+                      for key, start, total in rows}
+        logging.debug("Exiting sum_by_period method with %d groups", len(result))
+        return result
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        """
+        Получить предков записи одним рекурсивным запросом WITH RECURSIVE
+        """
+        logging.debug("Starting get_ancestors method with pk = %d", pk)
+        parent = self._column(parent_field)
+        start = 'ROWID' if include_self else parent
+        query = (
+            f"WITH RECURSIVE ancestors(pk, depth) AS ("
+            f"SELECT {start}, 0 FROM {self.table_name} WHERE ROWID = ? "
+            f"UNION ALL SELECT t.{parent}, a.depth + 1 "
+            f"FROM {self.table_name} AS t JOIN ancestors AS a ON t.ROWID = a.pk) "
+            f"{self._select_joined('ancestors')} ORDER BY a.depth"
+        )
+        result = self._fetch_all(query, [pk])
+        logging.debug("Exiting get_ancestors method with %d objects", len(result))
+        return result
 
-        execution_result = [self.generate_object(self.fields, row) for row in rows]
-        logging.debug("Exiting get_all method with: %s", execution_result)
-        return execution_result
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить потомков записи одним рекурсивным запросом WITH RECURSIVE.
+        Порядок обхода задается путем от записи pk до потомка, составленным
+        из id фиксированной ширины.
+        """
+        logging.debug("Starting get_descendants method with pk = %d", pk)
+        parent = self._column(parent_field)
+        query = (
+            f"WITH RECURSIVE descendants(pk, path) AS ("
+            f"SELECT ROWID, printf('%020d', ROWID) FROM {self.table_name} "
+            f"WHERE {parent} = ? "
+            f"UNION ALL SELECT t.ROWID, a.path || '/' || printf('%020d', t.ROWID) "
+            f"FROM {self.table_name} AS t JOIN descendants AS a ON t.{parent} = a.pk) "
+            f"{self._select_joined('descendants')} ORDER BY a.path"
+        )
+        result = self._fetch_all(query, [pk])
+        logging.debug("Exiting get_descendants method with %d objects", len(result))
+        return result
+
+    def _select_joined(self, cte: str) -> str:
+        """
+        Запрос записей таблицы, id которых перечислены в столбце pk
+        общего табличного выражения cte (под псевдонимом a)
+        """
+        names = ", ".join(f"t.{name} AS {name}" for name in self.fields)
+        return (f"SELECT t.ROWID AS pk, {names} FROM {self.table_name} AS t "
+                f"JOIN {cte} AS a ON t.ROWID = a.pk")
+
+    def _fetch_all(self, query: str, params: Sequence[Any]) -> list[T]:
+        with self.connection_manager.connection() as connection:
+            cursor = connection.execute(query, params)
+            rows = cursor.fetchall()
+        return list(map(self._cursor_row_factory(cursor), rows))
 
     def update(self, obj: T) -> None:
         logging.debug("Starting update method with obj=%s", obj)
@@ -158,37 +606,153 @@ class SQLiteRepository(AbstractRepository[T]):
                 "Object without `pk` attribute can't be used in update operation"
             )
 
-        values = [getattr(obj, field) for field in self.fields] + [obj.pk]
+        values = self._values(obj) + [obj.pk]
 
-        with sqlite3.connect(self.db_file) as connection:
-            cursor = connection.cursor()
-            cursor.execute(self.prepared_queries['foreign_keys'])
-            cursor.execute(self.prepared_queries['update'], values)
+        with self.connection_manager.transaction() as connection:
+            cursor = connection.execute(self.prepared_queries['update'], values)
 
             if cursor.rowcount == 0:
                 raise ValueError(f"Unable to update object with pk={obj.pk}")
-        connection.close()
 
         logging.debug("Exiting update method")
 
     def delete(self, pk: int) -> None:
         logging.debug("Starting delete method with pk = %d", pk)
-        with sqlite3.connect(self.db_file) as connection:
-            cursor = connection.cursor()
-
-            cursor.execute(self.prepared_queries['delete'], [pk])
+        with self.connection_manager.transaction() as connection:
+            cursor = connection.execute(self.prepared_queries['delete'], [pk])
             if cursor.rowcount == 0:
                 raise ValueError(f"Unable to delete object with pk={pk}")
-        connection.close()
 
         logging.debug("Exiting delete method")
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить объекты в одной транзакции. id каждого объекта берется
+        из lastrowid его запроса: ROWID новых записей не обязательно идут
+        подряд (например, после записи с наибольшим возможным ROWID).
+        """
+        objs = list(objs)
+        logging.debug("Starting add_many method with %d objects", len(objs))
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(
+                    f"Unable to insert object {obj}: it already has a primary key"
+                )
+        if not objs:
+            return []
+        values = [self._values(obj) for obj in objs]
+
+        with self.connection_manager.transaction() as connection:
+            pks = [connection.execute(self.prepared_queries['add'], row).lastrowid
+                   for row in values]
+
+        for obj, pk in zip(objs, pks):
+            if pk is not None:
+                obj.pk = pk
+
+        logging.debug("Exiting add_many method with %d pks", len(objs))
+        return [obj.pk for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        logging.debug("Starting update_many method with %d objects", len(objs))
+        if any(getattr(obj, 'pk', None) is None for obj in objs):
+            raise ValueError(
+                "Object without `pk` attribute can't be used in update operation"
+            )
+        if not objs:
+            return
+        values = [self._values(obj) + [obj.pk] for obj in objs]
+
+        with self.connection_manager.transaction() as connection:
+            cursor = connection.executemany(self.prepared_queries['update'], values)
+            if cursor.rowcount != len(values):
+                raise ValueError("Unable to update some of the objects: "
+                                 f"{len(values) - cursor.rowcount} not found")
+
+        logging.debug("Exiting update_many method")
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        values = [[pk] for pk in pks]
+        logging.debug("Starting delete_many method with %d pks", len(values))
+        if not values:
+            return
+
+        with self.connection_manager.transaction() as connection:
+            cursor = connection.executemany(self.prepared_queries['delete'], values)
+            if cursor.rowcount != len(values):
+                raise ValueError("Unable to delete some of the objects: "
+                                 f"{len(values) - cursor.rowcount} not found")
+
+        logging.debug("Exiting delete_many method")
+
+    def _column(self, field_name: str) -> str:
+        """
+        Получить столбец таблицы по названию поля модели
+        """
+        if field_name == 'pk':
+            return 'ROWID'
+        if field_name not in self.fields:
+            raise ValueError(
+                f"{self.entity_class.__name__} has no field {field_name!r}"
+            )
+        return field_name
+
+    def _build_select_query(self, where: dict[str, Any] | None,
+                            order_by: OrderBy = None,
+                            limit: int | None = None,
+                            offset: int | None = None) -> tuple[str, list[Any]]:
+        """
+        Построить запрос SELECT с условием, сортировкой и ограничением
+        результата. Вернуть текст запроса и список параметров.
+        """
+        check_limits(limit, offset)
+        query, params = self._add_where(self.prepared_queries['get_all'], where)
+        order = [f'{self._column(name)} DESC' if descending else self._column(name)
+                 for name, descending in parse_order_by(order_by)]
+        if order:
+            query += " ORDER BY " + ", ".join(order + ['ROWID'])
+        if limit is not None or offset is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset or 0]
+        return query, params
+
+    def _add_where(self, query: str, where: dict[str, Any] | None,
+                   extra_conditions: Sequence[str] = ()) -> tuple[str, list[Any]]:
+        """
+        Добавить к запросу блок WHERE с условием where и дополнительными
+        условиями без параметров. Вернуть текст запроса и список параметров.
+        """
+        conditions = {self._column(name): self._storage_condition(name, value)
+                      for name, value in (where or {}).items()}
+        if conditions:
+            query = self._add_conditions_to_query(query, conditions)
+        if extra_conditions:
+            query += " AND " if conditions else " WHERE "
+            query += " AND ".join(extra_conditions)
+        return query, self._conditions_params(conditions)
+
+    def _storage_condition(self, field_name: str, value: Any) -> Any:
+        """ Условие на поле field_name со значениями в формате хранения """
+        if field_name not in self.epoch_fields:
+            return value
+        return as_condition(value).map_values(to_epoch_us)
+
     @staticmethod
     def _add_conditions_to_query(initial_query: str, conditions: dict[str, Any]) -> str:
         """
         Метод добавляет условия conditions в блок WHERE запроса initial_query
         """
         conditions_string = " AND ".join(
-            [f"{condition} = ?" for condition in conditions.keys()]
+            [as_condition(value).to_sql(column)[0]
+             for column, value in conditions.items()]
         )
         return initial_query + f" WHERE {conditions_string}"
+
+    @staticmethod
+    def _conditions_params(conditions: dict[str, Any]) -> list[Any]:
+        """
+        Параметры запроса, построенного методом _add_conditions_to_query
+        """
+        return [param for column, value in conditions.items()
+                for param in as_condition(value).to_sql(column)[1]]
@@ -0,0 +1,174 @@
+"""
+Модуль описывает очередь записи в SQLite с групповой фиксацией
+
+При одновременной записи из нескольких потоков соединения конкурируют
+за блокировку базы на запись. WriterQueue направляет все записи в один
+поток записи: операции, накопившиеся в очереди, выполняются в одной
+транзакции и фиксируются одним COMMIT (групповая фиксация). Каждая
+операция выполняется в своей точке сохранения, поэтому ошибка одной
+операции откатывает только ее изменения.
+
+QueuedSQLiteRepository читает данные через соединение текущего потока
+(в режиме WAL чтение не блокируется записью), а записи передает в очередь
+и дожидается их фиксации.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Iterable, TypeVar
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.connection_manager import (
+    ConnectionManager, ThreadLocalConnectionManager)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.worker import QueueThread
+
+R = TypeVar('R')
+
+# операция очереди и future ее результата
+Operation = tuple[Callable[[], Any], 'Future[Any]']
+
+
+@dataclass
+class WriterStats:
+    """
+    Статистика очереди записи.
+    operations - выполненные операции
+    commits - групповые фиксации
+    failed - операции, завершившиеся ошибкой
+    """
+    operations: int = 0
+    commits: int = 0
+    failed: int = 0
+
+
+class WriterQueue(QueueThread[Operation]):
+    """
+    Поток записи в базу менеджера connection_manager.
+    max_batch - наибольшее число операций в одной фиксации
+    """
+
+    def __init__(self, connection_manager: ConnectionManager,
+                 max_batch: int = 256) -> None:
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be positive, got {max_batch}")
+        self.connection_manager = connection_manager
+        self.max_batch = max_batch
+        self.stats = WriterStats()
+        super().__init__('sqlite-writer')
+
+    @classmethod
+    def open(cls, db_file: str, profile: str = 'balanced',
+             **kwargs: Any) -> 'WriterQueue':
+        """
+        Очередь записи с собственным менеджером соединений
+        (по умолчанию в режиме WAL)
+        """
+        return cls(ThreadLocalConnectionManager(db_file, profile), **kwargs)
+
+    def submit(self, func: Callable[[], R]) -> 'Future[R]':
+        """
+        Поставить операцию func в очередь. Результат future становится
+        доступен после фиксации транзакции, в которой выполнена операция.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Cannot submit to the writer queue from its thread")
+        future: Future[R] = Future()
+        with self._condition:
+            self._put((func, future))
+        return future
+
+    def execute(self, func: Callable[[], R]) -> R:
+        """ Выполнить операцию func в потоке записи и дождаться фиксации """
+        return self.submit(func).result()
+
+    def _take(self) -> list[Operation]:
+        return [self._queue.popleft()
+                for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _process(self, batch: list[Operation]) -> None:
+        """ Выполнить операции batch в одной транзакции """
+        try:
+            with self.connection_manager.transaction():
+                results = self._execute(batch)
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.exception("Group commit of %d operations failed", len(batch))
+            self._fail(batch, exc)
+            return
+        self.stats.commits += 1
+        self._deliver(results)
+        logging.debug("Committed %d queued operations", len(results))
+
+    def _execute(self, batch: list[Operation]) -> list[tuple['Future[Any]', bool, Any]]:
+        """
+        Выполнить операции batch, каждую в своей точке сохранения.
+        Вернуть для каждой выполненной операции ее future, признак успеха
+        и результат или исключение.
+        """
+        results: list[tuple['Future[Any]', bool, Any]] = []
+        for func, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self.connection_manager.transaction():
+                    results.append((future, True, func()))
+            except Exception as exc:  # pylint: disable=broad-except
+                results.append((future, False, exc))
+        return results
+
+    def _fail(self, batch: list[Operation], exc: Exception) -> None:
+        """ Завершить ошибкой exc все неотмененные операции batch """
+        for _, future in batch:
+            if future.running() or (not future.done()
+                                    and future.set_running_or_notify_cancel()):
+                future.set_exception(exc)
+        self.stats.failed += len(batch)
+
+    def _deliver(self, results: list[tuple['Future[Any]', bool, Any]]) -> None:
+        """ Передать результаты зафиксированных операций их future """
+        for future, succeeded, value in results:
+            self.stats.operations += 1
+            if succeeded:
+                future.set_result(value)
+            else:
+                self.stats.failed += 1
+                future.set_exception(value)
+
+
+class QueuedSQLiteRepository(SQLiteRepository[T]):
+    """
+    SQLiteRepository, передающий записи в очередь writer.
+    Чтение выполняется в соединении текущего потока, полученном
+    от менеджера очереди. Записи внутри явной транзакции (transaction)
+    выполняются сразу в потоке вызывающего, в этой транзакции.
+    """
+
+    def __init__(self, db_file: str, clazz: type, writer: WriterQueue) -> None:
+        self.writer = writer
+        super().__init__(db_file, clazz, writer.connection_manager)
+
+    def _write(self, func: Callable[[], R]) -> R:
+        if self.connection_manager.in_transaction():
+            return func()
+        return self.writer.execute(func)
+
+    def add(self, obj: T) -> int:
+        return self._write(partial(super().add, obj))
+
+    def update(self, obj: T) -> None:
+        self._write(partial(super().update, obj))
+
+    def delete(self, pk: int) -> None:
+        self._write(partial(super().delete, pk))
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        return self._write(partial(super().add_many, list(objs)))
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        self._write(partial(super().update_many, list(objs)))
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        self._write(partial(super().delete_many, list(pks)))
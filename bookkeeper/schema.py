@@ -0,0 +1,75 @@
+"""
+Схема базы данных приложения
+
+Шаги миграции схемы по версиям (PRAGMA user_version):
+1 - таблицы категорий, расходов и бюджетов с индексами
+2 - таблица замыкания иерархии категорий
+3 - даты расходов хранятся целым числом микросекунд от 1970-01-01
+4 - таблица дневных итогов расходов по категориям
+"""
+
+from sqlite3 import Connection
+
+from bookkeeper.repository.migrations import Migration, Migrator, rebuild_table
+from bookkeeper.repository.rollup import RollupSpec
+from bookkeeper.repository.sqlite_repository import (
+    closure_table_sql, expected_closure_sql)
+
+
+def _create_tables(connection: Connection) -> None:
+    # таблицы могут уже существовать в базе, созданной до версионирования схемы
+    for statement in [
+        "CREATE TABLE IF NOT EXISTS category "
+        "(name TEXT, parent INTEGER, pk INTEGER PRIMARY KEY)",
+        "CREATE INDEX IF NOT EXISTS idx_category_name ON category (name)",
+        "CREATE INDEX IF NOT EXISTS idx_category_parent ON category (parent)",
+        "CREATE TABLE IF NOT EXISTS expense "
+        "(amount INTEGER, category INTEGER, expense_date TIMESTAMP, "
+        "added_date TIMESTAMP, comment TEXT, pk INTEGER PRIMARY KEY)",
+        "CREATE INDEX IF NOT EXISTS idx_expense_category ON expense (category)",
+        "CREATE INDEX IF NOT EXISTS idx_expense_expense_date "
+        "ON expense (expense_date)",
+        "CREATE TABLE IF NOT EXISTS budget "
+        "(duration INTEGER, category INTEGER, amount INTEGER, "
+        "pk INTEGER PRIMARY KEY)",
+        "CREATE INDEX IF NOT EXISTS idx_budget_category ON budget (category)",
+    ]:
+        connection.execute(statement)
+
+
+def _create_category_closure(connection: Connection) -> None:
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+        "AND name = 'category_closure'").fetchone() is not None
+    for statement in closure_table_sql('category', 'parent', 'category_closure'):
+        connection.execute(statement)
+    if not exists:
+        connection.execute("INSERT INTO category_closure "
+                           f"{expected_closure_sql('category', 'parent')}")
+
+
+def _expense_dates_to_epoch(connection: Connection) -> None:
+    rebuild_table(connection, 'expense',
+                  {'expense_date': 'INTEGER', 'added_date': 'INTEGER'},
+                  {'expense_date': 'to_epoch_us(expense_date)',
+                   'added_date': 'to_epoch_us(added_date)'})
+
+
+# итоги, которые читает DailyRollup(expense_repo, 'amount', 'expense_date',
+# by='category')
+EXPENSE_ROLLUP = RollupSpec('expense', 'amount', 'expense_date', by='category',
+                            epoch=True)
+
+
+def _create_expense_rollup(connection: Connection) -> None:
+    EXPENSE_ROLLUP.create(connection)
+
+
+MIGRATIONS = [
+    Migration(1, 'category, expense and budget tables', _create_tables),
+    Migration(2, 'category closure table', _create_category_closure),
+    Migration(3, 'expense dates as epoch microseconds', _expense_dates_to_epoch),
+    Migration(4, 'daily expense totals by category', _create_expense_rollup),
+]
+
+MIGRATOR = Migrator(MIGRATIONS)
@@ -7,8 +7,8 @@ from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.utils import read_tree
 
-cat_repo = MemoryRepository[Category]()
-exp_repo = MemoryRepository[Expense]()
+cat_repo = MemoryRepository[Category](Category)
+exp_repo = MemoryRepository[Expense](Expense)
 
 cats = '''
 продукты
@@ -4,17 +4,35 @@
 
 from typing import Protocol, Callable
 
+from bookkeeper.budget_engine import BudgetStatus
 from bookkeeper.models.budget import Budget
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.repository.aggregation import Number
+
+# fetcher(pk, done) передает в done подкатегории категории pk
+ChildrenFetcher = Callable[[int | None, Callable[[list[Category]], None]], None]
+# fetcher(pk, limit, done) передает в done не более limit расходов с id больше pk
+ExpenseFetcher = Callable[[int, int, Callable[[list[Expense]], None]], None]
 
 
 class AbstractView(Protocol):
     """
     Интерфейс для взаимодействия UI и логики приложения
+
+    Методы set_*_list передают представлению полный список объектов.
+    После изменения отдельных объектов presenter сообщает только об этих
+    изменениях методами *_added, *_changed и *_removed, чтобы представление
+    обновляло одну строку, а не перестраивалось целиком.
     """
-    def run(self) -> None:
-        pass
+    def run(self, on_shown: Callable[[], None] | None = None) -> None:
+        """
+        Показать окно и запустить цикл обработки событий.
+        on_shown вызывается после первой отрисовки окна.
+        """
+
+    def data_loaded(self) -> None:
+        """ Начальная загрузка данных завершена """
 
     def set_category_list(self, categories: list[Category]) -> None:
         pass
@@ -25,6 +43,67 @@ class AbstractView(Protocol):
     def set_expense_list(self, categories: list[Expense]) -> None:
         pass
 
+    def set_category_source(self, fetcher: ChildrenFetcher) -> None:
+        """
+        Передать функцию загрузки подкатегорий для дерева категорий:
+        fetcher(pk, done) передает в done подкатегории категории pk
+        (при pk=None - категории верхнего уровня) в порядке возрастания id.
+        done может быть вызвана позже, после завершения чтения.
+        """
+
+    def set_expense_source(self, fetcher: ExpenseFetcher) -> None:
+        """
+        Передать функцию постраничной загрузки расходов:
+        fetcher(pk, limit, done) передает в done не более limit расходов
+        с id больше pk в порядке возрастания id
+        """
+
+    def set_expense_totals(self, totals: list[Number]) -> None:
+        """ Суммы расходов за день, неделю и месяц """
+
+    def set_budget_statuses(self, statuses: list[BudgetStatus]) -> None:
+        """ Состояния всех бюджетов: потраченные суммы и превышения """
+
+    def set_pending_operations(self, count: int) -> None:
+        """ Число операций с хранилищем, ожидающих выполнения """
+
+    def show_error(self, message: str) -> None:
+        """ Сообщить пользователю об ошибке операции """
+
+    def post(self, callback: Callable[[], None]) -> None:
+        """
+        Выполнить callback в потоке интерфейса.
+        Метод можно вызывать из любого потока.
+        """
+        callback()
+
+    def category_added(self, category: Category) -> None:
+        """ В хранилище добавлена категория """
+
+    def category_changed(self, category: Category) -> None:
+        """ Изменена категория с id category.pk """
+
+    def category_removed(self, pk: int) -> None:
+        """ Удалена категория с id pk """
+
+    def budget_added(self, budget: Budget) -> None:
+        """ В хранилище добавлен бюджет """
+
+    def budget_changed(self, budget: Budget) -> None:
+        """ Изменен бюджет с id budget.pk """
+
+    def budget_removed(self, pk: int) -> None:
+        """ Удален бюджет с id pk """
+
+    def expense_added(self, expense: Expense) -> None:
+        """ В хранилище добавлен расход """
+
+    def expense_changed(self, expense: Expense) -> None:
+        """ Изменен расход с id expense.pk """
+
+    def expense_removed(self, pk: int) -> None:
+        """ Удален расход с id pk """
+
     def register_category_creator(self, handler: Callable[[Category], int]) -> None:
         pass
 
@@ -1,49 +1,274 @@
 """
-Модуль для визуализации таблицы категорий
+Модуль для визуализации дерева категорий
 """
 
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, overload
+
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtWidgets import QHeaderView, QAbstractItemView
 
 from bookkeeper.models.category import Category
-from bookkeeper.view.common import EditButton
+from bookkeeper.view.abstract_view import ChildrenFetcher
+from bookkeeper.view.common import EditButtonDelegate, ModelIndex
+
+
+class _CategoryNode:  # pylint: disable=too-few-public-methods
+    """
+    Узел дерева категорий. children is None - подкатегории еще не загружены,
+    loading - запрошены, но еще не получены
+    """
+    __slots__ = ('category', 'parent', 'children', 'loading')
+
+    def __init__(self, category: Category | None,
+                 parent: '_CategoryNode | None') -> None:
+        self.category = category
+        self.parent = parent
+        self.children: list[_CategoryNode] | None = None
+        self.loading = False
+
+    @property
+    def pk(self) -> int | None:
+        return None if self.category is None else self.category.pk
+
+    def row(self) -> int:
+        assert self.parent is not None and self.parent.children is not None
+        return self.parent.children.index(self)
+
+
+class CategoryTreeModel(QtCore.QAbstractItemModel):
+    """
+    Модель дерева категорий. Подкатегории узла запрашиваются функцией
+    fetcher(parent_pk, done) только при раскрытии узла (canFetchMore /
+    fetchMore) и добавляются в дерево, когда fetcher передаст их в done.
+    Подкатегории каждого узла упорядочены по id.
+    """
+    HEADERS = ['Название', 'ID', '']
+    EDIT_COLUMN = 2
+
+    def __init__(self, parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self.fetcher: ChildrenFetcher = lambda pk, done: done([])
+        self.root = _CategoryNode(None, None)
+        self.nodes: dict[int, _CategoryNode] = {}
+
+    def set_fetcher(self, fetcher: ChildrenFetcher) -> None:
+        self.beginResetModel()
+        self.fetcher = fetcher
+        self.root = _CategoryNode(None, None)
+        self.nodes = {}
+        self.endResetModel()
+
+    def _node(self, index: ModelIndex) -> _CategoryNode:
+        return index.internalPointer() if index.isValid() else self.root
+
+    def _index_of(self, node: _CategoryNode) -> QtCore.QModelIndex:
+        if node is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row(), 0, node)
+
+    def index(self, row: int, column: int,
+              parent: ModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        children = self._node(parent).children
+        if children is None or not 0 <= row < len(children):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    @overload
+    def parent(self) -> QtCore.QObject | None:
+        ...
+
+    @overload
+    def parent(self, index: ModelIndex) -> QtCore.QModelIndex:
+        ...
+
+    def parent(self, index: ModelIndex | None = None
+               ) -> QtCore.QObject | QtCore.QModelIndex | None:
+        if index is None:
+            # QObject.parent(): владелец модели
+            return super().parent()
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        node = index.internalPointer().parent
+        return self._index_of(node)
+
+    def rowCount(self, parent: ModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid() and parent.column() != 0:
+            return 0
+        children = self._node(parent).children
+        return 0 if children is None else len(children)
+
+    def columnCount(self, parent: ModelIndex = QtCore.QModelIndex()) -> int:
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent: ModelIndex = QtCore.QModelIndex()) -> bool:
+        children = self._node(parent).children
+        return children is None or len(children) > 0
+
+    def canFetchMore(self, parent: ModelIndex) -> bool:
+        node = self._node(parent)
+        return node.children is None and not node.loading
+
+    def fetchMore(self, parent: ModelIndex) -> None:
+        node = self._node(parent)
+        if node.children is not None or node.loading:
+            return
+        node.loading = True
+        self.fetcher(node.pk, lambda categories: self._fetched(node, categories))
+
+    def _in_tree(self, node: _CategoryNode) -> bool:
+        return node is self.root or (
+            node.pk is not None and self.nodes.get(node.pk) is node)
+
+    def _fetched(self, node: _CategoryNode, categories: list[Category]) -> None:
+        """ Добавить в дерево загруженные подкатегории узла node """
+        node.loading = False
+        if node.children is not None or not self._in_tree(node):
+            # узел удален или модель сброшена, пока шло чтение
+            return
+        categories = sorted(categories, key=lambda cat: cat.pk)
+        parent = self._index_of(node)
+        node.children = []
+        if not categories:
+            # узел оказался листом: стрелка раскрытия больше не нужна
+            self.dataChanged.emit(parent, parent)
+            return
+        self.beginInsertRows(parent, 0, len(categories) - 1)
+        for cat in categories:
+            self._attach(node, cat, len(node.children))
+        self.endInsertRows()
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == QtCore.Qt.Orientation.Horizontal \
+                and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: ModelIndex,
+             role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        cat = index.internalPointer().category
+        if role == QtCore.Qt.ItemDataRole.UserRole:
+            return cat.pk
+        if role != QtCore.Qt.ItemDataRole.DisplayRole:
+            return None
+        if index.column() == 0:
+            return cat.name
+        if index.column() == 1:
+            return str(cat.pk)
+        return None
+
+    def _attach(self, parent: _CategoryNode, cat: Category, row: int) -> None:
+        assert parent.children is not None
+        node = _CategoryNode(cat, parent)
+        parent.children.insert(row, node)
+        self.nodes[cat.pk] = node
+
+    def _forget(self, node: _CategoryNode) -> None:
+        if node.pk is not None:
+            self.nodes.pop(node.pk, None)
+        for child in node.children or []:
+            self._forget(child)
+
+    def add(self, cat: Category) -> None:
+        """
+        Показать новую категорию, если подкатегории ее родителя загружены
+        """
+        parent = self.root if cat.parent is None else self.nodes.get(cat.parent)
+        if parent is None or parent.children is None:
+            return
+        # категория не задана только у корня, он не бывает дочерним узлом
+        row = bisect_left([child.category.pk for child in parent.children
+                           if child.category is not None], cat.pk)
+        self.beginInsertRows(self._index_of(parent), row, row)
+        self._attach(parent, cat, row)
+        self.endInsertRows()
+
+    def remove(self, pk: int) -> None:
+        node = self.nodes.get(pk)
+        if node is None or node.parent is None:
+            return
+        row = node.row()
+        self.beginRemoveRows(self._index_of(node.parent), row, row)
+        assert node.parent.children is not None
+        del node.parent.children[row]
+        self._forget(node)
+        self.endRemoveRows()
+
+    def update(self, cat: Category) -> None:
+        node = self.nodes.get(cat.pk)
+        if node is None or node.pk is None:
+            self.add(cat)
+            return
+        assert node.parent is not None
+        # категория могла быть изменена на месте: родитель узла в дереве -
+        # прежний родитель категории
+        if node.parent.pk != cat.parent:
+            self.remove(cat.pk)
+            self.add(cat)
+            return
+        node.category = cat
+        index = self._index_of(node)
+        self.dataChanged.emit(index, index.siblingAtColumn(len(self.HEADERS) - 1))
+
+    def category_by_pk(self, pk: int) -> Category | None:
+        node = self.nodes.get(pk)
+        return None if node is None else node.category
 
 
 class CategoryWidget(QtWidgets.QWidget):
     """
-    Класс предоставляет доступ к таблице категорий
+    Класс предоставляет доступ к дереву категорий
     """
     activate_editing_mode_signal = QtCore.Signal(int)
 
     def __init__(self) -> None:
         super().__init__()
-        self.table = QtWidgets.QTableWidget(20, 4)
+        self.model = CategoryTreeModel(self)
+        self.tree = QtWidgets.QTreeView()
+        self.tree.setModel(self.model)
+        self.edit_delegate = EditButtonDelegate(self.activate_editing_mode_signal,
+                                                self.tree)
+        self.tree.setItemDelegateForColumn(CategoryTreeModel.EDIT_COLUMN,
+                                           self.edit_delegate)
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(QtWidgets.QLabel('Категории'))
-        layout.addWidget(self.table)
+        layout.addWidget(self.tree)
 
-        self.table.setHorizontalHeaderLabels([''] + "ID Родитель Название".split())
-        self.table.verticalHeader().hide()
-        header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        header = self.tree.header()
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
-        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.Fixed)
+        self.tree.setColumnWidth(2, 35)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
 
     def set_data(self, categories: list[Category]) -> None:
-        self.table.setRowCount(len(categories))
-        for i, cat in enumerate(categories):
-            self.table.setCellWidget(i, 0,
-                                     EditButton(i, self.activate_editing_mode_signal))
-            self.table.setItem(i, 1, QtWidgets.QTableWidgetItem(str(cat.pk)))
-            self.table.setItem(i, 2, QtWidgets.QTableWidgetItem(str(cat.parent)))
-            self.table.setItem(i, 3, QtWidgets.QTableWidgetItem(cat.name))
+        children: dict[int | None, list[Category]] = defaultdict(list)
+        for cat in categories:
+            children[cat.parent].append(cat)
+        self.model.set_fetcher(lambda pk, done: done(children.get(pk, [])))
+
+    def set_fetcher(self, fetcher: ChildrenFetcher) -> None:
+        self.model.set_fetcher(fetcher)
+
+    def add_row(self, cat: Category) -> None:
+        self.model.add(cat)
+
+    def update_row(self, cat: Category) -> None:
+        self.model.update(cat)
+
+    def remove_row(self, pk: int) -> None:
+        self.model.remove(pk)
 
     def set_edit_buttons_active(self, is_active: bool) -> None:
-        for i in range(self.table.rowCount()):
-            self.table.cellWidget(i, 0).setDisabled(not is_active)
+        self.edit_delegate.enabled = is_active
+        self.tree.viewport().update()
 
 
 class AddCategoryWidget(QtWidgets.QWidget):
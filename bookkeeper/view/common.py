@@ -7,6 +7,10 @@ from PySide6.QtCore import Qt, QSize
 from PySide6.QtWidgets import QHeaderView
 
 from bookkeeper.models.budget import Budget
+from bookkeeper.repository.aggregation import Number
+
+# индекс элемента модели в переопределяемых методах Qt (как в заглушках PySide6)
+ModelIndex = QtCore.QModelIndex | QtCore.QPersistentModelIndex
 
 
 class DateWidget(QtWidgets.QDateEdit):
@@ -24,7 +28,8 @@ class DateWidget(QtWidgets.QDateEdit):
 
 class EditButton(QtWidgets.QPushButton):
     """
-    Кнопка для редактирования
+    Кнопка для редактирования.
+    При нажатии передает в on_click_signal значение index (id записи)
     """
     edit_icon = None
 
@@ -42,6 +47,43 @@ class EditButton(QtWidgets.QPushButton):
         self.clicked.connect(lambda _: self.on_click_signal.emit(self.index))
 
 
+class EditButtonDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Делегат, рисующий в ячейке кнопку редактирования вместо отдельного
+    виджета на каждую строку. При нажатии передает в on_click_signal
+    значение ячейки с ролью UserRole (id записи).
+    """
+    def __init__(self, on_click_signal: QtCore.SignalInstance,
+                 parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self.on_click_signal = on_click_signal
+        self.enabled = True
+
+    def paint(self, painter: QtGui.QPainter,
+              option: QtWidgets.QStyleOptionViewItem,
+              index: ModelIndex) -> None:
+        button = QtWidgets.QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.icon = QtGui.QIcon(EditButton.get_icon())
+        button.iconSize = QSize(25, 25)
+        button.state = QtWidgets.QStyle.StateFlag.State_Enabled if self.enabled \
+            else QtWidgets.QStyle.StateFlag.State_None
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.ControlElement.CE_PushButton, button, painter)
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem,
+                 index: ModelIndex) -> QSize:
+        return QSize(35, 31)
+
+    def editorEvent(self, event: QtCore.QEvent, model: QtCore.QAbstractItemModel,
+                    option: QtWidgets.QStyleOptionViewItem,
+                    index: ModelIndex) -> bool:
+        if self.enabled and event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            self.on_click_signal.emit(index.data(Qt.ItemDataRole.UserRole))
+            return True
+        return False
+
+
 class BudgetWidget(QtWidgets.QWidget):
     """
     Визуализация бюджета
@@ -50,14 +92,21 @@ class BudgetWidget(QtWidgets.QWidget):
         super().__init__()
         self.table = QtWidgets.QTableWidget(3, 2)
         self.budgets: list[Budget] = []
+        self.exceeded_rows: list[int] = []
 
         self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding,
                            QtWidgets.QSizePolicy.Policy.Maximum)
         self.setFixedHeight(156)
 
+        self.alerts = QtWidgets.QLabel()
+        self.alerts.setStyleSheet('color: red')
+        self.alerts.setWordWrap(True)
+        self.alerts.hide()
+
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(QtWidgets.QLabel('Бюджет'))
         layout.addWidget(self.table)
+        layout.addWidget(self.alerts)
 
         self.table.setHorizontalHeaderLabels("Сумма Бюджет".split())
         self.table.setVerticalHeaderLabels("День Неделя Месяц".split())
@@ -86,8 +135,27 @@ class BudgetWidget(QtWidgets.QWidget):
         self.table.setItem(2, 1, QtWidgets.QTableWidgetItem(
             str(for_month.amount) if for_month else ''))
 
-    def set_expenses(self, expenses: list[int]) -> None:
+    def set_expenses(self, expenses: list[Number]) -> None:
         for_day, for_week, for_month = expenses[:3]
         self.table.setItem(0, 0, QtWidgets.QTableWidgetItem(str(for_day)))
         self.table.setItem(1, 0, QtWidgets.QTableWidgetItem(str(for_week)))
         self.table.setItem(2, 0, QtWidgets.QTableWidgetItem(str(for_month)))
+        self._paint_rows()
+
+    def set_alerts(self, exceeded_rows: list[int], alerts: list[str]) -> None:
+        """
+        Выделить строки превышенных общих бюджетов exceeded_rows
+        и показать сообщения alerts о превышенных бюджетах категорий
+        """
+        self.exceeded_rows = exceeded_rows
+        self._paint_rows()
+        self.alerts.setText('Превышен бюджет: ' + '; '.join(alerts) if alerts else '')
+        self.alerts.setVisible(bool(alerts))
+        self.setFixedHeight(156 + (self.alerts.sizeHint().height() if alerts else 0))
+
+    def _paint_rows(self) -> None:
+        for row in range(3):
+            item = self.table.item(row, 0)
+            if item is not None:
+                item.setForeground(QtGui.QColor('red') if row in self.exceeded_rows
+                                   else self.palette().text().color())
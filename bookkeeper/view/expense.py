@@ -1,27 +1,188 @@
+"""
+Модуль для визуализации таблицы расходов
+"""
+
+from bisect import bisect_left
+from dataclasses import replace
+from typing import Any
+
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtWidgets import QHeaderView, QAbstractItemView
 
 from bookkeeper.models.expense import Expense
-from bookkeeper.view.common import EditButton, DateWidget
+from bookkeeper.view.abstract_view import ExpenseFetcher
+from bookkeeper.view.common import EditButtonDelegate, DateWidget, ModelIndex
+
+
+class ExpenseTableModel(QtCore.QAbstractTableModel):
+    """
+    Модель таблицы расходов. Строки хранятся в порядке возрастания id.
+    Если задана функция загрузки fetcher, расходы подгружаются порциями
+    по мере прокрутки таблицы (canFetchMore / fetchMore): fetcher(pk, limit,
+    done) передает в done не более limit расходов с id больше pk. Следующая
+    порция запрашивается только после получения предыдущей.
+    """
+    HEADERS = [''] + "Дата Сумма Категория Комментарий".split()
+    FETCH_BATCH = 200
+
+    def __init__(self, parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self.expenses: list[Expense] = []
+        self.pks: list[int] = []
+        self.category_names: dict[int, str] = {}
+        self.fetcher: ExpenseFetcher | None = None
+        self.all_fetched = True
+        self.fetching = False
+
+    def set_data(self, expenses: list[Expense]) -> None:
+        self.beginResetModel()
+        self.expenses = sorted(expenses, key=lambda exp: exp.pk)
+        self.pks = [exp.pk for exp in self.expenses]
+        self.fetcher = None
+        self.all_fetched = True
+        self.fetching = False
+        self.endResetModel()
+
+    def set_fetcher(self, fetcher: ExpenseFetcher) -> None:
+        self.beginResetModel()
+        self.expenses = []
+        self.pks = []
+        self.fetcher = fetcher
+        self.all_fetched = False
+        self.fetching = False
+        self.endResetModel()
+
+    def set_category_names(self, category_names: dict[int, str]) -> None:
+        self.category_names = category_names
+        if self.expenses:
+            self.dataChanged.emit(self.index(0, 3),
+                                  self.index(len(self.expenses) - 1, 3))
+
+    def rowCount(self, parent: ModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.expenses)
+
+    def columnCount(self, parent: ModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == QtCore.Qt.Orientation.Horizontal \
+                and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: ModelIndex,
+             role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        exp = self.expenses[index.row()]
+        if role == QtCore.Qt.ItemDataRole.UserRole:
+            return exp.pk
+        if role != QtCore.Qt.ItemDataRole.DisplayRole:
+            return None
+        column = index.column()
+        if column == 1:
+            return str(exp.expense_date.date())
+        if column == 2:
+            return str(exp.amount)
+        if column == 3:
+            return self.category_names.get(exp.category, '')
+        if column == 4:
+            return exp.comment
+        return None
+
+    def canFetchMore(self, parent: ModelIndex = QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and not self.all_fetched and not self.fetching
+
+    def fetchMore(self, parent: ModelIndex = QtCore.QModelIndex()) -> None:
+        if not self.canFetchMore(parent) or self.fetcher is None:
+            return
+        last_pk = self.pks[-1] if self.pks else 0
+        fetcher = self.fetcher
+        self.fetching = True
+        fetcher(last_pk, self.FETCH_BATCH,
+                lambda batch: self._fetched(fetcher, batch))
+
+    def _fetched(self, fetcher: ExpenseFetcher, batch: list[Expense]) -> None:
+        """ Добавить в конец таблицы порцию расходов, загруженную fetcher """
+        if fetcher is not self.fetcher:
+            # модель сброшена, пока шло чтение
+            return
+        self.fetching = False
+        self.all_fetched = len(batch) < self.FETCH_BATCH
+        last_pk = self.pks[-1] if self.pks else 0
+        batch = [exp for exp in batch if exp.pk > last_pk]
+        if not batch:
+            return
+        first = len(self.expenses)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(batch) - 1)
+        self.expenses.extend(batch)
+        self.pks.extend(exp.pk for exp in batch)
+        self.endInsertRows()
+
+    def row_of(self, pk: int) -> int | None:
+        row = bisect_left(self.pks, pk)
+        if row < len(self.pks) and self.pks[row] == pk:
+            return row
+        return None
+
+    def expense_by_pk(self, pk: int) -> Expense | None:
+        row = self.row_of(pk)
+        return None if row is None else self.expenses[row]
+
+    def add(self, exp: Expense) -> None:
+        row = bisect_left(self.pks, exp.pk)
+        if row == len(self.pks) and not self.all_fetched:
+            # расход будет загружен очередным вызовом fetchMore
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.expenses.insert(row, exp)
+        self.pks.insert(row, exp.pk)
+        self.endInsertRows()
+
+    def update(self, exp: Expense) -> None:
+        row = self.row_of(exp.pk)
+        if row is None:
+            return
+        self.expenses[row] = exp
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, len(self.HEADERS) - 1))
+
+    def remove(self, pk: int) -> None:
+        row = self.row_of(pk)
+        if row is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.expenses[row]
+        del self.pks[row]
+        self.endRemoveRows()
 
 
 class ExpensesWidget(QtWidgets.QWidget):
+    """
+    Таблица расходов. Отображаются только видимые строки модели,
+    кнопка редактирования рисуется делегатом.
+    """
     activate_editing_mode_signal = QtCore.Signal(int)
 
     def __init__(self) -> None:
         super().__init__()
-        self.expenses: list[Expense] = []
-        self.table = QtWidgets.QTableWidget(20, 5)
+        self.model = ExpenseTableModel(self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.edit_delegate = EditButtonDelegate(self.activate_editing_mode_signal,
+                                                self.table)
+        self.table.setItemDelegateForColumn(0, self.edit_delegate)
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(QtWidgets.QLabel('Последние расходы'))
         layout.addWidget(self.table)
 
-        self.table.setHorizontalHeaderLabels(
-            [''] + "Дата Сумма Категория Комментарий".split())
         self.table.verticalHeader().hide()
+        self.table.verticalHeader().setDefaultSectionSize(31)
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Fixed)
+        self.table.setColumnWidth(0, 35)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
@@ -30,21 +191,30 @@ class ExpensesWidget(QtWidgets.QWidget):
 
     def set_data(self, expenses: list[Expense],
                  category_id_name_mapping: dict[int, str]) -> None:
-        self.expenses = expenses
-        self.table.setRowCount(len(expenses))
-        for i, exp in enumerate(expenses):
-            self.table.setCellWidget(i, 0,
-                                     EditButton(i, self.activate_editing_mode_signal))
-            self.table.setItem(i, 1, QtWidgets.QTableWidgetItem(
-                str(exp.expense_date.date())))
-            self.table.setItem(i, 2, QtWidgets.QTableWidgetItem(str(exp.amount)))
-            self.table.setItem(i, 3, QtWidgets.QTableWidgetItem(
-                category_id_name_mapping[exp.category]))
-            self.table.setItem(i, 4, QtWidgets.QTableWidgetItem(exp.comment))
+        self.model.set_category_names(category_id_name_mapping)
+        self.model.set_data(expenses)
+
+    def set_fetcher(self, fetcher: ExpenseFetcher) -> None:
+        self.model.set_fetcher(fetcher)
+
+    def set_category_names(self, category_id_name_mapping: dict[int, str]) -> None:
+        self.model.set_category_names(category_id_name_mapping)
+
+    def add_row(self, exp: Expense) -> None:
+        self.model.add(exp)
+
+    def update_row(self, exp: Expense) -> None:
+        self.model.update(exp)
+
+    def remove_row(self, pk: int) -> None:
+        self.model.remove(pk)
+
+    def expense_by_pk(self, pk: int) -> Expense | None:
+        return self.model.expense_by_pk(pk)
 
     def set_edit_buttons_active(self, is_active: bool) -> None:
-        for i in range(self.table.rowCount()):
-            self.table.cellWidget(i, 0).setDisabled(not is_active)
+        self.edit_delegate.enabled = is_active
+        self.table.viewport().update()
 
 
 class AddExpensesWidget(QtWidgets.QWidget):
@@ -131,7 +301,9 @@ class AddExpensesWidget(QtWidgets.QWidget):
         self.update_signal.emit(self.cur_expense, self.cat_input.currentText())
 
     def activate_editing_mode(self, expense: Expense, cat_name: str) -> None:
-        self.cur_expense = expense
+        # форма изменяет копию: прежнее состояние расхода остается
+        # в таблице и хранилище до сохранения
+        self.cur_expense = replace(expense)
         self.sum_input.setText(str(expense.amount))
         self.cat_input.setCurrentText(cat_name)
         self.comment_input.setText(expense.comment)
@@ -1,33 +1,31 @@
-from datetime import datetime, timedelta
 from typing import Callable
 
 from PySide6 import QtGui
 
-from PySide6.QtWidgets import (QMainWindow, QWidget,
+from PySide6.QtWidgets import (QMainWindow, QMessageBox, QWidget,
                                QTabWidget, QVBoxLayout, QTableWidgetItem)
 
-from bookkeeper.models.budget import Budget
+from bookkeeper.budget_engine import BudgetStatus
+from bookkeeper.models.budget import Budget, DAY, WEEK, MONTH
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.view.abstract_view import ChildrenFetcher, ExpenseFetcher
 from bookkeeper.view.common import BudgetWidget
 from bookkeeper.view.category import CategoryWidget, AddCategoryWidget
 from bookkeeper.view.expense import ExpensesWidget, AddExpensesWidget
 
 
 class MainWindow(QMainWindow):
-    DAY = 1
-    WEEK = 7
-    MONTH = 30
-
     BOOKKEEPER_APP_LOGO_PATH: str = "../../resources/logo.png"
 
     def __init__(self) -> None:
         super().__init__()
         self.category_id_name_mapping: dict[int, str] = dict()
         self.category_name_id_mapping: dict[str, int] = dict()
-        self.categories: list[Category] = []
+        self.categories: dict[int, Category] = {}
         self.budgets: list[Budget] = []
-        self.expenses: list[Expense] = []
+        self.category_source: ChildrenFetcher | None = None
         self.category_creator: Callable[[Category], int] = lambda x: -1
         self.category_updater: Callable[[Category], None] = lambda x: None
         self.category_deleter: Callable[[int], None] = lambda x: None
@@ -89,11 +87,25 @@ class MainWindow(QMainWindow):
 
         self.budget_table.table.itemChanged.connect(self.on_budget_item_changed)
 
-    def activate_expense_editing_mode(self, row_index: int) -> None:
+        self.loading = True
+        for widget in (self.add_expense, self.add_category, self.budget_table):
+            widget.setEnabled(False)
+        self.statusBar().showMessage('Загрузка данных...')
+
+    def data_loaded(self) -> None:
+        self.loading = False
+        for widget in (self.add_expense, self.add_category, self.budget_table):
+            widget.setEnabled(True)
+        self.statusBar().clearMessage()
+
+    def activate_expense_editing_mode(self, pk: int) -> None:
+        expense = self.expenses_table.expense_by_pk(pk)
+        if expense is None:
+            return
         self.expenses_table.set_edit_buttons_active(False)
+        # категория расхода могла быть удалена
         self.add_expense.activate_editing_mode(
-            self.expenses[row_index],
-            self.category_id_name_mapping[self.expenses[row_index].category])
+            expense, self.category_id_name_mapping.get(expense.category, ''))
 
     def deactivate_expense_editing_mode(self) -> None:
         self.expenses_table.set_edit_buttons_active(True)
@@ -112,10 +124,9 @@ class MainWindow(QMainWindow):
         expense.category = self.category_name_id_mapping[cat]
         self.expense_creator(expense)
 
-    def activate_category_editing_mode(self, row_index: int) -> None:
+    def activate_category_editing_mode(self, pk: int) -> None:
         self.category_table.set_edit_buttons_active(False)
-        self.add_category.activate_editing_mode(
-            self.categories[row_index])
+        self.add_category.activate_editing_mode(self.categories[pk])
 
     def deactivate_category_editing_mode(self) -> None:
         self.category_table.set_edit_buttons_active(True)
@@ -134,39 +145,112 @@ class MainWindow(QMainWindow):
         self.category_creator(category)
 
     def set_category_list(self, categories: list[Category]) -> None:
-        self.categories = categories
+        self.categories = {c.pk: c for c in categories}
         self.category_id_name_mapping = {c.pk: c.name for c in categories}
         self.category_name_id_mapping = {c.name: c.pk for c in categories}
         self.add_expense.cat_input.clear()
         self.add_expense.cat_input.addItems([c.name for c in categories])
-        self.category_table.set_data(categories)
+        if self.category_source is None:
+            self.category_table.set_data(categories)
+        self.expenses_table.set_category_names(self.category_id_name_mapping)
+
+    def category_added(self, category: Category) -> None:
+        self.categories[category.pk] = category
+        self.category_id_name_mapping[category.pk] = category.name
+        self.category_name_id_mapping[category.name] = category.pk
+        self.add_expense.cat_input.addItem(category.name)
+        self.category_table.add_row(category)
+
+    def category_changed(self, category: Category) -> None:
+        old_name = self.category_id_name_mapping[category.pk]
+        self.categories[category.pk] = category
+        self.category_table.update_row(category)
+        if old_name == category.name:
+            return
+        self.category_id_name_mapping[category.pk] = category.name
+        self.category_name_id_mapping.pop(old_name, None)
+        self.category_name_id_mapping[category.name] = category.pk
+        cat_input = self.add_expense.cat_input
+        cat_input.setItemText(cat_input.findText(old_name), category.name)
+        self.expenses_table.set_category_names(self.category_id_name_mapping)
+
+    def category_removed(self, pk: int) -> None:
+        self.categories.pop(pk, None)
+        name = self.category_id_name_mapping.pop(pk)
+        self.category_name_id_mapping.pop(name, None)
+        cat_input = self.add_expense.cat_input
+        cat_input.removeItem(cat_input.findText(name))
+        self.category_table.remove_row(pk)
 
     def set_budget_list(self, budgets: list[Budget]) -> None:
         self.budgets = budgets
-        for_day = self.get_bud_by_cat_and_dur(budgets, None, self.DAY)
-        for_week = self.get_bud_by_cat_and_dur(budgets, None, self.WEEK)
-        for_month = self.get_bud_by_cat_and_dur(budgets, None, self.MONTH)
+        for_day = self.get_bud_by_cat_and_dur(budgets, None, DAY)
+        for_week = self.get_bud_by_cat_and_dur(budgets, None, WEEK)
+        for_month = self.get_bud_by_cat_and_dur(budgets, None, MONTH)
         self.budget_table.set_budgets([for_day, for_week, for_month])
 
+    def budget_added(self, budget: Budget) -> None:
+        self.set_budget_list(self.budgets + [budget])
+
+    def budget_changed(self, budget: Budget) -> None:
+        self.set_budget_list(
+            [budget if b.pk == budget.pk else b for b in self.budgets])
+
+    def budget_removed(self, pk: int) -> None:
+        self.set_budget_list([b for b in self.budgets if b.pk != pk])
+
     def set_expense_list(self, expenses: list[Expense]) -> None:
-        self.expenses = expenses
         self.expenses_table.set_data(expenses, self.category_id_name_mapping)
-        day_ex, week_ex, month_ex = 0, 0, 0
-        today = datetime.now()
-        for ex in expenses:
-            if ex.expense_date >= today - timedelta(days=self.DAY):
-                day_ex += ex.amount
-            if ex.expense_date >= today - timedelta(days=self.WEEK):
-                week_ex += ex.amount
-            if ex.expense_date >= today - timedelta(days=self.MONTH):
-                month_ex += ex.amount
-        self.budget_table.set_expenses([day_ex, week_ex, month_ex])
+
+    def set_category_source(self, fetcher: ChildrenFetcher) -> None:
+        self.category_source = fetcher
+        self.category_table.set_fetcher(fetcher)
+
+    def set_expense_source(self, fetcher: ExpenseFetcher) -> None:
+        self.expenses_table.set_fetcher(fetcher)
+
+    def expense_added(self, expense: Expense) -> None:
+        self.expenses_table.add_row(expense)
+
+    def expense_changed(self, expense: Expense) -> None:
+        self.expenses_table.update_row(expense)
+
+    def expense_removed(self, pk: int) -> None:
+        self.expenses_table.remove_row(pk)
+
+    def set_expense_totals(self, totals: list[Number]) -> None:
+        self.budget_table.set_expenses(totals)
+
+    def set_budget_statuses(self, statuses: list[BudgetStatus]) -> None:
+        durations = {DAY: 'день', WEEK: 'неделя', MONTH: 'месяц'}
+        alerts = [
+            f"{self.category_id_name_mapping.get(st.budget.category, '?')} "
+            f"({durations.get(st.budget.duration, f'{st.budget.duration} дн.')}): "
+            f"{st.spent} из {st.budget.amount}"
+            for st in statuses if st.exceeded and st.budget.category is not None
+        ]
+        exceeded = [st.budget.duration for st in statuses
+                    if st.exceeded and st.budget.category is None]
+        self.budget_table.set_alerts(
+            [i for i, duration in enumerate((DAY, WEEK, MONTH)) if duration in exceeded],
+            alerts)
+
+    def set_pending_operations(self, count: int) -> None:
+        if self.loading:
+            return
+        if count:
+            self.statusBar().showMessage(f'Операций с базой данных в очереди: {count}')
+        else:
+            self.statusBar().clearMessage()
+
+    def show_error(self, message: str) -> None:
+        QMessageBox.warning(self, 'Ошибка', message)
 
     def on_budget_item_changed(self, item: QTableWidgetItem) -> None:
         old_budgets = self.budget_table.budgets
         if item.column() == 1 and item.text() != '':
             if old_budgets[item.row()] is None:
-                new_budget = Budget([self.DAY, self.WEEK, self.MONTH][item.row()],
+                new_budget = Budget([DAY, WEEK, MONTH][item.row()],
                                     None, int(item.text()))
                 self.budget_creator(new_budget)
             elif item.text() != str(old_budgets[item.row()].amount):
@@ -4,15 +4,34 @@
 """
 import sys
 from typing import Callable
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtWidgets
 
+from bookkeeper.budget_engine import BudgetStatus
 from bookkeeper.models.budget import Budget
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
-from bookkeeper.view.abstract_view import AbstractView
+from bookkeeper.repository.aggregation import Number
+from bookkeeper.view.abstract_view import AbstractView, ChildrenFetcher, ExpenseFetcher
 from bookkeeper.view.main_window import MainWindow
 
 
+class _Dispatcher(QtCore.QObject):
+    """
+    Передает функции из рабочих потоков в поток интерфейса: сигнал,
+    отправленный из другого потока, доставляется через очередь событий
+    потока, в котором создан объект
+    """
+    call = QtCore.Signal(object)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.call.connect(self._run)
+
+    @QtCore.Slot(object)
+    def _run(self, callback: Callable[[], None]) -> None:
+        callback()
+
+
 class View(AbstractView):
     """
     Класс реализующий View
@@ -20,11 +39,19 @@ class View(AbstractView):
     def __init__(self) -> None:
         self.app = QtWidgets.QApplication(sys.argv)
         self.window = MainWindow()
+        self.dispatcher = _Dispatcher()
 
-    def run(self) -> None:
+    def run(self, on_shown: Callable[[], None] | None = None) -> None:
         self.window.show()
+        if on_shown is not None:
+            # отрисовать окно до загрузки данных
+            self.app.processEvents()
+            QtCore.QTimer.singleShot(0, on_shown)
         sys.exit(self.app.exec())
 
+    def data_loaded(self) -> None:
+        self.window.data_loaded()
+
     def set_category_list(self, categories: list[Category]) -> None:
         self.window.set_category_list(categories)
 
@@ -34,6 +61,54 @@ class View(AbstractView):
     def set_expense_list(self, expenses: list[Expense]) -> None:
         self.window.set_expense_list(expenses)
 
+    def set_category_source(self, fetcher: ChildrenFetcher) -> None:
+        self.window.set_category_source(fetcher)
+
+    def set_expense_source(self, fetcher: ExpenseFetcher) -> None:
+        self.window.set_expense_source(fetcher)
+
+    def set_expense_totals(self, totals: list[Number]) -> None:
+        self.window.set_expense_totals(totals)
+
+    def set_budget_statuses(self, statuses: list[BudgetStatus]) -> None:
+        self.window.set_budget_statuses(statuses)
+
+    def set_pending_operations(self, count: int) -> None:
+        self.window.set_pending_operations(count)
+
+    def show_error(self, message: str) -> None:
+        self.window.show_error(message)
+
+    def post(self, callback: Callable[[], None]) -> None:
+        self.dispatcher.call.emit(callback)
+
+    def category_added(self, category: Category) -> None:
+        self.window.category_added(category)
+
+    def category_changed(self, category: Category) -> None:
+        self.window.category_changed(category)
+
+    def category_removed(self, pk: int) -> None:
+        self.window.category_removed(pk)
+
+    def budget_added(self, budget: Budget) -> None:
+        self.window.budget_added(budget)
+
+    def budget_changed(self, budget: Budget) -> None:
+        self.window.budget_changed(budget)
+
+    def budget_removed(self, pk: int) -> None:
+        self.window.budget_removed(pk)
+
+    def expense_added(self, expense: Expense) -> None:
+        self.window.expense_added(expense)
+
+    def expense_changed(self, expense: Expense) -> None:
+        self.window.expense_changed(expense)
+
+    def expense_removed(self, pk: int) -> None:
+        self.window.expense_removed(pk)
+
     def register_category_creator(self, handler: Callable[[Category], int]) -> None:
         self.window.category_creator = handler
 
@@ -0,0 +1,236 @@
+"""
+Модуль содержит рабочий поток для операций с репозиториями
+
+RepositoryWorker выполняет операции с репозиториями в отдельном потоке,
+чтобы медленный диск или большая выборка не останавливали цикл событий
+интерфейса. Результаты передаются обратным вызовам через функцию dispatch,
+которая доставляет их в поток интерфейса (например, сигналом Qt).
+
+Операции выполняются по одной в порядке поступления: записи упорядочены,
+а чтение видит результаты всех записей, поставленных до него. Чтения
+с ключом объединяются: если чтение с тем же ключом еще ждет выполнения,
+оно убирается из очереди, а новое чтение передает результат обратным
+вызовам обоих.
+
+QueueThread - общая основа потоков, выполняющих очередь операций:
+RepositoryWorker и очереди записи WriterQueue.
+"""
+
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+R = TypeVar('R')
+Item = TypeVar('Item')
+Q = TypeVar('Q', bound='QueueThread[Any]')
+
+Callback = Callable[[Any], None]
+ErrorCallback = Callable[[BaseException], None]
+
+
+def _call_now(callback: Callable[[], None]) -> None:
+    callback()
+
+
+class QueueThread(Generic[Item]):
+    """
+    Поток name, выполняющий элементы очереди по порядку поступления.
+    Наследник выбирает очередную порцию элементов методом _take и выполняет
+    ее методом _process; после закрытия (close) поток выполняет оставшиеся
+    элементы и завершается. Поток запускается конструктором, поэтому
+    наследник вызывает его после инициализации собственных атрибутов.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._queue: deque[Item] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item: Item) -> None:
+        """ Поставить item в очередь; вызывается под self._condition """
+        if self._closed:
+            raise RuntimeError(f"{type(self).__name__} is closed")
+        self._queue.append(item)
+        self._condition.notify_all()
+
+    def _take(self) -> list[Item]:
+        """ Забрать из непустой очереди порцию элементов (под self._condition) """
+        return [self._queue.popleft()]
+
+    def _process(self, batch: list[Item]) -> None:
+        """ Выполнить порцию batch вне блокировки """
+        raise NotImplementedError
+
+    def _processed(self, batch: list[Item]) -> None:
+        """ Вызывается под self._condition после выполнения порции batch """
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                batch = self._take()
+            self._process(batch)
+            with self._condition:
+                self._processed(batch)
+                self._condition.notify_all()
+
+    def close(self) -> None:
+        """ Выполнить все поставленные элементы и остановить поток """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def __enter__(self: Q) -> Q:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+@dataclass
+class _Operation:
+    """ Операция в очереди рабочего потока """
+    func: Callable[[], Any]
+    callbacks: list[Callback] = field(default_factory=list)
+    on_error: ErrorCallback | None = None
+    key: Hashable | None = None
+
+
+class RepositoryWorker(QueueThread[_Operation]):
+    """
+    Рабочий поток для операций с репозиториями.
+    dispatch - функция, выполняющая обратный вызов в потоке интерфейса
+    (по умолчанию обратные вызовы выполняются в рабочем потоке)
+    on_pending - вызывается через dispatch с числом невыполненных операций
+    при каждом его изменении
+    """
+
+    def __init__(self, dispatch: Callable[[Callable[[], None]], None] = _call_now,
+                 on_pending: Callable[[int], None] | None = None,
+                 name: str = 'repository-worker') -> None:
+        self.dispatch = dispatch
+        self.on_pending = on_pending
+        self._reads: dict[Hashable, _Operation] = {}
+        self._running = 0
+        super().__init__(name)
+
+    @property
+    def pending(self) -> int:
+        """ Число операций в очереди и выполняемых сейчас """
+        with self._condition:
+            return len(self._queue) + self._running
+
+    def _notify_pending(self) -> None:
+        if self.on_pending is not None:
+            count = len(self._queue) + self._running
+            on_pending = self.on_pending
+            self.dispatch(lambda: on_pending(count))
+
+    def _put(self, item: _Operation) -> None:
+        with self._condition:
+            super()._put(item)
+            self._notify_pending()
+
+    def write(self, func: Callable[[], R],
+              callback: Callable[[R], None] | None = None,
+              on_error: ErrorCallback | None = None) -> None:
+        """
+        Поставить в очередь запись func. Ее результат передается в callback,
+        исключение - в on_error
+        """
+        self._put(_Operation(func, [] if callback is None else [callback], on_error))
+
+    def read(self, key: Hashable, func: Callable[[], R],
+             callback: Callable[[R], None] | None = None,
+             on_error: ErrorCallback | None = None) -> bool:
+        """
+        Поставить в очередь чтение func с ключом key. Еще не начатое чтение
+        с тем же ключом заменяется этим, его обратные вызовы сохраняются.
+        Вернуть True, если чтение объединено с ожидавшим.
+        """
+        callbacks = [] if callback is None else [callback]
+        with self._condition:
+            previous = self._reads.pop(key, None)
+            coalesced = previous is not None
+            if previous is not None:
+                self._queue.remove(previous)
+                callbacks = [cb for cb in previous.callbacks
+                             if cb not in callbacks] + callbacks
+                on_error = on_error or previous.on_error
+            operation = _Operation(func, callbacks, on_error, key)
+            self._reads[key] = operation
+            self._put(operation)
+        if coalesced:
+            logging.debug("Coalesced pending read %r", key)
+        return coalesced
+
+    def call(self, func: Callable[[], R]) -> R:
+        """
+        Выполнить func в рабочем потоке после всех поставленных операций
+        и дождаться результата. Исключение func передается вызывающему.
+        """
+        if threading.current_thread() is self._thread:
+            return func()
+        done = threading.Event()
+        outcome: dict[str, Any] = {}
+
+        def run() -> None:
+            try:
+                outcome['result'] = func()
+            except BaseException as exc:  # pylint: disable=broad-except
+                outcome['error'] = exc
+            finally:
+                done.set()
+
+        self._put(_Operation(run))
+        done.wait()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Дождаться выполнения всех операций.
+        Вернуть False, если истекло время ожидания timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and not self._running, timeout)
+
+    def _take(self) -> list[_Operation]:
+        batch = super()._take()
+        for operation in batch:
+            if operation.key is not None:
+                self._reads.pop(operation.key, None)
+        self._running = len(batch)
+        return batch
+
+    def _process(self, batch: list[_Operation]) -> None:
+        for operation in batch:
+            self._execute(operation)
+
+    def _processed(self, batch: list[_Operation]) -> None:
+        self._running = 0
+        self._notify_pending()
+
+    def _execute(self, operation: _Operation) -> None:
+        try:
+            result = operation.func()
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.exception("Repository operation failed")
+            if operation.on_error is not None:
+                # exc удаляется по выходе из блока except, а dispatch может
+                # выполнить обратный вызов позже
+                self.dispatch(partial(operation.on_error, exc))
+            return
+        for callback in operation.callbacks:
+            self.dispatch(partial(callback, result))
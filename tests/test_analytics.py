@@ -0,0 +1,78 @@
+from datetime import date, datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.analytics import ExpenseSnapshot  # noqa: E402
+from bookkeeper.models.expense import Expense  # noqa: E402
+from bookkeeper.repository.sqlite_repository import SQLiteRepository  # noqa: E402
+
+EXPENSES = [
+    (100, 1, datetime(2023, 1, 2, 10)),
+    (200, 2, datetime(2023, 1, 2, 12, 30, 0, 500)),
+    (300, 1, datetime(2023, 1, 4)),
+    (400, 1, datetime(2023, 1, 9)),
+    (500, 3, datetime(2023, 2, 1)),
+]
+
+
+@pytest.fixture
+def repo(tmp_path):
+    with SQLiteRepository[Expense](str(tmp_path / 'analytics.db'), Expense) as repository:
+        repository.add_many(Expense(*values) for values in EXPENSES)
+        yield repository
+
+
+@pytest.fixture
+def snapshot(repo):
+    return ExpenseSnapshot(repo)
+
+
+def test_columns(snapshot):
+    assert len(snapshot) == 5
+    assert snapshot.amount.tolist() == [100, 200, 300, 400, 500]
+    assert snapshot.category.tolist() == [1, 2, 1, 1, 3]
+    assert snapshot.expense_date[1] == np.datetime64('2023-01-02T12:30:00.000500')
+
+
+@pytest.mark.parametrize('period', ['day', 'week', 'month'])
+def test_sum_by_period_matches_repository(repo, snapshot, period):
+    assert snapshot.sum_by_period(period) == \
+        repo.sum_by_period('amount', 'expense_date', period)
+    assert snapshot.sum_by_period(period, by_category=True) == \
+        repo.sum_by_period('amount', 'expense_date', period, by='category')
+
+
+def test_sum_by_category(snapshot):
+    assert snapshot.sum_by_category() == {1: 800, 2: 200, 3: 500}
+
+
+def test_rolling_sum(snapshot):
+    dates, sums = snapshot.rolling_sum(3, category=1)
+    assert dates[0] == np.datetime64('2023-01-02')
+    assert dates[-1] == np.datetime64('2023-01-09')
+    assert sums.tolist() == [100, 100, 400, 300, 300, 0, 0, 400]
+
+
+def test_percentiles(snapshot):
+    assert snapshot.percentiles(50) == 300
+    assert snapshot.percentiles([0, 100], category=1).tolist() == [100, 400]
+
+
+def test_refresh_appends_new_rows(repo, snapshot):
+    repo.add(Expense(600, 2, datetime(2023, 2, 2)))
+    assert snapshot.refresh() == 1
+    assert snapshot.amount.tolist()[-1] == 600
+    assert snapshot.refresh() == 0
+    assert snapshot.sum_by_period('month') == {date(2023, 1, 1): 1000,
+                                               date(2023, 2, 1): 1100}
+
+
+def test_refresh_reloads_on_changes(repo, snapshot):
+    expense = repo.get(2)
+    expense.amount = 250
+    repo.update(expense)
+    repo.delete(5)
+    snapshot.refresh()
+    assert snapshot.amount.tolist() == [100, 250, 300, 400]
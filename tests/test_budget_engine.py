@@ -0,0 +1,113 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.rollup import DailyRollup
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+TODAY = date(2023, 3, 15)
+
+
+def at(day):
+    return datetime(2023, 3, day, 12)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'rollup'])
+def repos(request, tmp_path):
+    if request.param == 'memory':
+        yield (MemoryRepository[Category](Category), MemoryRepository[Expense](Expense),
+               MemoryRepository[Budget](Budget), None)
+        return
+    db_file = str(tmp_path / 'budgets.db')
+    with ThreadLocalConnectionManager(db_file) as manager:
+        expense_repo = SQLiteRepository[Expense](db_file, Expense, manager)
+        rollup = DailyRollup(expense_repo, 'amount', 'expense_date', by='category') \
+            if request.param == 'rollup' else None
+        yield (SQLiteRepository[Category](db_file, Category, manager), expense_repo,
+               SQLiteRepository[Budget](db_file, Budget, manager), rollup)
+
+
+@pytest.fixture
+def engine(repos):
+    category_repo, expense_repo, budget_repo, rollup = repos
+    Category.create_from_tree(
+        [('food', None), ('meat', 'food'), ('beef', 'meat'), ('books', None)],
+        category_repo)
+    expense_repo.add_many([
+        Expense(100, 1, at(15)),   # food, today
+        Expense(200, 3, at(14)),   # beef, yesterday
+        Expense(400, 4, at(10)),   # books
+        Expense(800, 2, at(1)),    # meat, outside the week
+    ])
+    budget_repo.add_many([
+        Budget(1, None, 50),
+        Budget(7, None, 1000),
+        Budget(7, 1, 250),
+        Budget(30, 2, 5000),
+    ])
+    return BudgetEngine(budget_repo, expense_repo, category_repo, rollup,
+                        today=lambda: TODAY)
+
+
+def spent(statuses):
+    return [status.spent for status in statuses]
+
+
+def test_evaluate(engine):
+    statuses = engine.evaluate()
+    assert spent(statuses) == [100, 700, 300, 1000]
+    assert [status.exceeded for status in statuses] == [True, False, True, False]
+    assert statuses[1].start == date(2023, 3, 9)
+    assert statuses[2].remaining == -50
+
+
+def test_expense_added_updates_affected_budgets(engine, repos):
+    _, expense_repo, _, _ = repos
+    engine.evaluate()
+    expense = Expense(30, 4, at(13))
+    expense_repo.add(expense)
+    changed = engine.expenses_changed([expense])
+    assert [status.budget.pk for status in changed] == [2]
+    assert spent(engine.statuses) == [100, 730, 300, 1000]
+
+    old = Expense(5, 3, datetime(2022, 1, 1))
+    expense_repo.add(old)
+    assert engine.expenses_changed([old]) == []
+
+
+def test_expense_updated_and_deleted(engine, repos):
+    _, expense_repo, _, _ = repos
+    engine.evaluate()
+    expense = expense_repo.get(2)
+    expense.category = 4
+    expense_repo.update(expense)
+    changed = engine.expenses_changed()
+    assert [status.budget.pk for status in changed] == [3, 4]
+    assert spent(engine.statuses) == [100, 700, 100, 800]
+    expense_repo.delete(1)
+    assert [status.budget.pk for status in engine.expenses_changed()] == [1, 2, 3]
+    assert spent(engine.statuses) == [0, 600, 0, 800]
+
+
+def test_budgets_and_categories_changed(engine, repos):
+    category_repo, expense_repo, budget_repo, _ = repos
+    engine.evaluate()
+    budget_repo.add(Budget(7, 4, 300))
+    assert spent(engine.budgets_changed()) == [100, 700, 300, 1000, 400]
+    books = category_repo.get(4)
+    books.parent = 1
+    category_repo.update(books)
+    assert spent(engine.categories_changed()) == [100, 700, 700, 1000, 400]
+
+
+def test_day_change_reevaluates(engine):
+    engine.evaluate()
+    assert spent(engine.statuses)[0] == 100
+    engine.today = lambda: date(2023, 3, 16)
+    assert spent(engine.statuses)[0] == 0
@@ -0,0 +1,181 @@
+import sqlite3
+import subprocess
+import sys
+from dataclasses import replace
+
+from bookkeeper.main import AsyncBookkeeper, Bookkeeper, open_repositories
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.schema import MIGRATOR
+from bookkeeper.worker import RepositoryWorker
+
+
+class RecordingView:
+    """ Представление, запоминающее вызовы presenter """
+
+    def __init__(self):
+        self.calls = []
+        self.shown = False
+
+    def run(self, on_shown=None):
+        self.shown = True
+        on_shown()
+
+    def post(self, callback):
+        callback()
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, *args))
+
+    def called(self, name):
+        return [call[1:] for call in self.calls if call[0] == name]
+
+
+def test_import_does_not_load_gui():
+    code = "import sys, bookkeeper.main; assert 'PySide6' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def make_presenter(presenter_class=Bookkeeper, *args):
+    view = RecordingView()
+    presenter = presenter_class(view, *args, MemoryRepository[Category](Category),
+                                MemoryRepository[Expense](Expense),
+                                MemoryRepository[Budget](Budget))
+    return view, presenter
+
+
+def test_data_loaded_after_window_shown():
+    view, presenter = make_presenter()
+    presenter.run(init_db=True)
+    assert view.shown
+    names = [call[0] for call in view.calls]
+    assert names[-1] == 'data_loaded'
+    categories, = view.called('set_category_list')[0]
+    assert len(categories) == 7
+    assert view.called('set_expense_totals') == [([120 + 900] * 3,)]
+    assert len(view.called('set_budget_statuses')[0][0]) == 3
+
+
+def test_async_presenter():
+    with RepositoryWorker() as worker:
+        view, presenter = make_presenter(AsyncBookkeeper, worker)
+        presenter.run(init_db=True)
+        worker.wait()
+        presenter.create_expense(Expense(30, 1))
+        worker.wait()
+    assert view.called('data_loaded') == [()]
+    assert view.called('set_expense_totals')[-1] == ([120 + 900 + 30] * 3,)
+    assert [len(objs) for objs, in view.called('set_category_list')] == [7]
+
+
+def test_open_repositories(tmp_path):
+    db_file = str(tmp_path / 'main.db')
+    for _ in range(2):
+        with ThreadLocalConnectionManager(db_file) as manager:
+            statements = []
+            with manager.connection() as connection:
+                connection.set_trace_callback(statements.append)
+            cat_repo, exp_repo, bud_repo, rollup = open_repositories(manager)
+            with manager.connection() as connection:
+                assert not connection.in_transaction
+    # схема уже актуальна: DDL не выполняется
+    assert not [sql for sql in statements if sql.startswith(('CREATE', 'ALTER'))]
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.connection() as connection:
+            tables = {row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+    assert {'category', 'expense', 'budget', rollup.table_name} <= tables
+    assert version == MIGRATOR.latest
+    assert exp_repo.repo.epoch_fields == {'expense_date', 'added_date'}
+
+
+def make_category_tree(presenter):
+    presenter.category_repo.add_many([Category('food'), Category('meat', 1),
+                                      Category('beef', 2)])
+    presenter.expense_repo.add_many([Expense(100, 2), Expense(50, 1)])
+    presenter.budget_repo.add(Budget(7, 2, 1000))
+
+
+def test_delete_child_category_moves_items_to_parent():
+    view, presenter = make_presenter()
+    make_category_tree(presenter)
+    presenter.delete_category(2)
+    assert presenter.category_repo.get(2) is None
+    assert presenter.category_repo.get(3).parent == 1
+    assert sorted(e.category for e in presenter.expense_repo.get_all()) == [1, 1]
+    assert presenter.budget_repo.get(1).category == 1
+    assert view.called('category_removed') == [(2,)]
+    assert [c.pk for c, in view.called('category_changed')] == [3]
+    assert [e.pk for e, in view.called('expense_changed')] == [1]
+    assert [b.pk for b, in view.called('budget_changed')] == [1]
+    assert view.called('show_error') == []
+
+
+def test_delete_root_category_keeps_items():
+    view, presenter = make_presenter()
+    make_category_tree(presenter)
+    presenter.delete_category(1)
+    assert presenter.category_repo.get(1) is None
+    assert presenter.category_repo.get(2).parent is None
+    assert sorted(e.category for e in presenter.expense_repo.get_all()) == [1, 2]
+    assert presenter.budget_repo.get(1).category == 2
+    assert view.called('category_removed') == [(1,)]
+    assert [c.pk for c, in view.called('category_changed')] == [2]
+    assert view.called('expense_changed') == []
+    assert view.called('show_error') == []
+
+
+def test_async_lazy_loading_does_not_block():
+    with RepositoryWorker() as worker:
+        view, presenter = make_presenter(AsyncBookkeeper, worker)
+        presenter.run(init_db=True)
+        subcategories, expenses = [], []
+        presenter.load_subcategories(None, subcategories.append)
+        presenter.load_expenses(1, 10, expenses.append)
+        assert worker.wait(5)
+    assert [cat.parent for cat in subcategories[0]] == [None] * 3
+    assert [exp.pk for exp in expenses[0]] == [2]
+
+
+def test_failed_write_restores_view(tmp_path, monkeypatch):
+    with ThreadLocalConnectionManager(str(tmp_path / 'main.db')) as manager:
+        cat_repo, exp_repo, bud_repo, rollup = open_repositories(manager)
+        view = RecordingView()
+        presenter = Bookkeeper(view, cat_repo, exp_repo, bud_repo, rollup)
+        presenter.create_expense(Expense(100, 1))
+        expense = exp_repo.get(1)
+        expense.amount = 200
+
+        def fail(obj):
+            raise sqlite3.OperationalError('disk I/O error')
+
+        monkeypatch.setattr(exp_repo.repo, 'update', fail)
+        presenter.update_expense(expense)
+    assert len(view.called('show_error')) == 1
+    restored, = view.called('expense_changed')[-1]
+    assert restored is not expense
+    assert restored.amount == 100
+
+
+def test_expense_write_reevaluates_old_and_new_state(monkeypatch):
+    view, presenter = make_presenter()
+    make_category_tree(presenter)
+    engine = presenter.budget_engine
+    assert engine.evaluate()[0].spent == 100
+    affected = []
+
+    def expenses_changed(expenses=None):
+        affected.append(None if expenses is None else list(expenses))
+        return type(engine).expenses_changed(engine, expenses)
+
+    monkeypatch.setattr(engine, 'expenses_changed', expenses_changed)
+    moved = replace(presenter.expense_repo.get(1), category=1)
+    presenter.update_expense(moved)
+    presenter.delete_expense(2)
+    assert [[e.category for e in expenses] for expenses in affected] \
+        == [[2, 1], [1]]
+    assert engine.statuses[0].spent == 0
@@ -29,3 +29,10 @@ def test_can_add_to_repo(repo):
     b = Budget(1, 10, 1000)
     pk = repo.add(b)
     assert b.pk == pk
+
+
+def test_slots():
+    b = Budget(1, 10, 1000)
+    assert not hasattr(b, '__dict__')
+    with pytest.raises(AttributeError):
+        b.extra = 1
@@ -6,6 +6,7 @@ from inspect import isgenerator
 import pytest
 
 from bookkeeper.models.category import Category
+from bookkeeper.repository.abstract_repository import SupportsHierarchy
 from bookkeeper.repository.memory_repository import MemoryRepository
 
 
@@ -106,3 +107,46 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+def test_create_from_tree_uses_batches():
+    class CountingRepository(MemoryRepository):
+        batches = []
+
+        def add_many(self, objs):
+            objs = list(objs)
+            self.batches.append([o.name for o in objs])
+            return super().add_many(objs)
+
+    repo = CountingRepository()
+    tree = [('a', None), ('b', None), ('a1', 'a'), ('b1', 'b'), ('a2', 'a1')]
+    cats = Category.create_from_tree(tree, repo)
+    assert repo.batches == [['a', 'b'], ['a1', 'b1'], ['a2']]
+    assert {c.name: c.parent for c in repo.get_all()} == {
+        c.name: c.parent for c in cats}
+    assert repo.get_all({'name': 'a2'})[0].parent == repo.get_all({'name': 'a1'})[0].pk
+
+
+def test_hierarchy_same_as_fallback(repo):
+    class PlainRepository(MemoryRepository):
+        get_ancestors = None
+        get_descendants = None
+
+    plain = PlainRepository()
+    tree = [('0', None), ('1', '0'), ('2', '0'), ('3', '2'), ('4', '1'), ('5', '2')]
+    cats = Category.create_from_tree(tree, repo)
+    Category.create_from_tree(tree, plain)
+    assert not isinstance(plain, SupportsHierarchy)
+    for cat in cats:
+        plain_cat = plain.get(cat.pk)
+        assert list(cat.get_subcategories(repo)) == \
+            list(plain_cat.get_subcategories(plain))
+        assert list(cat.get_all_parents(repo)) == \
+            list(plain_cat.get_all_parents(plain))
+
+
+def test_slots():
+    c = Category('name')
+    assert not hasattr(c, '__dict__')
+    with pytest.raises(AttributeError):
+        c.extra = 1
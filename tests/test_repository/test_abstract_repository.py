@@ -1,4 +1,7 @@
-from bookkeeper.repository.abstract_repository import AbstractRepository
+from dataclasses import dataclass, field
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, get_indexed_fields)
 
 import pytest
 
@@ -18,3 +21,14 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_get_indexed_fields():
+    @dataclass
+    class Indexed:
+        a: int = field(default=0, metadata={'index': True})
+        b: int = 0
+        pk: int = 0
+
+    assert get_indexed_fields(Indexed) == ['a']
+    assert get_indexed_fields(int) == []
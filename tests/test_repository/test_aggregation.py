@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.repository.aggregation import period_start, sum_values
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Ge
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Item:
+    amount: int | None
+    category: int | None
+    date: datetime | None
+    pk: int = 0
+
+
+ITEMS = [
+    (100, 1, datetime(2023, 1, 2, 10)),   # понедельник
+    (200, 1, datetime(2023, 1, 8, 23)),   # воскресенье той же недели
+    (300, 2, datetime(2023, 1, 9)),
+    (None, 2, datetime(2023, 1, 9, 1)),
+    (400, None, datetime(2023, 2, 1)),
+    (500, 2, None),
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        repository = MemoryRepository[Item]()
+    else:
+        repository = SQLiteRepository[Item](str(tmp_path / 'aggregation.db'), Item)
+    repository.add_many([Item(*values) for values in ITEMS])
+    yield repository
+    repository.close()
+
+
+def test_period_start():
+    value = datetime(2023, 1, 8, 23)
+    assert period_start(value, 'day') == date(2023, 1, 8)
+    assert period_start(value, 'week') == date(2023, 1, 2)
+    assert period_start(value, 'month') == date(2023, 1, 1)
+
+
+def test_sum_values():
+    assert sum_values([1, None, 2]) == 3
+    assert sum_values([]) == 0
+
+
+def test_sum(repo):
+    assert repo.sum('amount') == 1500
+    assert repo.sum('amount', {'category': 2}) == 800
+    assert repo.sum('amount', {'date': Ge(datetime(2023, 1, 9))}) == 700
+    assert repo.sum('amount', {'category': 3}) == 0
+
+
+def test_sum_grouped(repo):
+    assert repo.sum_grouped('amount', 'category') == {1: 300, 2: 800, None: 400}
+    assert repo.sum_grouped('amount', 'category', {'amount': Ge(300)}) == {
+        2: 800, None: 400}
+
+
+def test_sum_by_period(repo):
+    assert repo.sum_by_period('amount', 'date') == {
+        date(2023, 1, 2): 100, date(2023, 1, 8): 200,
+        date(2023, 1, 9): 300, date(2023, 2, 1): 400}
+    assert repo.sum_by_period('amount', 'date', 'week') == {
+        date(2023, 1, 2): 300, date(2023, 1, 9): 300, date(2023, 1, 30): 400}
+    assert repo.sum_by_period('amount', 'date', 'month', {'category': 1}) == {
+        date(2023, 1, 1): 300}
+    assert repo.sum_by_period('amount', 'date', 'month', by='category') == {
+        (1, date(2023, 1, 1)): 300, (2, date(2023, 1, 1)): 300,
+        (None, date(2023, 2, 1)): 400}
+    with pytest.raises(ValueError):
+        repo.sum_by_period('amount', 'date', 'year')
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.async_repository import (
+    AsyncMemoryRepository, AsyncSQLiteRepository, SQLiteExecutor)
+from bookkeeper.repository.query import Gt
+
+
+@dataclass(slots=True)
+class Custom:
+    field_1: int = 0
+    field_2: str = 'value'
+    pk: int = 0
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_repo(request, tmp_path):
+    if request.param == 'memory':
+        return AsyncMemoryRepository[Custom]
+    return lambda: AsyncSQLiteRepository[Custom](str(tmp_path / 'async.db'), Custom)
+
+
+def test_crud(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            obj = Custom(1, 'a')
+            pk = await repo.add(obj)
+            assert obj.pk == pk
+            assert await repo.get(pk) == obj
+            obj.field_2 = 'b'
+            await repo.update(obj)
+            assert (await repo.get(pk)).field_2 == 'b'
+            await repo.delete(pk)
+            assert await repo.get(pk) is None
+
+    asyncio.run(scenario())
+
+
+def test_get_all(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            for i in range(5):
+                await repo.add(Custom(i))
+            result = await repo.get_all({'field_1': Gt(1)}, order_by='-field_1', limit=2)
+            assert [obj.field_1 for obj in result] == [4, 3]
+
+    asyncio.run(scenario())
+
+
+def test_iter_all(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            for i in range(10):
+                await repo.add(Custom(i))
+            values = [obj.field_1 async for obj in repo.iter_all(batch_size=3)]
+            assert values == list(range(10))
+            values = [obj.field_1 async for obj in repo.iter_all(
+                {'field_1': Gt(6)}, batch_size=2, order_by='-field_1')]
+            assert values == [9, 8, 7]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            pks = await asyncio.gather(*(repo.add(Custom(i)) for i in range(50)))
+            assert sorted(pks) == list(range(1, 51))
+            objs = await asyncio.gather(*(repo.get(pk) for pk in pks))
+            assert sorted(obj.field_1 for obj in objs) == list(range(50))
+
+    asyncio.run(scenario())
+
+
+def test_write_during_iteration(make_repo):
+    async def scenario():
+        async with make_repo() as repo:
+            for i in range(6):
+                await repo.add(Custom(i))
+            seen = []
+            async for obj in repo.iter_all(batch_size=2):
+                seen.append(obj.field_1)
+                if obj.field_1 == 0:
+                    await repo.update(Custom(100, pk=obj.pk))
+            assert seen[:2] == [0, 1]
+            assert (await repo.get(1)).field_1 == 100
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_single_thread(tmp_path):
+    async def scenario():
+        executor = SQLiteExecutor(str(tmp_path / 'shared.db'))
+        repo_1 = AsyncSQLiteRepository[Custom](executor.db_file, Custom, executor)
+        await repo_1.add(Custom(1))
+        threads = set()
+        await asyncio.gather(*(executor.run(
+            lambda: threads.add(threading.get_ident())) for _ in range(10)))
+        assert len(threads) == 1
+        assert threading.get_ident() not in threads
+        assert len(executor.connection_manager._connections) == 1
+        await repo_1.close()
+        executor.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_concurrent_iterations_with_write(tmp_path):
+    async def read(repo):
+        return [obj.field_1 async for obj in repo.iter_all(batch_size=2)]
+
+    async def write(repo):
+        await asyncio.sleep(0)
+        return await repo.add(Custom(100))
+
+    async def scenario():
+        async with AsyncSQLiteRepository[Custom](str(tmp_path / 'async.db'),
+                                                 Custom) as repo:
+            for i in range(10):
+                await repo.add(Custom(i))
+            first, second, pk = await asyncio.gather(read(repo), read(repo),
+                                                     write(repo))
+            assert first[:10] == second[:10] == list(range(10))
+            assert pk == 11
+
+            def held():
+                return repo.executor.connection_manager._local.held
+
+            first, second = repo.iter_all(batch_size=2), repo.iter_all(batch_size=2)
+            assert (await anext(first)).field_1 == (await anext(second)).field_1 == 0
+            assert len([obj async for obj in first]) == 10
+            # соединение остается занятым незавершенным вторым перебором
+            assert repo.executor.submit(held) is not None
+            await repo.add(Custom(200))
+            # увидит ли курсор запись, добавленную во время перебора, не определено
+            assert [obj.field_1 async for obj in second][-1] in (100, 200)
+            assert repo.executor.submit(held) is None
+
+    asyncio.run(scenario())
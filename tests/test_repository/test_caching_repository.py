@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.abstract_repository import SupportsHierarchy
+from bookkeeper.repository.caching_repository import CachingRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Ge, InSubtree
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Item:
+    kind: int
+    amount: int = 0
+    pk: int = 0
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, pk):
+        self.reads += 1
+        return super().get(pk)
+
+    def get_all(self, where=None, order_by=None, limit=None, offset=None):
+        self.reads += 1
+        return super().get_all(where, order_by, limit, offset)
+
+
+@pytest.fixture
+def inner():
+    repository = CountingRepository()
+    repository.add_many([Item(1, 10), Item(2, 20), Item(1, 30)])
+    return repository
+
+
+@pytest.fixture
+def repo(inner):
+    return CachingRepository[Item](inner, max_queries=3)
+
+
+def test_repeated_reads_hit_cache(repo, inner):
+    first = repo.get_all({'kind': 1})
+    assert repo.get_all({'kind': 1}) == first
+    assert repo.get(first[0].pk) is first[0]
+    assert inner.reads == 1
+    assert (repo.stats.hits, repo.stats.misses) == (2, 1)
+
+
+def test_identity_map(repo):
+    obj = repo.get(1)
+    assert repo.get_all()[0] is obj
+    assert repo.get_all({'kind': 1})[0] is obj
+    assert next(repo.iter_all()) is obj
+
+
+def test_precise_invalidation(repo, inner):
+    repo.get_all({'kind': 1})
+    repo.get_all({'kind': 2})
+    repo.add(Item(2, 40))
+    assert repo.stats.invalidations == 1
+    reads = inner.reads
+    assert [i.amount for i in repo.get_all({'kind': 1})] == [10, 30]
+    assert inner.reads == reads
+    assert [i.amount for i in repo.get_all({'kind': 2})] == [20, 40]
+    assert inner.reads == reads + 1
+
+
+def test_update_and_delete_invalidate(repo):
+    assert len(repo.get_all({'amount': Ge(20)})) == 2
+    obj = repo.get(1)
+    obj.amount = 50
+    repo.update(obj)
+    assert [i.pk for i in repo.get_all({'amount': Ge(20)})] == [1, 2, 3]
+    repo.delete(2)
+    assert [i.pk for i in repo.get_all({'amount': Ge(20)})] == [1, 3]
+    repo.update_many([Item(2, 0, pk=3)])
+    repo.delete_many([1])
+    assert repo.get_all({'amount': Ge(20)}) == []
+    assert repo.get(1) is None
+
+
+def test_offset_invalidated_by_any_write(repo):
+    assert [i.pk for i in repo.get_all(order_by='pk', offset=1)] == [2, 3]
+    repo.delete(1)
+    assert [i.pk for i in repo.get_all(order_by='pk', offset=1)] == [3]
+
+
+def test_lru_eviction(repo, inner):
+    for kind in range(4):
+        repo.get_all({'kind': kind})
+    assert repo.stats.evictions == 1
+    reads = inner.reads
+    repo.get_all({'kind': 0})
+    assert inner.reads == reads + 1
+
+
+def test_rollback_clears_cache(tmp_path):
+    inner = SQLiteRepository[Item](str(tmp_path / 'cache.db'), Item)
+    with CachingRepository[Item](inner) as repo:
+        repo.add(Item(1))
+        assert len(repo.get_all()) == 1
+        with pytest.raises(RuntimeError):
+            with repo.transaction():
+                repo.add(Item(2))
+                assert len(repo.get_all()) == 2
+                raise RuntimeError
+        assert len(repo.get_all()) == 1
+        assert repo.get(2) is None
+        assert repo.sum('kind') == 1
+
+
+def test_failed_write_rolled_back_from_cache(tmp_path, monkeypatch):
+    inner = SQLiteRepository[Item](str(tmp_path / 'cache.db'), Item)
+    with CachingRepository[Item](inner) as repo:
+        repo.add(Item(1, 10))
+        item = repo.get(1)
+        item.amount = 20
+
+        def fail(obj):
+            raise RuntimeError
+
+        monkeypatch.setattr(inner, 'update', fail)
+        with pytest.raises(RuntimeError):
+            with repo.transaction():
+                repo.update(item)
+        assert repo.get(1) is not item
+        assert repo.get(1).amount == 10
+
+
+def test_hierarchy_delegated(tmp_path):
+    inner = SQLiteRepository[Category](str(tmp_path / 'cache.db'), Category)
+    with CachingRepository[Category](inner) as repo:
+        repo.add_many([Category('food'), Category('meat', 1), Category('beef', 2)])
+        assert isinstance(repo, SupportsHierarchy)
+        assert repo.closure_table == inner.closure_table
+        beef = repo.get(3)
+        assert repo.get_ancestors(3, include_self=True)[0] is beef
+        assert [c.pk for c in repo.get_descendants(1)] == [2, 3]
+        sql, _ = InSubtree(repo, 1).to_sql('category')
+        assert inner.closure_table in sql
+
+    plain = CachingRepository[Item](MemoryRepository[Item]())
+    assert not hasattr(plain, 'closure_table')
+    with pytest.raises(AttributeError):
+        plain.missing  # pylint: disable=pointless-statement
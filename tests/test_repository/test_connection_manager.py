@@ -0,0 +1,195 @@
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.connection_manager import (
+    ThreadLocalConnectionManager, PooledConnectionManager, StorageProfile)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+def test_thread_local_reuses_connection(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.connection() as con_1:
+            pass
+        with manager.connection() as con_2:
+            pass
+        assert con_1 is con_2
+
+
+def test_thread_local_connection_per_thread(db_file):
+    connections = []
+
+    def worker():
+        with manager.connection() as con:
+            connections.append(con)
+
+    with ThreadLocalConnectionManager(db_file) as manager:
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(con) for con in connections}) == 3
+
+
+def test_nested_connection_is_shared(db_file):
+    with PooledConnectionManager(db_file, pool_size=2) as manager:
+        with manager.connection() as outer:
+            with manager.connection() as inner:
+                assert inner is outer
+
+
+def test_pragma_applied(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.connection() as con:
+            assert con.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_pool_is_bounded(db_file):
+    with PooledConnectionManager(db_file, pool_size=1, timeout=0.01) as manager:
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def holder():
+            with manager.connection():
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        acquired.wait()
+        with pytest.raises(TimeoutError):
+            with manager.connection():
+                pass
+        release.set()
+        thread.join()
+        with manager.connection() as con:
+            assert con.execute('SELECT 1').fetchone() == (1,)
+
+
+def test_interleaved_generators_keep_connection(db_file):
+    @dataclass
+    class Custom:
+        pk: int = 0
+        field_1: int = 0
+
+    with PooledConnectionManager(db_file, pool_size=1, timeout=0.01) as manager:
+        repo = SQLiteRepository[Custom](db_file, Custom, manager)
+        repo.add_many([Custom(field_1=i) for i in range(4)])
+        first = repo.iter_all(batch_size=1)
+        second = repo.iter_all(batch_size=1)
+        assert next(first).field_1 == 0
+        assert next(second).field_1 == 0
+        # первый перебор завершен, но соединение еще читает второй
+        assert [obj.field_1 for obj in first] == [1, 2, 3]
+        errors = []
+
+        def other_thread():
+            try:
+                with manager.connection():
+                    pass
+            except TimeoutError as exc:
+                errors.append(exc)
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+        assert [obj.field_1 for obj in second] == [1, 2, 3]
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+        with manager.connection() as con:
+            assert con.execute('SELECT 1').fetchone() == (1,)
+
+
+def test_pool_size_validation(db_file):
+    with pytest.raises(ValueError):
+        PooledConnectionManager(db_file, pool_size=0)
+
+
+def test_cannot_use_closed_manager(db_file):
+    manager = ThreadLocalConnectionManager(db_file)
+    with manager.connection():
+        pass
+    manager.close()
+    with pytest.raises(RuntimeError):
+        with manager.connection():
+            pass
+
+
+def test_transaction_commits_once(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.transaction() as con:
+            con.execute('CREATE TABLE t(a)')
+            con.execute('INSERT INTO t VALUES (1)')
+            assert con.in_transaction
+        assert not con.in_transaction
+        with manager.connection() as con:
+            assert con.execute('SELECT a FROM t').fetchall() == [(1,)]
+
+
+def test_transaction_rollback(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.transaction() as con:
+            con.execute('CREATE TABLE t(a)')
+        with pytest.raises(ZeroDivisionError):
+            with manager.transaction() as con:
+                con.execute('INSERT INTO t VALUES (1)')
+                1 / 0
+        with manager.connection() as con:
+            assert con.execute('SELECT a FROM t').fetchall() == []
+
+
+def test_nested_transaction_rolls_back_savepoint(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.transaction() as con:
+            con.execute('CREATE TABLE t(a)')
+            con.execute('INSERT INTO t VALUES (1)')
+            with pytest.raises(ValueError):
+                with manager.transaction():
+                    con.execute('INSERT INTO t VALUES (2)')
+                    raise ValueError
+            with manager.transaction():
+                con.execute('INSERT INTO t VALUES (3)')
+            assert con.in_transaction
+        with manager.connection() as con:
+            assert con.execute('SELECT a FROM t').fetchall() == [(1,), (3,)]
+
+
+def test_storage_profile_applied(db_file):
+    with ThreadLocalConnectionManager(db_file, 'balanced') as manager:
+        with manager.connection() as con:
+            assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert con.execute('PRAGMA synchronous').fetchone()[0] == 1
+            assert con.execute('PRAGMA cache_size').fetchone()[0] == -16000
+            assert con.execute('PRAGMA temp_store').fetchone()[0] == 2
+
+
+def test_default_storage_profile(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        assert manager.profile == StorageProfile.preset('safe')
+        with manager.connection() as con:
+            assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+            assert con.execute('PRAGMA synchronous').fetchone()[0] == 2
+
+
+def test_custom_storage_profile(db_file):
+    profile = StorageProfile('custom', journal_mode='WAL', synchronous='OFF')
+    with PooledConnectionManager(db_file, profile) as manager:
+        with manager.connection() as con:
+            assert con.execute('PRAGMA synchronous').fetchone()[0] == 0
+    assert 'synchronous=OFF' in str(profile)
+
+
+def test_unknown_storage_profile(db_file):
+    with pytest.raises(ValueError):
+        ThreadLocalConnectionManager(db_file, 'unknown')
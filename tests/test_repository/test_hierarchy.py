@@ -0,0 +1,148 @@
+import sqlite3
+from dataclasses import dataclass, field
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import SupportsHierarchy
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import InSubtree
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Node:
+    name: str
+    parent: int | None = field(default=None, metadata={'index': True})
+    pk: int = 0
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        repository = MemoryRepository[Node]()
+    else:
+        repository = SQLiteRepository[Node](str(tmp_path / 'hierarchy.db'), Node)
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def tree(repo):
+    """
+    a       c
+    |- a1   |- c1
+    |  |- a11
+    |- a2
+    """
+    pks = {}
+    for name, parent in [('a', None), ('c', None), ('a2', 'a'), ('c1', 'c'),
+                         ('a1', 'a'), ('a11', 'a1')]:
+        pks[name] = repo.add(Node(name, pks.get(parent)))
+    return pks
+
+
+def names(nodes):
+    return [node.name for node in nodes]
+
+
+def test_supports_hierarchy(repo):
+    assert isinstance(repo, SupportsHierarchy)
+
+
+def test_get_ancestors(repo, tree):
+    assert names(repo.get_ancestors(tree['a11'])) == ['a1', 'a']
+    assert names(repo.get_ancestors(tree['a11'], include_self=True)) == \
+        ['a11', 'a1', 'a']
+    assert repo.get_ancestors(tree['a']) == []
+    assert repo.get_ancestors(100) == []
+
+
+def test_get_descendants(repo, tree):
+    assert names(repo.get_descendants(tree['a'])) == ['a2', 'a1', 'a11']
+    assert names(repo.get_descendants(tree['c'])) == ['c1']
+    assert repo.get_descendants(tree['a11']) == []
+    assert repo.get_descendants(100) == []
+
+
+def test_hierarchy_follows_updates(repo, tree):
+    node = repo.get(tree['a1'])
+    node.parent = tree['c']
+    repo.update(node)
+    repo.delete(tree['c1'])
+    assert names(repo.get_descendants(tree['a'])) == ['a2']
+    assert names(repo.get_descendants(tree['c'])) == ['a1', 'a11']
+    assert names(repo.get_ancestors(tree['a11'])) == ['a1', 'c']
+
+
+@pytest.fixture
+def category_repo(tmp_path):
+    with SQLiteRepository[Category](str(tmp_path / 'closure.db'), Category) as repository:
+        yield repository
+
+
+def closure(repo):
+    with repo.connection_manager.connection() as connection:
+        return set(connection.execute(f'SELECT * FROM {repo.closure_table}'))
+
+
+def test_closure_maintained(category_repo):
+    a = category_repo.add(Category('a'))
+    b = category_repo.add(Category('b', a))
+    c = category_repo.add(Category('c', b))
+    d = category_repo.add(Category('d'))
+    assert closure(category_repo) == {
+        (a, a, 0), (b, b, 0), (c, c, 0), (d, d, 0), (a, b, 1), (b, c, 1), (a, c, 2)}
+
+    cat = category_repo.get(b)
+    cat.parent = d
+    category_repo.update(cat)
+    assert closure(category_repo) == {
+        (a, a, 0), (b, b, 0), (c, c, 0), (d, d, 0), (d, b, 1), (b, c, 1), (d, c, 2)}
+
+    category_repo.delete(b)
+    assert closure(category_repo) == {(a, a, 0), (c, c, 0), (d, d, 0)}
+    assert category_repo.check_closure()
+
+
+def test_closure_check_and_rebuild(category_repo):
+    Category.create_from_tree([('a', None), ('b', 'a'), ('c', 'b')], category_repo)
+    expected = closure(category_repo)
+    with category_repo.connection_manager.transaction() as connection:
+        connection.execute(f'DELETE FROM {category_repo.closure_table} WHERE depth = 2')
+    assert not category_repo.check_closure()
+    assert not category_repo.check_closure(repair=True)
+    assert category_repo.check_closure()
+    assert closure(category_repo) == expected
+
+
+def test_closure_built_for_existing_table(tmp_path):
+    db_file = str(tmp_path / 'existing.db')
+    with sqlite3.connect(db_file) as connection:
+        connection.execute('CREATE TABLE category '
+                           '(name TEXT, parent INTEGER, pk INTEGER PRIMARY KEY)')
+        connection.execute("INSERT INTO category VALUES ('a', NULL, 1), ('b', 1, 2)")
+    connection.close()
+    with SQLiteRepository[Category](db_file, Category) as repository:
+        assert repository.check_closure()
+        assert len(closure(repository)) == 3
+
+
+def test_in_subtree(repo, tree):
+    condition = InSubtree(repo, tree['a'])
+    assert names(repo.get_all({'pk': condition})) == ['a', 'a2', 'a1', 'a11']
+    assert names(repo.get_all({'parent': condition})) == ['a2', 'a1', 'a11']
+
+
+def test_in_subtree_closure_sum(category_repo, tmp_path):
+    cats = Category.create_from_tree(
+        [('a', None), ('b', 'a'), ('c', 'b'), ('d', None)], category_repo)
+    expense_repo = SQLiteRepository[Expense](
+        category_repo.db_file, Expense, category_repo.connection_manager)
+    expense_repo.add_many(Expense(100 * (i + 1), cat.pk) for i, cat in enumerate(cats))
+    a, b = cats[0].pk, cats[1].pk
+    condition = InSubtree(category_repo, b)
+    assert 'category_closure' in condition.to_sql('category')[0]
+    assert expense_repo.sum('amount', {'category': InSubtree(category_repo, a)}) == 600
+    assert expense_repo.sum('amount', {'category': condition}) == 500
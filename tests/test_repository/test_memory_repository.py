@@ -1,4 +1,8 @@
+import random
+from dataclasses import dataclass, field
+
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge, Gt, In, Le, Lt, Ne
 
 import pytest
 
@@ -69,3 +73,105 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    obj = custom_class()
+    obj.pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many([custom_class(), obj])
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    repo.add_many(objects)
+    new_objects = [custom_class() for i in range(2)]
+    for o, new in zip(objects, new_objects):
+        new.pk = o.pk
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class()])
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    repo.add_many(objects)
+    with pytest.raises(KeyError):
+        repo.delete_many([objects[0].pk, 100])
+    repo.delete_many([objects[0].pk, objects[1].pk])
+    assert repo.get_all() == [objects[2]]
+
+
+def test_iter_all(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    repo.add_many(objects)
+    assert list(repo.iter_all(batch_size=2)) == objects
+    with pytest.raises(ValueError):
+        next(repo.iter_all(batch_size=0))
+
+
+@dataclass
+class Indexed:
+    kind: int | None = field(default=None, metadata={'index': True})
+    date: int | None = field(default=None, metadata={'index': 'sorted'})
+    pk: int = 0
+
+
+@pytest.fixture
+def indexed_repos():
+    rnd = random.Random(0)
+    indexed = MemoryRepository[Indexed](Indexed)
+    plain = MemoryRepository[Indexed]()
+    for _ in range(300):
+        kind = rnd.choice([None, 1, 2, 3])
+        date = rnd.choice([None, *range(50)])
+        indexed.add(Indexed(kind, date))
+        plain.add(Indexed(kind, date))
+    return indexed, plain
+
+
+@pytest.mark.parametrize('where', [
+    {'kind': 1},
+    {'kind': None},
+    {'kind': In([2, None])},
+    {'date': Between(10, 20)},
+    {'date': Lt(5), 'kind': 2},
+    {'date': Le(5)},
+    {'date': Gt(45)},
+    {'date': Ge(45), 'kind': Ne(3)},
+    {'date': 7},
+    {'date': None},
+    {'pk': In([1, 5, 1000]), 'kind': 1},
+])
+def test_indexed_get_all(indexed_repos, where):
+    indexed, plain = indexed_repos
+    assert indexed.get_all(where) == plain.get_all(where)
+
+
+def test_indexes_follow_writes(indexed_repos):
+    indexed, plain = indexed_repos
+    for repo in indexed_repos:
+        obj = repo.get(10)
+        obj.kind, obj.date = 1, 100
+        repo.update(obj)
+        repo.delete_many([11, 12])
+        repo.update_many([Indexed(None, None, pk=13)])
+    for where in [{'kind': 1}, {'date': Ge(40)}, {'date': None}, {'kind': None}]:
+        assert indexed.get_all(where) == plain.get_all(where)
+    assert indexed.get_all({'date': 100}) == [indexed.get(10)]
+
+
+def test_indexed_lookup_skips_scan(indexed_repos):
+    indexed, _ = indexed_repos
+    assert len(list(indexed._candidates({'date': Between(10, 11)}))) == \
+        len(indexed.get_all({'date': Between(10, 11)}))
+    assert len(list(indexed._candidates({'comment': 'x'}))) == 300
@@ -0,0 +1,154 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.migrations import Migration, Migrator
+from bookkeeper.repository.query import Between, Ge
+from bookkeeper.repository.rollup import DailyRollup
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.schema import MIGRATOR
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'migrations.db')
+
+
+def user_version(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with manager.connection() as connection:
+            return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def recording_migrator(applied):
+    def step(version):
+        def apply(connection):
+            applied.append(version)
+            connection.execute(f'CREATE TABLE t{version} (x INTEGER)')
+        return Migration(version, f'table t{version}', apply)
+    return step
+
+
+def test_migrations_applied_in_order(db_file):
+    applied = []
+    step = recording_migrator(applied)
+    with ThreadLocalConnectionManager(db_file) as manager:
+        assert Migrator([step(2), step(1)]).migrate(manager) == 2
+        assert manager.schema_version == 2
+    assert applied == [1, 2]
+    assert user_version(db_file) == 2
+
+    with ThreadLocalConnectionManager(db_file) as manager:
+        assert Migrator([step(1), step(2), step(3)]).migrate(manager) == 3
+    assert applied == [1, 2, 3]
+    assert user_version(db_file) == 3
+
+
+def test_current_schema_skips_migrations(db_file):
+    applied = []
+    step = recording_migrator(applied)
+    with ThreadLocalConnectionManager(db_file) as manager:
+        Migrator([step(1)]).migrate(manager)
+    with ThreadLocalConnectionManager(db_file) as manager:
+        statements = []
+        with manager.connection() as connection:
+            connection.set_trace_callback(statements.append)
+        assert Migrator([step(1)]).migrate(manager) == 1
+        assert statements == ['PRAGMA user_version']
+        # повторно версия не читается
+        Migrator([step(1)]).migrate(manager)
+        assert statements == ['PRAGMA user_version']
+    assert applied == [1]
+
+
+def test_migrator_rejects_bad_versions(db_file):
+    step = recording_migrator([])
+    with pytest.raises(ValueError):
+        Migrator([step(1), step(3)])
+    with ThreadLocalConnectionManager(db_file) as manager:
+        Migrator([step(1), step(2)]).migrate(manager)
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with pytest.raises(RuntimeError):
+            Migrator([step(1)]).migrate(manager)
+        assert manager.schema_version is None
+
+
+def test_failed_migration_rolled_back(db_file):
+    def fail(connection):
+        connection.execute('CREATE TABLE partial (x INTEGER)')
+        raise RuntimeError('broken step')
+
+    step = recording_migrator([])
+    with ThreadLocalConnectionManager(db_file) as manager:
+        with pytest.raises(RuntimeError):
+            Migrator([step(1), Migration(2, 'broken', fail)]).migrate(manager)
+        assert manager.schema_version is None
+        with manager.connection() as connection:
+            tables = {row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'partial' not in tables and 't1' not in tables
+    assert user_version(db_file) == 0
+
+
+def test_legacy_database_converted(db_file):
+    expenses = [Expense(100, 1, datetime(2023, 1, 1, 10, 30, 15, 250),
+                        datetime(2023, 1, 2), 'first'),
+                Expense(200, 2, datetime(1969, 12, 31, 23, 59), comment='second')]
+    with SQLiteRepository[Expense](db_file, Expense) as legacy:
+        legacy.add_many(expenses)
+    with SQLiteRepository[Category](db_file, Category) as legacy:
+        legacy.add_many([Category('food'), Category('meat', 1)])
+
+    with ThreadLocalConnectionManager(db_file) as manager:
+        repo = SQLiteRepository[Expense](db_file, Expense, manager, MIGRATOR)
+        categories = SQLiteRepository[Category](db_file, Category, manager, MIGRATOR)
+        assert repo.epoch_fields == {'expense_date', 'added_date'}
+        assert repo.get_all(order_by='pk') == expenses
+        assert categories.get_all({'parent': 1}) == [Category('meat', 1, 2)]
+        assert categories.check_closure()
+        with manager.connection() as connection:
+            stored = connection.execute(
+                'SELECT typeof(expense_date), typeof(added_date) FROM expense '
+                'ORDER BY pk').fetchall()
+            indexes = {row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'expense'")}
+    assert stored == [('integer', 'integer'), ('integer', 'integer')]
+    assert set(repo.index_sql) <= indexes
+    assert user_version(db_file) == MIGRATOR.latest
+
+
+def test_epoch_storage_queries(db_file):
+    with ThreadLocalConnectionManager(db_file) as manager:
+        repo = SQLiteRepository[Expense](db_file, Expense, manager, MIGRATOR)
+        rollup = DailyRollup(repo, 'amount', 'expense_date', by='category')
+        repo.add_many([Expense(100, 1, datetime(2023, 1, d, 12)) for d in range(1, 11)]
+                      + [Expense(5, 2, datetime(2023, 1, 10, 23, 59))])
+        assert len(repo.get_all({'expense_date': Ge(datetime(2023, 1, 9))})) == 3
+        assert len(repo.get_all({'expense_date': Between(
+            datetime(2023, 1, 2), datetime(2023, 1, 3, 12))})) == 2
+        assert [e.pk for e in repo.get_all(
+            {'expense_date': datetime(2023, 1, 10, 23, 59)})] == [11]
+        assert repo.sum_by_period('amount', 'expense_date', 'day',
+                                  {'expense_date': Ge(datetime(2023, 1, 9))}) \
+            == {date(2023, 1, 9): 100, date(2023, 1, 10): 105}
+        assert rollup.sum(date(2023, 1, 10)) == 105
+        assert rollup.sum_grouped(date(2023, 1, 10)) == {1: 100, 2: 5}
+        assert rollup.check()
+
+
+def test_legacy_rollup_kept_consistent(db_file):
+    with SQLiteRepository[Expense](db_file, Expense) as legacy:
+        DailyRollup(legacy, 'amount', 'expense_date', by='category')
+        legacy.add(Expense(100, 1, datetime(2023, 1, 1, 10)))
+
+    with ThreadLocalConnectionManager(db_file) as manager:
+        repo = SQLiteRepository[Expense](db_file, Expense, manager, MIGRATOR)
+        rollup = DailyRollup(repo, 'amount', 'expense_date', by='category',
+                             migrator=MIGRATOR)
+        repo.add(Expense(50, 1, datetime(2023, 1, 1, 20)))
+        assert rollup.sum(date(2023, 1, 1)) == 150
+        assert rollup.check()
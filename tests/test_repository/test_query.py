@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import (
+    Eq, Ne, Lt, Le, Gt, Ge, Between, In, parse_order_by, select)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class Item:
+    amount: int
+    category: int | None
+    date: datetime
+    pk: int = 0
+
+
+ITEMS = [
+    (300, 1, datetime(2023, 1, 5)),
+    (100, 2, datetime(2023, 1, 1)),
+    (200, None, datetime(2023, 1, 3)),
+    (100, 1, datetime(2023, 1, 2)),
+    (500, 3, datetime(2023, 1, 4)),
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        repository = MemoryRepository[Item]()
+    else:
+        repository = SQLiteRepository[Item](str(tmp_path / 'query.db'), Item)
+    repository.add_many([Item(*values) for values in ITEMS])
+    yield repository
+    repository.close()
+
+
+def amounts(items):
+    return [item.amount for item in items]
+
+
+def test_conditions_match():
+    assert Eq(None).match(None)
+    assert not Eq(1).match(None)
+    assert Ne(1).match(None)
+    assert Lt(2).match(1) and not Lt(2).match(2) and not Lt(2).match(None)
+    assert Le(2).match(2) and not Le(2).match(3)
+    assert Gt(2).match(3) and not Gt(2).match(2)
+    assert Ge(2).match(2) and not Ge(2).match(None)
+    assert Between(1, 3).match(1) and Between(1, 3).match(3)
+    assert not Between(1, 3).match(4)
+    assert In([1, None]).match(None) and not In([1]).match(2)
+
+
+def test_conditions_sql():
+    assert Eq(None).to_sql('a') == ('a IS NULL', [])
+    assert Ne(1).to_sql('a') == ('a IS NOT ?', [1])
+    assert Ge(1).to_sql('a') == ('a >= ?', [1])
+    assert Between(1, 2).to_sql('a') == ('a BETWEEN ? AND ?', [1, 2])
+    assert In([1, 2]).to_sql('a') == ('a IN (?, ?)', [1, 2])
+    assert In([1, None]).to_sql('a') == ('(a IN (?) OR a IS NULL)', [1])
+
+
+def test_parse_order_by():
+    assert parse_order_by(None) == []
+    assert parse_order_by('a') == [('a', False)]
+    assert parse_order_by(['-a', 'b']) == [('a', True), ('b', False)]
+
+
+def test_select_limits():
+    assert select(range(5), limit=2, offset=1) == [1, 2]
+    with pytest.raises(ValueError):
+        select(range(5), limit=-1)
+
+
+def test_range_conditions(repo):
+    assert amounts(repo.get_all({'amount': Ge(200)})) == [300, 200, 500]
+    assert amounts(repo.get_all({'amount': Lt(200)})) == [100, 100]
+    assert amounts(repo.get_all(
+        {'date': Between(datetime(2023, 1, 2), datetime(2023, 1, 4))}
+    )) == [200, 100, 500]
+    assert amounts(repo.get_all({'amount': Gt(100), 'date': Le(datetime(2023, 1, 4))})
+                   ) == [200, 500]
+
+
+def test_in_and_null(repo):
+    assert amounts(repo.get_all({'category': In([1, 3])})) == [300, 100, 500]
+    assert amounts(repo.get_all({'category': In([2, None])})) == [100, 200]
+    assert amounts(repo.get_all({'category': None})) == [200]
+    assert amounts(repo.get_all({'category': Ne(1)})) == [100, 200, 500]
+    assert repo.get_all({'category': In([])}) == []
+
+
+def test_order_limit_offset(repo):
+    assert amounts(repo.get_all(order_by='date')) == [100, 100, 200, 500, 300]
+    assert amounts(repo.get_all(order_by='-amount', limit=2)) == [500, 300]
+    assert [(i.amount, i.date.day) for i in repo.get_all(order_by=['amount', '-date'])
+            ] == [(100, 2), (100, 1), (200, 3), (300, 5), (500, 4)]
+    assert [i.category for i in repo.get_all(order_by='category')
+            ] == [None, 1, 1, 2, 3]
+    assert [i.category for i in repo.get_all(order_by='-category')
+            ] == [3, 2, 1, 1, None]
+    assert amounts(repo.get_all(order_by='pk', limit=2, offset=3)) == [100, 500]
+    assert amounts(repo.get_all(offset=4)) == [500]
+    assert amounts(repo.get_all({'amount': Ge(200)}, order_by='-date', limit=1)
+                   ) == [300]
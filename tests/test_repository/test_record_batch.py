@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.record_batch import RecordBatch
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass(slots=True)
+class Custom:
+    pk: int = 0
+    field_1: int = 0
+    field_2: str = "Test_value"
+
+
+@pytest.fixture
+def sqlite_repo(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'batch.db'), Custom) as repo:
+        repo.add_many(Custom(field_1=i, field_2=f'value {i}') for i in range(10))
+        yield repo
+
+
+def test_lazy_materialization(sqlite_repo):
+    batch = sqlite_repo.get_batch()
+    assert len(batch) == 10
+    assert batch.materialized == 0
+    obj = batch[3]
+    assert obj == Custom(4, 3, 'value 3')
+    assert batch.materialized == 1
+    assert batch[3] is obj
+    assert batch[-1].field_1 == 9
+    assert batch.materialized == 2
+
+
+def test_same_as_get_all(sqlite_repo):
+    where = {'field_1': 5}
+    assert sqlite_repo.get_batch(where) == sqlite_repo.get_all(where)
+    batch = sqlite_repo.get_batch(order_by='-field_1', limit=3, offset=1)
+    assert list(batch) == sqlite_repo.get_all(order_by='-field_1', limit=3, offset=1)
+    assert batch.materialized == 3
+
+
+def test_column_without_objects(sqlite_repo):
+    batch = sqlite_repo.get_batch()
+    assert batch.column('field_1') == list(range(10))
+    assert batch.materialized == 0
+    with pytest.raises(ValueError):
+        batch.column('missing')
+
+
+def test_slice(sqlite_repo):
+    batch = sqlite_repo.get_batch()
+    part = batch[2:5]
+    assert isinstance(part, RecordBatch)
+    assert [obj.field_1 for obj in part] == [2, 3, 4]
+    assert part[0] is batch[2]
+
+
+def test_index_error(sqlite_repo):
+    batch = sqlite_repo.get_batch()
+    with pytest.raises(IndexError):
+        batch[10]
+    with pytest.raises(IndexError):
+        batch[-11]
+
+
+def test_default_get_batch():
+    repo = MemoryRepository[Custom]()
+    objs = [Custom(field_1=i) for i in range(3)]
+    repo.add_many(objs)
+    batch = repo.get_batch(where={'field_1': 1})
+    assert batch.materialized == 1
+    assert list(batch) == [objs[1]]
+    assert batch.column('field_1') == [1]
+
+
+def test_mixed_column_values(sqlite_repo):
+    sqlite_repo.add(Custom(field_1=None, field_2=None))
+    sqlite_repo.add(Custom(field_1=1.5))
+    batch = sqlite_repo.get_batch()
+    assert batch.column('field_1')[-2:] == [None, 1.5]
+    assert batch[10] == Custom(11, None, None)
+    assert batch == sqlite_repo.get_all()
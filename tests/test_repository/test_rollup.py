@@ -0,0 +1,66 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.rollup import DailyRollup
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    with SQLiteRepository[Expense](str(tmp_path / 'rollup.db'), Expense) as repository:
+        yield repository
+
+
+@pytest.fixture
+def rollup(repo):
+    return DailyRollup(repo, 'amount', 'expense_date', by='category')
+
+
+def rows(rollup):
+    with rollup.repo.connection_manager.connection() as connection:
+        return set(connection.execute(
+            f'SELECT day, grp, total, records FROM {rollup.table_name}'))
+
+
+def test_rollup_maintained(repo, rollup):
+    first = Expense(100, 1, datetime(2023, 1, 1, 10))
+    repo.add(first)
+    repo.add_many([Expense(200, 1, datetime(2023, 1, 1, 20)),
+                   Expense(50, 2, datetime(2023, 1, 2))])
+    assert rows(rollup) == {('2023-01-01', 1, 300, 2), ('2023-01-02', 2, 50, 1)}
+
+    first.amount, first.category = 150, 2
+    repo.update(first)
+    assert rows(rollup) == {('2023-01-01', 1, 200, 1), ('2023-01-01', 2, 150, 1),
+                            ('2023-01-02', 2, 50, 1)}
+
+    repo.delete(first.pk)
+    repo.delete_many([3])
+    assert rows(rollup) == {('2023-01-01', 1, 200, 1)}
+    assert rollup.check()
+
+
+def test_rollup_sums(repo, rollup):
+    repo.add_many([Expense(100, 1, datetime(2023, 1, d)) for d in range(1, 11)]
+                  + [Expense(5, 2, datetime(2023, 1, 10))])
+    assert rollup.sum() == 1005
+    assert rollup.sum(date(2023, 1, 8)) == 305
+    assert rollup.sum(date(2023, 1, 8), date(2023, 1, 9)) == 200
+    assert rollup.sum(date(2023, 1, 10), group=2) == 5
+    assert rollup.sum_grouped(date(2023, 1, 10)) == {1: 100, 2: 5}
+    assert rollup.sum(date(2024, 1, 1)) == 0
+
+
+def test_rollup_built_for_existing_rows_and_rebuilt(repo):
+    repo.add(Expense(100, 1, datetime(2023, 1, 1)))
+    rollup = DailyRollup(repo, 'amount', 'expense_date')
+    assert rollup.sum() == 100
+    with repo.connection_manager.transaction() as connection:
+        connection.execute(f'UPDATE {rollup.table_name} SET total = 0')
+    assert not rollup.check(repair=True)
+    assert rollup.check()
+    assert rollup.sum() == 100
+    with pytest.raises(ValueError):
+        rollup.sum_grouped()
@@ -1,9 +1,12 @@
 import sqlite3
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from inspect import isgenerator
 
 import pytest
 
+from bookkeeper.repository.connection_manager import ThreadLocalConnectionManager
+from bookkeeper.repository.query import Ge
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
 DB_FILE = "resources/test_database.db"
@@ -31,7 +34,8 @@ def custom_class():
 
 @pytest.fixture
 def repo(custom_class, create_bd):
-    return SQLiteRepository(db_file=DB_FILE, clazz=custom_class)
+    with SQLiteRepository(db_file=DB_FILE, clazz=custom_class) as repository:
+        yield repository
 
 
 def test_resolve_type(repo):
@@ -123,3 +127,165 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert [objects[0]] == repo.get_all({'field_1': 0})
     assert objects == repo.get_all({'field_2': 'test'})
+
+
+def test_shared_connection_manager(custom_class, create_bd):
+    with ThreadLocalConnectionManager(DB_FILE) as manager:
+        repo_1 = SQLiteRepository(DB_FILE, custom_class, manager)
+        repo_2 = SQLiteRepository(DB_FILE, custom_class, manager)
+        pk = repo_1.add(custom_class(field_1=1))
+        assert repo_2.get(pk) == repo_1.get(pk)
+        repo_1.close()
+        assert repo_2.get(pk) is not None
+
+
+def test_add_many(repo, custom_class):
+    repo.add(custom_class(field_1=-1))
+    objs = [custom_class(field_1=i) for i in range(5)]
+    pks = repo.add_many(objs)
+    assert pks == [obj.pk for obj in objs]
+    assert len(set(pks)) == 5
+    for obj in objs:
+        assert repo.get(obj.pk) == obj
+    assert repo.add_many([]) == []
+
+
+def test_add_many_non_sequential_rowids(repo, custom_class):
+    # после записи с наибольшим ROWID SQLite выбирает ROWID случайно
+    with repo.connection_manager.transaction() as connection:
+        connection.execute("INSERT INTO custom (ROWID, field_1) "
+                           "VALUES (9223372036854775807, -1)")
+    objs = [custom_class(field_1=i) for i in range(5)]
+    pks = repo.add_many(objs)
+    assert len(set(pks)) == 5
+    for obj in objs:
+        assert repo.get(obj.pk) == obj
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objs = [custom_class(field_1=1), custom_class(field_1=2, pk=1)]
+    with pytest.raises(ValueError):
+        repo.add_many(objs)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    objs = [custom_class(field_1=i) for i in range(3)]
+    repo.add_many(objs)
+    for obj in objs:
+        obj.field_2 = 'updated'
+    repo.update_many(objs)
+    assert repo.get_all() == objs
+
+
+def test_cannot_update_many_not_existing(repo, custom_class):
+    obj = custom_class(field_1=1)
+    repo.add(obj)
+    obj.field_1 = 2
+    with pytest.raises(ValueError):
+        repo.update_many([obj, custom_class(field_1=1, pk=100)])
+    assert repo.get(obj.pk).field_1 == 1
+
+
+def test_delete_many(repo, custom_class):
+    objs = [custom_class(field_1=i) for i in range(3)]
+    repo.add_many(objs)
+    repo.delete_many([objs[0].pk, objs[2].pk])
+    assert repo.get_all() == [objs[1]]
+    with pytest.raises(ValueError):
+        repo.delete_many([objs[1].pk, -1])
+    assert repo.get_all() == [objs[1]]
+
+
+def test_transaction_spans_repositories(custom_class, create_bd):
+    with ThreadLocalConnectionManager(DB_FILE) as manager:
+        repo_1 = SQLiteRepository(DB_FILE, custom_class, manager)
+        repo_2 = SQLiteRepository(DB_FILE, custom_class, manager)
+        with pytest.raises(ValueError):
+            with repo_1.transaction():
+                repo_1.add(custom_class(field_1=1))
+                repo_2.add(custom_class(field_1=2))
+                repo_2.delete(-1)
+        assert repo_1.get_all() == []
+
+        with repo_1.transaction():
+            repo_1.add(custom_class(field_1=1))
+            repo_2.add(custom_class(field_1=2))
+        assert [obj.field_1 for obj in repo_2.get_all()] == [1, 2]
+
+
+def test_indexes_created_once(create_bd):
+    @dataclass
+    class Indexed:
+        field_1: int = field(default=0, metadata={'index': True})
+        field_2: str = ''
+        pk: int = 0
+
+    with sqlite3.connect(DB_FILE) as connection:
+        connection.execute("DROP TABLE IF EXISTS indexed")
+    connection.close()
+
+    with SQLiteRepository(DB_FILE, Indexed) as repo:
+        assert repo.created_indexes == ['idx_indexed_field_1']
+        with repo.connection_manager.connection() as con:
+            plan = con.execute("EXPLAIN QUERY PLAN SELECT * FROM indexed "
+                               "WHERE field_1 = 1").fetchall()
+        assert 'idx_indexed_field_1' in str(plan)
+    with SQLiteRepository(DB_FILE, Indexed) as repo:
+        assert repo.created_indexes == []
+
+
+def test_get_all_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all({'field_1; DROP TABLE custom': 1})
+    with pytest.raises(ValueError):
+        repo.get_all(order_by='unknown')
+
+
+def test_iter_all(repo, custom_class):
+    objs = [custom_class(field_1=i) for i in range(7)]
+    repo.add_many(objs)
+    gen = repo.iter_all(batch_size=3)
+    assert isgenerator(gen)
+    assert list(gen) == objs
+    assert list(repo.iter_all({'field_1': Ge(5)}, order_by='-field_1')
+                ) == objs[:4:-1]
+    with pytest.raises(ValueError):
+        next(repo.iter_all(batch_size=0))
+
+
+def test_iter_all_partial(repo, custom_class):
+    objs = [custom_class(field_1=i) for i in range(5)]
+    repo.add_many(objs)
+    gen = repo.iter_all(batch_size=2)
+    assert next(gen) == objs[0]
+    gen.close()
+    repo.add(custom_class(field_1=100))
+    assert len(repo.get_all()) == 6
+
+
+def test_generate_object(repo, custom_class):
+    assert repo.generate_object(repo.fields, [3, 5, 'abc']) == custom_class(
+        pk=3, field_1=5, field_2='abc')
+
+
+def test_row_factory_uses_column_order(repo, custom_class):
+    factory = repo.row_factory(['field_2', 'pk', 'field_1'])
+    assert factory(('abc', 3, 5)) == custom_class(pk=3, field_1=5, field_2='abc')
+    assert repo.row_factory(['field_2', 'pk', 'field_1']) is factory
+    with pytest.raises(ValueError):
+        repo.row_factory(['pk', 'field_1'])
+
+
+def test_datetime_fields(tmp_path):
+    @dataclass
+    class Dated:
+        date: datetime
+        optional_date: datetime | None = None
+        pk: int = 0
+
+    with SQLiteRepository(str(tmp_path / 'dated.db'), Dated) as repo:
+        objs = [Dated(datetime(2023, 1, 1)),
+                Dated(datetime(2023, 1, 2, 3, 4, 5, 6), datetime(2023, 2, 1))]
+        repo.add_many(objs)
+        assert repo.get_all() == objs
@@ -0,0 +1,181 @@
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.connection_manager import (
+    RetryPolicy, ThreadLocalConnectionManager)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.writer_queue import QueuedSQLiteRepository, WriterQueue
+
+THREADS = 8
+WRITES_PER_THREAD = 50
+
+
+@dataclass(slots=True)
+class Custom:
+    field_1: int = 0
+    field_2: str = 'value'
+    pk: int = 0
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'writer.db')
+
+
+@pytest.fixture
+def writer(db_file):
+    with WriterQueue.open(db_file) as writer_queue:
+        yield writer_queue
+    writer_queue.connection_manager.close()
+
+
+@pytest.fixture
+def repo(db_file, writer):
+    return QueuedSQLiteRepository[Custom](db_file, Custom, writer)
+
+
+def test_crud(repo):
+    obj = Custom(1)
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    obj.field_2 = 'changed'
+    repo.update(obj)
+    assert repo.get(pk) == obj
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    pks = repo.add_many([Custom(2), Custom(3)])
+    repo.delete_many(pks[:1])
+    assert [o.field_1 for o in repo.get_all()] == [3]
+
+
+def test_error_rolls_back_only_failed_operation(repo, writer):
+    with pytest.raises(ValueError):
+        repo.delete(100)
+    repo.add(Custom(1))
+    assert len(repo.get_all()) == 1
+    assert writer.stats.failed == 1
+
+
+def test_group_commit(repo, writer):
+    gate = threading.Event()
+    blocked = writer.submit(gate.wait)
+    futures = [writer.submit(lambda i=i: repo.add(Custom(i))) for i in range(20)]
+    gate.set()
+    blocked.result()
+    assert [future.result() for future in futures] == list(range(1, 21))
+    assert writer.stats.commits <= 2
+    assert writer.stats.operations == 21
+
+
+def test_transaction_bypasses_queue(repo):
+    with pytest.raises(ZeroDivisionError):
+        with repo.transaction():
+            repo.add(Custom(1))
+            1 / 0
+    assert repo.get_all() == []
+    with repo.transaction():
+        repo.add_many([Custom(1), Custom(2)])
+    assert len(repo.get_all()) == 2
+
+
+def test_closed_queue(db_file):
+    writer = WriterQueue.open(db_file)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(lambda: None)
+    writer.connection_manager.close()
+
+
+@pytest.fixture(params=['queued', 'direct'])
+def stress_repo(request, db_file, writer):
+    if request.param == 'queued':
+        yield QueuedSQLiteRepository[Custom](db_file, Custom, writer)
+        return
+    # записи из каждого потока в своем соединении, с повторными попытками
+    manager = ThreadLocalConnectionManager(
+        db_file, 'balanced', busy_timeout=0.01,
+        retry=RetryPolicy(attempts=1000, delay=0.001, max_delay=0.01))
+    with SQLiteRepository[Custom](db_file, Custom, manager) as repository:
+        yield repository
+    manager.close()
+
+
+def test_stress(stress_repo):
+    repo = stress_repo
+    errors = []
+    reads = []
+
+    def work(thread):
+        try:
+            for i in range(WRITES_PER_THREAD):
+                obj = Custom(thread, f'{thread}-{i}')
+                repo.add(obj)
+                if i % 10 == 0:
+                    reads.append(len(repo.get_all({'field_1': thread})))
+                    obj.field_2 += '!'
+                    repo.update(obj)
+        except Exception as exc:  # pragma: no cover - сообщается ниже
+            errors.append(exc)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    objs = repo.get_all()
+    assert len(objs) == THREADS * WRITES_PER_THREAD
+    assert len({obj.pk for obj in objs}) == len(objs)
+    assert sum(obj.field_2.endswith('!') for obj in objs) == THREADS * 5
+
+
+def test_retry_on_locked_database(db_file):
+    retry = RetryPolicy(attempts=50, delay=0.01, backoff=1.0)
+    with ThreadLocalConnectionManager(db_file, busy_timeout=0, retry=retry) as manager:
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with manager.transaction() as connection:
+                connection.execute('CREATE TABLE t(a)')
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        threading.Timer(0.1, release.set).start()
+        with manager.transaction() as connection:
+            connection.execute('INSERT INTO t VALUES (1)')
+        holder.join()
+
+
+def test_no_retry_raises_locked(db_file):
+    retry = RetryPolicy(attempts=1)
+    with ThreadLocalConnectionManager(db_file, busy_timeout=0, retry=retry) as manager:
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with manager.transaction():
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        try:
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                with manager.transaction():
+                    pass
+        finally:
+            release.set()
+            holder.join()
+
+
+def test_retry_policy():
+    assert list(RetryPolicy(4, 0.1, 2.0, 0.3).delays()) == [0.1, 0.2, 0.3]
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=0)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip('PySide6')
+
+from bookkeeper.models.category import Category  # noqa: E402
+from bookkeeper.view.category import CategoryTreeModel  # noqa: E402
+
+
+@pytest.fixture
+def model():
+    categories = [Category('food', None, 1), Category('drinks', None, 2),
+                  Category('meat', 1, 3)]
+    tree = CategoryTreeModel()
+    tree.set_fetcher(lambda pk, done: done([c for c in categories if c.parent == pk]))
+    tree.fetchMore(tree._index_of(tree.root))
+    for pk in (1, 2):
+        tree.fetchMore(tree._index_of(tree.nodes[pk]))
+    return tree
+
+
+def children(model, pk):
+    return [node.pk for node in model.nodes[pk].children]
+
+
+def test_reparent_in_place(model):
+    meat = model.category_by_pk(3)
+    meat.parent = 2
+    model.update(meat)
+    assert children(model, 1) == []
+    assert children(model, 2) == [3]
+    assert model.nodes[3].parent is model.nodes[2]
+
+
+def test_rename_keeps_node(model):
+    node = model.nodes[3]
+    model.update(Category('beef', 1, 3))
+    assert model.nodes[3] is node
+    assert node.category.name == 'beef'
+
+
+def test_fetch_result_for_removed_node_ignored():
+    requests = []
+    tree = CategoryTreeModel()
+    tree.set_fetcher(lambda pk, done: requests.append(done))
+    tree.fetchMore(tree._index_of(tree.root))
+    assert not tree.canFetchMore(tree._index_of(tree.root))
+    tree.set_fetcher(lambda pk, done: done([]))
+    requests[0]([Category('food', None, 1)])
+    assert tree.nodes == {}
+
+
+def test_parent_index_and_owner(model):
+    meat = model._index_of(model.nodes[3])
+    assert model.parent(meat).internalPointer() is model.nodes[1]
+    assert not model.parent(model._index_of(model.nodes[1])).isValid()
+    assert model.parent() is None
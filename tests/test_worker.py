@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.worker import RepositoryWorker
+
+
+@pytest.fixture
+def worker():
+    with RepositoryWorker() as repository_worker:
+        yield repository_worker
+
+
+@pytest.fixture
+def gate():
+    """ Событие, задерживающее рабочий поток до его установки """
+    return threading.Event()
+
+
+def test_writes_in_order(worker):
+    repo = MemoryRepository[Expense]()
+    results = []
+    for i in range(50):
+        worker.write(lambda i=i: repo.add(Expense(i, 1)), results.append)
+    assert worker.wait(5)
+    assert results == list(range(1, 51))
+    assert [e.amount for e in repo.get_all()] == list(range(50))
+
+
+def test_read_sees_previous_writes(worker, gate):
+    repo = MemoryRepository[Expense]()
+    worker.write(gate.wait)
+    worker.write(lambda: repo.add(Expense(100, 1)))
+    totals = []
+    worker.read('total', lambda: repo.sum('amount'), totals.append)
+    gate.set()
+    assert worker.wait(5)
+    assert totals == [100]
+
+
+def test_reads_coalesced(worker, gate):
+    calls = []
+    results = []
+    worker.write(gate.wait)
+    assert not worker.read('key', lambda: calls.append(1) or 1, results.append)
+    assert worker.read('key', lambda: calls.append(2) or 2, results.append)
+    assert not worker.read('other', lambda: calls.append(3) or 3)
+    assert worker.pending == 3
+    gate.set()
+    assert worker.wait(5)
+    assert calls == [2, 3]
+    assert results == [2]
+
+
+def test_coalesced_callbacks_kept(worker, gate):
+    first, second = [], []
+    worker.write(gate.wait)
+    worker.read('key', lambda: 1, first.append)
+    worker.read('key', lambda: 2, second.append)
+    gate.set()
+    assert worker.wait(5)
+    assert first == second == [2]
+
+
+def test_pending_reported(gate):
+    counts = []
+    with RepositoryWorker(on_pending=counts.append) as worker:
+        worker.write(gate.wait)
+        worker.write(lambda: None)
+        gate.set()
+        assert worker.wait(5)
+    assert max(counts) == 2
+    assert counts[-1] == 0
+
+
+def test_dispatch(gate):
+    dispatched = []
+    with RepositoryWorker(dispatch=dispatched.append) as worker:
+        worker.write(lambda: 1, lambda result: None)
+        assert worker.wait(5)
+    assert len(dispatched) == 1
+
+
+def test_error(worker):
+    errors, results = [], []
+
+    def fail():
+        raise ValueError('failed')
+
+    worker.write(fail, results.append, errors.append)
+    worker.write(lambda: 1, results.append)
+    assert worker.wait(5)
+    assert results == [1]
+    assert isinstance(errors[0], ValueError)
+
+
+def test_error_with_queued_dispatch():
+    queued, errors, results = [], [], []
+
+    def fail():
+        raise ValueError('failed')
+
+    with RepositoryWorker(dispatch=queued.append) as worker:
+        worker.write(fail, results.append, errors.append)
+        worker.write(lambda: 1, results.append)
+        assert worker.wait(5)
+    for callback in queued:
+        callback()
+    assert results == [1]
+    assert isinstance(errors[0], ValueError)
+
+
+def test_call(worker):
+    assert worker.call(lambda: threading.current_thread().name) == 'repository-worker'
+    with pytest.raises(ValueError):
+        worker.call(lambda: int('x'))
+
+
+def test_call_from_worker(worker):
+    assert worker.call(lambda: worker.call(lambda: 1)) == 1
+
+
+def test_close_runs_pending(gate):
+    results = []
+    worker = RepositoryWorker()
+    worker.write(gate.wait)
+    worker.write(lambda: 1, results.append)
+    gate.set()
+    worker.close()
+    assert results == [1]
+    with pytest.raises(RuntimeError):
+        worker.write(lambda: None)